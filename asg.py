@@ -1,14 +1,349 @@
-from instructions import Instruction
+import enum
+from typing import Dict, Iterator, List, Optional, Tuple
+from instructions import Instruction, stringify_instrs
+from util import Direction, DIR_TO_SYMBOL
+
+# A straight run of cells in the code, from the first to just before the second, along a row or column.
+Segment = Tuple[Tuple[int, int], Tuple[int, int]]
+
+
+class EdgeType(enum.Enum):
+    """The condition under which an edge is taken.
+    """
+    ALWAYS = 0 # Only edge out of a start/arrow node.
+    TRUE = 1 # Taken from a decision node if the popped value is truthy.
+    FALSE = 2 # Taken from a decision node otherwise.
+
+    def __str__(self):
+        return self.name
+    __repr__ = __str__
+
 
 class ASGNode:
-    def __init__(self, parent: "ASG", inst: Instruction) -> None:
-        self.parent = parent
-        self.inst = inst
+    """A node in the ASG. Nodes are the points where control flow can join or split.
+
+    Each node has an integer id, unique within its graph, and its index in the graph's node table (-1 if not in one).
+    """
+    __slots__ = ("id", "index", "in_edges", "out_edges", "is_visited")
+
+    def __init__(self) -> None:
+        self.id = -1
+        self.index = -1
+        self.in_edges: "List[ASGEdge]" = []
+        self.out_edges: "List[ASGEdge]" = []
+        self.is_visited = False
+
+    @property
+    def indeg(self) -> int:
+        return len(self.in_edges)
+
+    @property
+    def outdeg(self) -> int:
+        return len(self.out_edges)
+
+    def visit(self):
+        """Marks this node, and every node reachable from it, as visited.
+        """
+        todo = [self]
+        while todo:
+            node = todo.pop()
+            if node.is_visited:
+                continue
+            node.is_visited = True
+            todo.extend(edge.dst for edge in node.out_edges)
+
+    def remove(self, graph: "ASG"):
+        """Removes this node and all edges touching it from the graph.
+
+        Args:
+            graph (ASG): The graph this node is in.
+        """
+        for edge in self.in_edges + self.out_edges:
+            graph.remove_edge(edge)
+        graph.remove_node(self)
+
+    def __repr__(self):
+        return f"<{type(self).__name__}>"
+
+
+class ASGStartNode(ASGNode):
+    """Where execution begins.
+    """
+    __slots__ = ()
+
+
+class ASGTerminalNode(ASGNode):
+    """Where execution ends. Has no out edges.
+    """
+    __slots__ = ()
+
+
+class ASGArrowNode(ASGNode):
+    """An arrow in the source code, entered while moving in its direction.
+    """
+    __slots__ = ("dir", "x", "y")
+
+    def __init__(self, dir: Direction, x: int, y: int) -> None:
+        super().__init__()
+        self.dir = dir
+        self.x = x
+        self.y = y
+
+    def __repr__(self):
+        return f"<{DIR_TO_SYMBOL[self.dir]} {self.x},{self.y}>"
+
+
+class ASGDecisionNode(ASGNode):
+    """Pops a value, and follows the true edge if it is truthy, else the false edge.
+    """
+    __slots__ = ("true", "false")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.true: "Optional[ASGEdge]" = None
+        self.false: "Optional[ASGEdge]" = None
+
+
+class ASGEdge:
+    """A straight-line run of instructions between two nodes.
+    """
+    __slots__ = ("id", "index", "src", "dst", "code", "type", "path", "connected")
+
+    def __init__(self, src: ASGNode, dst: ASGNode, code: List[Instruction], type: EdgeType = EdgeType.ALWAYS, path: Optional[List[Segment]] = None) -> None:
+        """
+        Args:
+            src (ASGNode): The node the edge leaves.
+            dst (ASGNode): The node the edge goes to.
+            code (List[Instruction]): The code run along the edge.
+            type (EdgeType, optional): When the edge is taken. Defaults to EdgeType.ALWAYS.
+            path (List[Segment], optional): The cells of the code the edge passes through, if known. Defaults to none.
+        """
+        self.id = -1
+        self.index = -1
+        self.src = src
+        self.dst = dst
+        self.code = code
+        self.type = type
+        self.path = path if path is not None else []
+        self.connected = False
+
+    def connect(self):
+        """Adds this edge to the edge lists of its endpoints.
+        """
+        if self.connected:
+            return
+        self.src.out_edges.append(self)
+        self.dst.in_edges.append(self)
+        if self.type == EdgeType.TRUE:
+            self.src.true = self
+        elif self.type == EdgeType.FALSE:
+            self.src.false = self
+        self.connected = True
+
+    def disconnect(self):
+        """Removes this edge from the edge lists of its endpoints.
+        """
+        if not self.connected:
+            return
+        self.src.out_edges.remove(self)
+        self.dst.in_edges.remove(self)
+        if self.type == EdgeType.TRUE and self.src.true is self:
+            self.src.true = None
+        elif self.type == EdgeType.FALSE and self.src.false is self:
+            self.src.false = None
+        self.connected = False
+
+    def __add__(self, other: "ASGEdge") -> "ASGEdge":
+        """Joins two consecutive edges into one, running both edges' code.
+        """
+        return ASGEdge(self.src, other.dst, self.code + other.code, self.type, self.path + other.path)
+
+    def cells(self) -> Iterator[Tuple[int, int]]:
+        """Iterates over the cells of the code the edge passes through, in order.
+        """
+        for (x, y), (x2, y2) in self.path:
+            dx = (x2 > x) - (x2 < x)
+            dy = (y2 > y) - (y2 < y)
+            while (x, y) != (x2, y2):
+                yield x, y
+                x += dx
+                y += dy
+
+    def __repr__(self):
+        return f"{self.src!r} -{self.type}-> {self.dst!r}: {stringify_instrs(self.code)}"
+
 
 class ASG:
+    """The Abstract Syntax Graph. Nodes are joined by edges containing the code run between them.
+
+    Nodes and edges are kept in tables, in the order they were added. Removing one leaves a tombstone (None) in its
+    place, so removal is O(1); the tables are compacted the next time `nodes` or `edges` is read.
+    """
     def __init__(self):
-        self.nodes = []
-        self.node_map = {}
-    
-    def add_node(self, inst: Instruction):
-        node = ASGNode(self, inst)
+        self._nodes: List[Optional[ASGNode]] = []
+        self._edges: "List[Optional[ASGEdge]]" = []
+        self._dead_nodes = 0
+        self._dead_edges = 0
+        self.next_id = 0
+        self.arrow_nodes: "Dict[Tuple[Direction, int, int], ASGArrowNode]" = {}
+        self.start = ASGStartNode()
+        self.terminal = ASGTerminalNode()
+        self.add_node(self.start)
+        self.add_node(self.terminal)
+
+    @property
+    def nodes(self) -> List[ASGNode]:
+        """Every node, in the order they were added. Don't add to or remove from this list directly.
+        """
+        if self._dead_nodes:
+            self._nodes = self.compact(self._nodes)
+            self._dead_nodes = 0
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes: List[ASGNode]):
+        for node in self._nodes:
+            if node is not None:
+                node.index = -1
+        self._nodes = []
+        self._dead_nodes = 0
+        for node in nodes:
+            self.add_node(node)
+
+    @property
+    def edges(self) -> "List[ASGEdge]":
+        """Every edge, in the order they were added. Don't add to or remove from this list directly.
+        """
+        if self._dead_edges:
+            self._edges = self.compact(self._edges)
+            self._dead_edges = 0
+        return self._edges
+
+    @property
+    def node_count(self) -> int:
+        """The number of nodes, without compacting the node table.
+        """
+        return len(self._nodes) - self._dead_nodes
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._edges) - self._dead_edges
+
+    @staticmethod
+    def compact(table: list) -> list:
+        """Removes the tombstones from a table, and updates the indices of what is left.
+        """
+        table = [item for item in table if item is not None]
+        for i, item in enumerate(table):
+            item.index = i
+        return table
+
+    def new_id(self) -> int:
+        self.next_id += 1
+        return self.next_id - 1
+
+    def add_node(self, node: ASGNode):
+        if node.id < 0:
+            node.id = self.new_id()
+        node.index = len(self._nodes)
+        self._nodes.append(node)
+
+    def add_arrow_node(self, node: ASGArrowNode):
+        if (node.dir, node.x, node.y) in self.arrow_nodes:
+            return # Already added (e.g. from the other string parity)
+        self.arrow_nodes[(node.dir, node.x, node.y)] = node
+        self.add_node(node)
+
+    def add_decision_node(self, node: ASGDecisionNode):
+        self.add_node(node)
+
+    def get_arrow_node(self, dir: Direction, x: int, y: int) -> ASGArrowNode:
+        return self.arrow_nodes[(dir, x, y)]
+
+    def add_edge(self, edge: ASGEdge):
+        edge.connect()
+        if edge.id < 0:
+            edge.id = self.new_id()
+        edge.index = len(self._edges)
+        self._edges.append(edge)
+
+    def remove_edge(self, edge: ASGEdge):
+        edge.disconnect()
+        if 0 <= edge.index < len(self._edges) and self._edges[edge.index] is edge:
+            self._edges[edge.index] = None
+            edge.index = -1
+            self._dead_edges += 1
+
+    def remove_node(self, node: ASGNode):
+        if not (0 <= node.index < len(self._nodes) and self._nodes[node.index] is node):
+            raise ValueError(f"{node!r} is not in the graph")
+        self._nodes[node.index] = None
+        node.index = -1
+        self._dead_nodes += 1
+        if isinstance(node, ASGArrowNode) and self.arrow_nodes.get((node.dir, node.x, node.y)) is node:
+            del self.arrow_nodes[(node.dir, node.x, node.y)]
+
+    def set_visited(self, value: bool = False):
+        """Sets the visited flag of every node.
+
+        Args:
+            value (bool, optional): The value to set to. Defaults to False.
+        """
+        for node in self.nodes:
+            node.is_visited = value
+
+    def strongly_connected_components(self) -> List[List[ASGNode]]:
+        """Finds the strongly connected components of the graph (Tarjan's algorithm, without recursion).
+
+        Returns:
+            List[List[ASGNode]]: Each component, in reverse topological order.
+        """
+        nodes = self.nodes
+        order = [-1] * len(nodes) # By node index: the order nodes were found in, or -1 if not found yet.
+        low = [0] * len(nodes)
+        on_stack = [False] * len(nodes)
+        stack: List[ASGNode] = []
+        components = []
+        found = 0
+        for root in nodes:
+            if order[root.index] >= 0:
+                continue
+            order[root.index] = low[root.index] = found
+            found += 1
+            stack.append(root)
+            on_stack[root.index] = True
+            work = [(root, iter(root.out_edges))]
+            while work:
+                node, edges = work[-1]
+                for edge in edges:
+                    dst = edge.dst.index
+                    if order[dst] < 0:
+                        order[dst] = low[dst] = found
+                        found += 1
+                        stack.append(edge.dst)
+                        on_stack[dst] = True
+                        work.append((edge.dst, iter(edge.dst.out_edges)))
+                        break
+                    if on_stack[dst]:
+                        low[node.index] = min(low[node.index], order[dst])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0].index
+                        low[parent] = min(low[parent], low[node.index])
+                    if low[node.index] == order[node.index]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack[member.index] = False
+                            component.append(member)
+                            if member is node:
+                                break
+                        components.append(component)
+        return components
+
+    def show(self):
+        """Prints every edge of the graph.
+        """
+        for edge in self.edges:
+            print(repr(edge))
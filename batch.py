@@ -0,0 +1,226 @@
+"""Batch -- Runs many programs, or one program on many inputs, on a pool of worker processes.
+
+Each worker compiles a program the first time it is given it, and reuses the graph for every later run of it.
+A run stops when it finishes, raises, takes more than `max_steps` steps or runs for longer than `timeout` seconds.
+The timeout is checked between steps, so a single very slow instruction (e.g. multiplying huge numbers) can overrun it.
+
+Usage: python batch.py [--input '[1, 2]' ...] [--processes N] [--timeout S] [--max-steps N] [--json] files...
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Sequence
+from asg import ASG
+from cache import ProgramCache
+from interpreter import Interpreter
+from optimise_graph import Optimiser
+from parsing import Parser
+from pathways_code import Code
+from preprocessing import preprocess
+from status import ERROR, OK, STEP_LIMIT, TIMEOUT
+
+DEFAULT_TIMEOUT = 10.0 # Seconds per run, including compiling the program if the worker hasn't already.
+DEFAULT_MAX_STEPS = 10_000_000 # Edges taken per run.
+CHECK_EVERY = 1024 # Steps between looking at the clock.
+CHUNKS_PER_PROCESS = 4
+MAX_CACHED_GRAPHS = 64 # Compiled programs each worker keeps.
+
+
+class Job:
+    """A program to run, and the stack to start it with.
+    """
+    def __init__(self, source: str, stack: Optional[list] = None, name: str = ""):
+        """
+        Args:
+            source (str): The program's source code.
+            stack (list, optional): The stack to start with, top last. This is the program's input. Defaults to empty.
+            name (str, optional): What to call the run in results. Defaults to "".
+        """
+        self.source = source
+        self.stack = list(stack or [])
+        self.name = name
+
+    def __repr__(self):
+        return f"Job({self.name!r}, stack={self.stack!r})"
+
+
+class RunResult:
+    """What happened when a job was run.
+    """
+    def __init__(self, name: str, status: str, output: str = "", stack: Optional[list] = None, steps: int = 0, time: float = 0.0, error: Optional[str] = None):
+        self.name = name
+        self.status = status
+        self.output = output
+        self.stack = stack if stack is not None else []
+        self.steps = steps
+        self.time = time
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.status == OK
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "status": self.status, "output": self.output, "stack": self.stack,
+                "steps": self.steps, "time": self.time, "error": self.error}
+
+    def __repr__(self):
+        return f"RunResult({self.name!r}, {self.status}, steps={self.steps}, stack={self.stack!r})"
+
+
+class BatchInterpreter(Interpreter):
+    """An interpreter which collects what it prints, and stops after a number of steps or at a deadline.
+    """
+    def __init__(self, graph: ASG, stack: Optional[list] = None):
+        self.printed: List[str] = []
+        super().__init__(graph, self.printed)
+        self.stack = list(stack or [])
+
+    def run_limited(self, max_steps: int = DEFAULT_MAX_STEPS, deadline: Optional[float] = None) -> str:
+        """Runs until the program finishes, or it runs out of steps or time.
+
+        Args:
+            max_steps (int, optional): Edges to take before giving up. Defaults to DEFAULT_MAX_STEPS.
+            deadline (float, optional): time.perf_counter() to give up at. Defaults to never.
+
+        Returns:
+            str: OK, STEP_LIMIT or TIMEOUT.
+        """
+        while not self.run(min(CHECK_EVERY, max_steps - self.steps)):
+            if self.steps >= max_steps:
+                return STEP_LIMIT
+            if deadline is not None and time.perf_counter() > deadline:
+                return TIMEOUT
+        return OK
+
+
+def compile_source(source: str, cache: Optional[ProgramCache] = None) -> ASG:
+    """Compiles a program into its optimised graph.
+
+    Args:
+        source (str): The program's source code.
+        cache (ProgramCache, optional): A cache on disk to use as well. Defaults to none.
+
+    Returns:
+        ASG: The optimised graph.
+    """
+    if cache is not None:
+        return cache.compile(source)
+    return Optimiser(Parser(preprocess(Code(source)), lazy=True).get_graph()).optimise()
+
+
+class Runner:
+    """Runs jobs one after another, keeping the graphs of the programs it has compiled.
+    """
+    def __init__(self, timeout: Optional[float] = DEFAULT_TIMEOUT, max_steps: int = DEFAULT_MAX_STEPS, cache_directory: Optional[str] = None):
+        """
+        Args:
+            timeout (float, optional): Seconds each run may take, or None for no limit. Defaults to DEFAULT_TIMEOUT.
+            max_steps (int, optional): Edges each run may take. Defaults to DEFAULT_MAX_STEPS.
+            cache_directory (str, optional): Also keep compiled programs in a ProgramCache here,
+                so they are shared between workers and batches. Defaults to only keeping them in memory.
+        """
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.cache = ProgramCache(cache_directory) if cache_directory is not None else None
+        self.graphs: Dict[str, ASG] = {} # Least recently used first.
+
+    def get_graph(self, source: str) -> ASG:
+        graph = self.graphs.pop(source, None)
+        if graph is None:
+            graph = compile_source(source, self.cache)
+            if len(self.graphs) >= MAX_CACHED_GRAPHS:
+                del self.graphs[next(iter(self.graphs))]
+        self.graphs[source] = graph
+        return graph
+
+    def run(self, job: Job) -> RunResult:
+        start = time.perf_counter()
+        deadline = start + self.timeout if self.timeout is not None else None
+        try:
+            graph = self.get_graph(job.source)
+        except Exception as e:
+            return RunResult(job.name, ERROR, time=time.perf_counter() - start, error=f"{type(e).__name__}: {e}")
+        interpreter = BatchInterpreter(graph, job.stack)
+        error = None
+        try:
+            status = interpreter.run_limited(self.max_steps, deadline)
+        except Exception as e:
+            status = ERROR
+            error = f"{type(e).__name__}: {e}"
+        return RunResult(job.name, status, "".join(interpreter.printed), interpreter.stack, interpreter.steps, time.perf_counter() - start, error)
+
+
+def run_batch(jobs: Sequence[Job], processes: Optional[int] = None, timeout: Optional[float] = DEFAULT_TIMEOUT,
+              max_steps: int = DEFAULT_MAX_STEPS, cache_directory: Optional[str] = None) -> Iterator[RunResult]:
+    """Runs every job, on a pool of processes.
+
+    Jobs are handed out in contiguous chunks, so runs of the same program next to each other mostly share a compile.
+
+    Args:
+        jobs (Sequence[Job]): The jobs to run.
+        processes (int, optional): How many worker processes to use. None for one per CPU, 1 to run in this process. Defaults to None.
+        timeout (float, optional): Seconds each run may take, or None for no limit. Defaults to DEFAULT_TIMEOUT.
+        max_steps (int, optional): Edges each run may take. Defaults to DEFAULT_MAX_STEPS.
+        cache_directory (str, optional): Directory of a ProgramCache to share compiled programs through. Defaults to none.
+
+    Yields:
+        RunResult: The result of each job, in the same order as the jobs.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    processes = min(processes, len(jobs))
+    if processes <= 1:
+        runner = Runner(timeout, max_steps, cache_directory)
+        for job in jobs:
+            yield runner.run(job)
+        return
+    chunksize = max(1, -(-len(jobs) // (processes * CHUNKS_PER_PROCESS)))
+    with multiprocessing.Pool(processes, initializer=_init_batch_worker, initargs=(timeout, max_steps, cache_directory)) as pool:
+        yield from pool.imap(_run_job, jobs, chunksize)
+
+
+_worker_runner: Optional[Runner] = None
+
+def _init_batch_worker(timeout: Optional[float], max_steps: int, cache_directory: Optional[str]):
+    global _worker_runner
+    _worker_runner = Runner(timeout, max_steps, cache_directory)
+
+def _run_job(job: Job) -> RunResult:
+    return _worker_runner.run(job)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="programs to run")
+    parser.add_argument("--input", action="append", type=json.loads, metavar="JSON",
+                        help="a JSON list to start the stack with (top last). Every program is run once with each input")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds each run may take")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS, help="edges each run may take")
+    parser.add_argument("--cache-dir", default=None, help="share compiled programs through a cache in this directory")
+    parser.add_argument("--json", action="store_true", help="print each result as a line of JSON")
+    args = parser.parse_args(argv)
+
+    inputs = args.input or [[]]
+    jobs = []
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        for i, stack in enumerate(inputs):
+            jobs.append(Job(source, stack, path if len(inputs) == 1 else f"{path}[{i}]"))
+
+    failed = 0
+    for result in run_batch(jobs, args.processes, args.timeout, args.max_steps, args.cache_dir):
+        failed += not result.ok
+        if args.json:
+            print(json.dumps(result.to_dict(), default=repr))
+        else:
+            print(f"{result.name}: {result.status} in {result.steps} steps, {result.time * 1000:.1f}ms, stack {result.stack!r}"
+                  + (f" ({result.error})" if result.error else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Measures the memory per node, and the time to build and optimise, of large graphs.
+
+Usage: python benchmarks/bench_asg.py [nodes]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from asg import ASG, ASGArrowNode, ASGDecisionNode, ASGEdge, EdgeType
+from instructions import InstructionType, SimpleInstructionType
+from optimise_graph import Optimiser
+from util import Direction
+
+DECISION_EVERY = 10 # One node in this many is a decision, looping back to the one before.
+
+
+def build(size: int) -> ASG:
+    """Builds a long chain of arrow nodes, with small loops through decision nodes along it.
+    Most of the arrow nodes are boring, so the optimiser removes them.
+    """
+    graph = ASG()
+    code = [(InstructionType.INTEGER, 1), (InstructionType.SIMPLE, SimpleInstructionType.ADD)]
+    prev = graph.start
+    for i in range(size):
+        if i % DECISION_EVERY == DECISION_EVERY - 1:
+            node = ASGDecisionNode()
+            graph.add_decision_node(node)
+            graph.add_edge(ASGEdge(prev, node, list(code)))
+            graph.add_edge(ASGEdge(node, prev, [], EdgeType.TRUE))
+            prev_type = EdgeType.FALSE
+        else:
+            node = ASGArrowNode(Direction.RIGHT, i, 0)
+            graph.add_arrow_node(node)
+            if isinstance(prev, ASGDecisionNode):
+                graph.add_edge(ASGEdge(prev, node, list(code), prev_type))
+            else:
+                graph.add_edge(ASGEdge(prev, node, list(code)))
+        prev = node
+    graph.add_edge(ASGEdge(prev, graph.terminal, [], EdgeType.FALSE if isinstance(prev, ASGDecisionNode) else EdgeType.ALWAYS))
+    return graph
+
+
+def bench(size: int):
+    start = time.perf_counter()
+    graph = build(size)
+    built = time.perf_counter() - start
+    edges = len(graph.edges)
+    start = time.perf_counter()
+    Optimiser(graph).optimise()
+    optimised = time.perf_counter() - start
+    left = len(graph.nodes)
+    del graph
+
+    tracemalloc.start() # Slows allocation down a lot, so the graph is built again to measure memory.
+    graph = build(size)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"{size:,} nodes, {edges:,} edges")
+    print(f"  build:    {built:.2f}s, {memory / (size + edges):.0f} bytes per node or edge (including code)")
+    print(f"  optimise: {optimised:.2f}s, {left:,} nodes left")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
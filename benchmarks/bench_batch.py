@@ -0,0 +1,31 @@
+"""Measures how the throughput of the batch runner scales with the number of worker processes.
+
+Usage: python benchmarks/bench_batch.py [jobs]
+"""
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from batch import Job, run_batch
+from generate import generate
+
+PROGRAMS = [generate("loop", 2000), generate("branching", 10), generate("dense", 40)]
+
+
+def bench(count: int):
+    jobs = [Job(PROGRAMS[i % len(PROGRAMS)], name=str(i)) for i in range(count)]
+    single = None
+    for processes in sorted({1, 2, 4, multiprocessing.cpu_count()}):
+        start = time.perf_counter()
+        results = list(run_batch(jobs, processes))
+        taken = time.perf_counter() - start
+        assert all(result.ok for result in results)
+        single = single or taken
+        print(f"{processes:>3} processes: {count / taken:8.1f} runs/s, {single / taken:.2f}x")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 600)
@@ -0,0 +1,42 @@
+"""Measures how fast lines are lexed, in characters per second.
+
+Usage: python benchmarks/bench_lexer.py [size] [repeats]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from parsing import Line
+from util import Direction
+
+# Roughly the mix of characters in real programs: mostly blank, some code, a few strings.
+ALPHABET = " " * 20 + "0123456789+-*/%dTF!~=gl&|<>^v?#nN'" + "\"" * 2
+
+
+def make_lines(size: int, seed: int = 0) -> "list[str]":
+    rng = random.Random(seed)
+    return ["".join(rng.choice(ALPHABET) for _ in range(size)) for _ in range(size)]
+
+
+def bench(size: int = 400, repeats: int = 3) -> float:
+    """Lexes a size x size grid of lines in every direction, and returns the best characters per second.
+    """
+    lines = make_lines(size)
+    best = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i, text in enumerate(lines):
+            for d in Direction:
+                Line(text, d, i, None)
+        elapsed = time.perf_counter() - start
+        best = max(best, size * size * len(Direction) / elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f"{bench(size, repeats):,.0f} characters/s")
@@ -0,0 +1,161 @@
+"""Times each stage of the pipeline on generated programs, and compares the times with a saved baseline.
+
+Usage:
+    python benchmarks/bench_pipeline.py                     Run, and compare with benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --save out.json     Also save the results
+    python benchmarks/bench_pipeline.py --update-baseline   Save the results as the new baseline
+
+Exits with status 1 if any stage is slower than the baseline by more than the tolerance.
+Times depend on the machine, so the baseline should be updated on the machine that checks it.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from generate import generate
+from interpreter import Interpreter
+from optimise_graph import Optimiser
+from parsing import Parser
+from pathways_code import Code
+from preprocessing import preprocess
+
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+STAGES = ["preprocess", "parse", "get_graph", "optimise", "interpret"]
+# (name, generator, size). Sizes are picked so each stage takes a measurable time.
+CASES: List[Tuple[str, str, int]] = [
+    ("dense", "dense", 120),
+    ("sparse", "sparse", 200),
+    ("strings", "strings", 120),
+    ("loop", "loop", 20000),
+    ("branching", "branching", 40),
+]
+DEFAULT_TOLERANCE = 0.5 # Fraction slower than the baseline to allow, as timings are noisy.
+MIN_DIFFERENCE = 0.002 # Seconds. Smaller differences are always noise.
+
+Results = Dict[str, Dict[str, float]]
+
+
+def time_stages(source: str) -> Dict[str, float]:
+    """Runs a program through every stage once.
+
+    Returns:
+        Dict[str, float]: Seconds taken by each stage.
+    """
+    times = {}
+    def timed(stage: str, f: Callable):
+        start = time.perf_counter()
+        result = f()
+        times[stage] = time.perf_counter() - start
+        return result
+
+    code = timed("preprocess", lambda: preprocess(Code(source)))
+    parser = timed("parse", lambda: Parser(code))
+    graph = timed("get_graph", parser.get_graph)
+    graph = timed("optimise", Optimiser(graph).optimise)
+    with contextlib.redirect_stdout(io.StringIO()):
+        timed("interpret", Interpreter(graph).start_interpreting)
+    return times
+
+
+def run(cases: List[Tuple[str, str, int]] = CASES, repeat: int = 3) -> Results:
+    """Times every case, keeping the fastest time of each stage.
+
+    Args:
+        cases (List[Tuple[str, str, int]], optional): (name, generator, size) of each case. Defaults to CASES.
+        repeat (int, optional): How many times to run each case. Defaults to 3.
+
+    Returns:
+        Results: Seconds taken, by case then stage.
+    """
+    results: Results = {}
+    for name, kind, size in cases:
+        source = generate(kind, size)
+        best: Dict[str, float] = {}
+        for _ in range(repeat):
+            for stage, t in time_stages(source).items():
+                best[stage] = min(best.get(stage, t), t)
+        results[name] = best
+    return results
+
+
+def compare(results: Results, baseline: Results, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Finds stages which are slower than the baseline.
+
+    Returns:
+        List[str]: A description of each regression.
+    """
+    regressions = []
+    for name, stages in baseline.items():
+        for stage, old in stages.items():
+            new = results.get(name, {}).get(stage)
+            if new is not None and new > old * (1 + tolerance) and new - old > MIN_DIFFERENCE:
+                regressions.append(f"{name}/{stage}: {old * 1000:.1f}ms -> {new * 1000:.1f}ms ({new / old - 1:+.0%})")
+    return regressions
+
+
+def save(path: str, results: Results):
+    with open(path, "w") as f:
+        json.dump({"python": platform.python_version(), "machine": platform.machine(), "results": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load(path: str) -> Optional[Results]:
+    try:
+        with open(path) as f:
+            return json.load(f)["results"]
+    except FileNotFoundError:
+        return None
+
+
+def report(results: Results, baseline: Optional[Results]):
+    print(f"{'case':<12}" + "".join(f"{stage:>15}" for stage in STAGES))
+    for name, stages in results.items():
+        cells = []
+        for stage in STAGES:
+            cell = f"{stages[stage] * 1000:.1f}ms"
+            old = (baseline or {}).get(name, {}).get(stage)
+            if old:
+                cell += f" {stages[stage] / old - 1:+.0%}"
+            cells.append(f"{cell:>15}")
+        print(f"{name:<12}" + "".join(cells))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline to compare with")
+    parser.add_argument("--save", help="save the results to this file")
+    parser.add_argument("--update-baseline", action="store_true", help="save the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="fraction slower than the baseline to allow")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each case, keeping the fastest")
+    parser.add_argument("cases", nargs="*", help="only run these cases")
+    args = parser.parse_args(argv)
+
+    cases = [case for case in CASES if not args.cases or case[0] in args.cases]
+    results = run(cases, args.repeat)
+    baseline = load(args.baseline)
+    report(results, baseline)
+    if args.save:
+        save(args.save, results)
+    if args.update_baseline:
+        save(args.baseline, results)
+        return 0
+    if baseline is None:
+        print(f"No baseline at {args.baseline}")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"Slower: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Checks the compiler against the reference grid walker, and compares how long each takes, by program size.
+
+Usage:
+    python benchmarks/bench_reference.py                    Check and time every generator at every size
+    python benchmarks/bench_reference.py --fuzz 5000        Also check 5000 random programs
+    python benchmarks/bench_reference.py --sizes 4 8 loop   Only these sizes and generators
+
+Each program is compiled then interpreted, walked directly, and run with run_fast_start. The last column is how many
+times longer compiling and interpreting takes than walking, so above 1 the reference (or fast start) wins.
+Exits with status 1 if the two ever disagree.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from batch import compile_source
+from generate import GENERATORS, generate, random_grid
+from interpreter import Interpreter
+from pathways_code import Code
+from preprocessing import preprocess
+from reference import DIFFER, Comparison, GridInterpreter, compare, run_fast_start
+
+DEFAULT_SIZES = [4, 8, 16, 32, 64]
+# Random stacks to start fuzzed programs with, as the stack may start with inputs.
+STACKS = [[], [0], [True], [3, -2], ["ab", 1], [False, "", 7]]
+FUZZ_MAX_STEPS = 5_000 # Instructions of each random program to check, as many never finish.
+
+
+def best_time(f: Callable[[], object], repeat: int) -> float:
+    """Runs f a few times, and gets the fastest time in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def time_engines(source: str, repeat: int = 3) -> Dict[str, float]:
+    """Times running a program each way.
+
+    Returns:
+        Dict[str, float]: Seconds taken to compile, to interpret the compiled graph, to walk the grid, and to run with
+            fast start.
+    """
+    graph = compile_source(source)
+    return {
+        "compile": best_time(lambda: compile_source(source), repeat),
+        "interpret": best_time(lambda: Interpreter(graph, []).start_interpreting(), repeat),
+        "walk": best_time(lambda: GridInterpreter(preprocess(Code(source)), []).start_interpreting(), repeat),
+        "fast_start": best_time(lambda: run_fast_start(source, []), repeat),
+    }
+
+
+def fuzz(count: int, seed: int = 0) -> Dict[str, List[Comparison]]:
+    """Compares the engines on random programs.
+
+    Returns:
+        Dict[str, List[Comparison]]: The comparisons, by status.
+    """
+    results: Dict[str, List[Comparison]] = {}
+    for i in range(seed, seed + count):
+        rng = random.Random(i)
+        source = random_grid(rng.randint(4, 16), rng.randint(3, 12), i)
+        stack = rng.choice(STACKS)
+        comparison = compare(source, stack, FUZZ_MAX_STEPS)
+        results.setdefault(comparison.status, []).append(comparison)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="sizes of program to generate")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each program, keeping the fastest")
+    parser.add_argument("--fuzz", type=int, default=0, help="also check this many random programs")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first random program")
+    parser.add_argument("kinds", nargs="*", help="only run these generators")
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'program':<16}{'compile':>11}{'interpret':>11}{'walk':>11}{'fast start':>11}{'ratio':>8}")
+    for kind in GENERATORS:
+        if args.kinds and kind not in args.kinds:
+            continue
+        for size in args.sizes:
+            source = generate(kind, size)
+            comparison = compare(source)
+            if comparison.status == DIFFER:
+                print(f"{kind} {size}: {comparison.detail}")
+                failed = True
+            times = time_engines(source, args.repeat)
+            ratio = (times["compile"] + times["interpret"]) / times["walk"]
+            cells = "".join(f"{times[engine] * 1000:>9.2f}ms" for engine in ("compile", "interpret", "walk", "fast_start"))
+            print(f"{kind + ' ' + str(size):<16}{cells}{ratio:>8.2f}")
+
+    if args.fuzz:
+        results = fuzz(args.fuzz, args.seed)
+        print(", ".join(f"{status} {len(comparisons)}" for status, comparisons in sorted(results.items())))
+        for comparison in results.get(DIFFER, []):
+            print(f"{comparison.source!r} with stack {comparison.stack!r}: {comparison.detail}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Generates synthetic programs of any size, for benchmarking.
+
+Every program in GENERATORS halts, and never prints, raises or divides. random_grid makes programs which might do
+anything, for checking the compiler against the reference.
+"""
+import random
+from typing import Callable, Dict, List
+
+# Instructions which are safe on any mix of ints and bools.
+DENSE_ALPHABET = "0123456789+-~=lgTF&|d"
+# Every kind of character, weighted towards control flow, and a few which are invalid.
+RANDOM_ALPHABET = "0123456789+-*/%~=lgTF&|dd!!" + "<>^v" + "??#nN\"\"'\\" + " " * 8
+EDGE_ARROWS = 0.7 # Chance of each cell at the edge of a random grid being an arrow pointing back in.
+
+
+def snake(body: Callable[[random.Random, int], str], size: int, seed: int = 0, head: str = "") -> str:
+    """Makes a size x size grid which runs along each row in turn, right then left, like a snake.
+
+    Args:
+        body (Callable[[random.Random, int], str]): Makes the code for one row, in the order it is run, given its length.
+        size (int): The width and height of the grid.
+        seed (int, optional): Seed for the random code. Defaults to 0.
+        head (str, optional): Code to run first, at the start of the first row. Defaults to "".
+
+    Returns:
+        str: The program.
+    """
+    rng = random.Random(seed)
+    size = max(size, len(head) + 3)
+    rows = []
+    for y in range(size):
+        code = head + body(rng, size - 2 - len(head)) if y == 0 else body(rng, size - 2)
+        if y % 2 == 0:
+            rows.append(">" + code + "v")
+        else:
+            rows.append("v" + code[::-1] + "<")
+    return "\n".join(rows)
+
+
+def random_body(alphabet: str, density: float) -> Callable[[random.Random, int], str]:
+    def body(rng: random.Random, length: int) -> str:
+        code = "".join(rng.choice(alphabet) if rng.random() < density else " " for _ in range(length))
+        return code.rstrip("?").ljust(length) # A `?` before the turn could end the program early.
+    return body
+
+
+def string_body(rng: random.Random, length: int) -> str:
+    code = ""
+    while True:
+        token = "\"" + "".join(rng.choice("abcdefgh ") for _ in range(rng.randint(1, 8))) + "\"+"
+        if len(code) + len(token) > length:
+            return code.ljust(length)
+        code += token
+
+
+def dense(size: int, seed: int = 0) -> str:
+    """A grid full of straight-line code."""
+    return snake(random_body(DENSE_ALPHABET + "?", 1.0), size, seed)
+
+
+def sparse(size: int, seed: int = 0) -> str:
+    """A grid which is almost all whitespace."""
+    return snake(random_body(DENSE_ALPHABET, 0.02), size, seed)
+
+
+def strings(size: int, seed: int = 0) -> str:
+    """A grid of string literals, concatenated together."""
+    return snake(string_body, size, seed, head="\"\"")
+
+
+def loop(size: int, seed: int = 0) -> str:
+    """A loop counting down from size."""
+    head = f"n{size}>1-d?v"
+    return "\n".join([head, " " * (len(head) - 6) + "^    <"])
+
+
+def branching(size: int, seed: int = 0, iterations: int = 50) -> str:
+    """A loop with size decisions each time round. Every decision goes down and back up again if it is true.
+
+    Args:
+        size (int): The number of decisions in the loop.
+        seed (int, optional): Unused, so every generator takes the same arguments. Defaults to 0.
+        iterations (int, optional): How many times to go round the loop. Defaults to 50.
+    """
+    rows = [f"n{iterations}>", "", ""]
+    start = len(rows[0]) - 1
+    rows[1] = " " * len(rows[0])
+    for i in range(size):
+        rows[0] += f"d{i % 8 + 2}%?v  >"
+        rows[1] += "    >~~^"
+    rows[0] += "1-d?v"
+    rows[1] += "     "
+    rows[2] = " " * start + "^" + " " * (len(rows[0]) - start - 2) + "<"
+    return "\n".join(rows)
+
+
+GENERATORS: Dict[str, Callable[[int, int], str]] = {
+    "dense": dense,
+    "sparse": sparse,
+    "strings": strings,
+    "loop": loop,
+    "branching": branching,
+}
+
+
+def generate(kind: str, size: int, seed: int = 0) -> str:
+    """Generates a program.
+
+    Args:
+        kind (str): One of GENERATORS.
+        size (int): How big to make it. Work grows with the grid area for grids, and linearly otherwise.
+        seed (int, optional): Seed for random code. Defaults to 0.
+
+    Returns:
+        str: The program.
+    """
+    return GENERATORS[kind](size, seed)
+
+
+def random_grid(width: int, height: int, seed: int = 0) -> str:
+    """A grid of random characters, with rows of random lengths. Most of the cells at the edges are arrows pointing
+    back in, so programs usually run for a while before they walk off the end of a line.
+
+    Args:
+        width (int): The longest a row can be.
+        height (int): The number of rows.
+        seed (int, optional): Seed for the random code. Defaults to 0.
+
+    Returns:
+        str: The program.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for y in range(height):
+        row = [rng.choice(RANDOM_ALPHABET) for _ in range(rng.randint(width // 2, width))]
+        for x in range(len(row)):
+            if rng.random() < EDGE_ARROWS:
+                if y == 0 or y == height - 1:
+                    row[x] = "v" if y == 0 else "^"
+                elif x == 0 or x == len(row) - 1:
+                    row[x] = ">" if x == 0 else "<"
+        rows.append("".join(row))
+    return "\n".join(rows)
+
+
+def kinds() -> List[str]:
+    return list(GENERATORS)
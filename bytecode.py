@@ -0,0 +1,366 @@
+"""Bytecode -- A compact encoding of an (optimised) ASG, and a VM to run it.
+
+Every edge's code is lowered to a run of one-byte opcodes in a single shared `bytes` object.
+Literals which don't have their own opcode go in a constant pool, and are referenced by index.
+Nodes and edges are stored as integer indices into flat arrays, so the original graph can be dropped once lowered.
+"""
+import enum
+from array import array
+from typing import Any, Dict, List, Optional, Union
+from asg import ASG, ASGDecisionNode, ASGEdge, ASGNode, ASGTerminalNode
+from instructions import BINARY_OPERATIONS, Instruction, InstructionType, SimpleInstructionType, constant_instruction
+from output import Output, Sink
+from stack_analysis import StackAnalysis
+from type_analysis import INT_CONST_OPERATIONS, TypeAnalysis
+
+
+class Opcode(enum.IntEnum):
+    """Each opcode is one byte, sometimes followed by an argument.
+    Opcodes are grouped so the VM can handle a whole group with one comparison.
+    """      # Argument:
+    # Binary operators. Pop a, then b.
+    AND = 0 # None
+    OR = 1 # None
+    ADD = 2 # None
+    SUB = 3 # None
+    MUL = 4 # None
+    DIV = 5 # None
+    MOD = 6 # None
+    EQUAL = 7 # None
+    LESS = 8 # None
+    GREATER = 9 # None
+    # Push a small constant.
+    FALSE = 10 # None
+    TRUE = 11 # None
+    N0 = 12 # None
+    N1 = 13 # None
+    N2 = 14 # None
+    N3 = 15 # None
+    N4 = 16 # None
+    N5 = 17 # None
+    N6 = 18 # None
+    N7 = 19 # None
+    N8 = 20 # None
+    N9 = 21 # None
+    # Everything else.
+    NEGATE = 22 # None
+    PRINT = 23 # None
+    DUPLICATE = 24 # None
+    POP = 25 # None
+    CONST = 26 # 1 byte index into the constant pool
+    CONST_WIDE = 27 # 4 byte (little endian) index into the constant pool
+    COND = 28 # 1 byte length of the following (conditional) instruction
+    INVALID = 29 # 4 byte index of the error message in the constant pool
+    CONST_OP = 30 # 1 byte binary operator opcode, then 1 byte index into the constant pool
+    # Specialised versions, for operands known to be ints already on the stack (see type_analysis).
+    INT_OP = 31 # 1 byte binary operator opcode
+    INT_NEGATE = 32 # None
+    INT_CONST_OP = 33 # 1 byte binary operator opcode, then 1 byte index into the constant pool
+    # Versions which don't check for an empty stack, where the stack analysis proves there are enough values on it.
+    UNCHECKED_OP = 34 # 1 byte binary operator opcode
+    UNCHECKED_CONST_OP = 35 # 1 byte binary operator opcode, then 1 byte index into the constant pool
+    UNCHECKED_COND = 36 # 1 byte length of the following (conditional) instruction
+    UNCHECKED_DUPLICATE = 37 # None
+    UNCHECKED_PRINT = 38 # None
+    UNCHECKED_POP = 39 # None
+
+    def __str__(self):
+        return self.name
+    __repr__ = __str__
+
+
+SIMPLE_TO_OPCODE = {
+    SimpleInstructionType.AND: Opcode.AND,
+    SimpleInstructionType.OR: Opcode.OR,
+    SimpleInstructionType.ADD: Opcode.ADD,
+    SimpleInstructionType.SUB: Opcode.SUB,
+    SimpleInstructionType.MUL: Opcode.MUL,
+    SimpleInstructionType.DIV: Opcode.DIV,
+    SimpleInstructionType.MOD: Opcode.MOD,
+    SimpleInstructionType.EQUAL: Opcode.EQUAL,
+    SimpleInstructionType.LESS: Opcode.LESS,
+    SimpleInstructionType.GREATER: Opcode.GREATER,
+    SimpleInstructionType.FALSE: Opcode.FALSE,
+    SimpleInstructionType.TRUE: Opcode.TRUE,
+    SimpleInstructionType.NEGATE: Opcode.NEGATE,
+    SimpleInstructionType.PRINT: Opcode.PRINT,
+    SimpleInstructionType.DUPLICATE: Opcode.DUPLICATE,
+    **{SimpleInstructionType(str(i)): Opcode(Opcode.N0 + i) for i in range(10)},
+}
+
+# Indexed by opcode. Called with (a, b), where a was on top of the stack.
+BINARY_OPS = tuple(BINARY_OPERATIONS[simple] for simple, op in sorted(SIMPLE_TO_OPCODE.items(), key=lambda x: x[1]) if op < Opcode.FALSE)
+
+# Indexed by opcode. Called with (b, a), and only on ints. None for operators which are never specialised.
+INT_OPS = tuple(INT_CONST_OPERATIONS.get(simple) for simple, op in sorted(SIMPLE_TO_OPCODE.items(), key=lambda x: x[1]) if op < Opcode.FALSE)
+
+# Opcodes which pop one value, and their unchecked versions.
+UNCHECKED_OPCODES = {
+    Opcode.COND: Opcode.UNCHECKED_COND,
+    Opcode.DUPLICATE: Opcode.UNCHECKED_DUPLICATE,
+    Opcode.PRINT: Opcode.UNCHECKED_PRINT,
+    Opcode.POP: Opcode.UNCHECKED_POP,
+}
+
+# Indexed by opcode - Opcode.FALSE.
+SMALL_CONSTANTS = (False, True, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9)
+
+
+class Program:
+    """A lowered graph. Nodes and edges are referred to by index.
+    """
+    def __init__(self):
+        self.code = b""
+        self.consts: List[Any] = []
+        self.start = 0
+        # Per node. For decision nodes, next_edge is the true edge. -1 for terminal nodes.
+        self.next_edge = array("l")
+        # Per node. The false edge for decision nodes, -1 for everything else.
+        self.false_edge = array("l")
+        # Per edge. The edge's code is code[edge_start[i]:edge_end[i]].
+        self.edge_start = array("L")
+        self.edge_end = array("L")
+        self.edge_dst = array("l")
+
+
+class BytecodeCompiler:
+    """Lowers an ASG to a Program.
+    """
+    def __init__(self, graph: ASG, analysis: Optional[TypeAnalysis] = None, stack_analysis: Optional[StackAnalysis] = None):
+        """
+        Args:
+            graph (ASG): The graph to lower.
+            analysis (TypeAnalysis, optional): The types in the graph, to lower instructions on ints to the INT_ opcodes.
+                Defaults to only using the generic opcodes.
+            stack_analysis (StackAnalysis, optional): Stack depths of the graph, used to lower pops which can't find an
+                empty stack to the UNCHECKED_ opcodes. Defaults to analysing the graph.
+        """
+        self.graph = graph
+        self.analysis = analysis
+        self.stack_analysis = stack_analysis
+        self.code = bytearray()
+        self.consts: List[Any] = []
+        self.const_map: Dict[Any, int] = {}
+
+    def compile(self) -> Program:
+        if self.stack_analysis is None:
+            self.stack_analysis = StackAnalysis(self.graph)
+        program = Program()
+        node_ids: Dict[ASGNode, int] = {node: i for i, node in enumerate(self.graph.nodes)}
+        edge_ids: Dict[ASGEdge, int] = {}
+        for node in self.graph.nodes:
+            for edge in node.out_edges:
+                edge_ids[edge] = len(edge_ids)
+                program.edge_start.append(len(self.code))
+                code = edge.code if self.analysis is None else self.analysis.specialised_code(edge)
+                for inst, depth in zip(code, self.stack_analysis.edge_depths(edge)):
+                    self.lower_instruction(inst, depth)
+                program.edge_end.append(len(self.code))
+                program.edge_dst.append(node_ids[edge.dst])
+        for node in self.graph.nodes:
+            if isinstance(node, ASGTerminalNode) or not node.out_edges:
+                program.next_edge.append(-1)
+                program.false_edge.append(-1)
+            elif isinstance(node, ASGDecisionNode):
+                program.next_edge.append(edge_ids[node.true])
+                program.false_edge.append(edge_ids[node.false])
+            else:
+                program.next_edge.append(edge_ids[node.out_edges[0]])
+                program.false_edge.append(-1)
+        program.start = node_ids[self.graph.start]
+        program.code = bytes(self.code)
+        program.consts = self.consts
+        return program
+
+    def add_const(self, value: Any) -> int:
+        """Adds a value to the constant pool, if it isn't already there.
+
+        Args:
+            value (Any): The value
+
+        Returns:
+            int: Its index in the constant pool.
+        """
+        key = (type(value), value) # Keep True and 1 apart.
+        if key not in self.const_map:
+            self.const_map[key] = len(self.consts)
+            self.consts.append(value)
+        return self.const_map[key]
+
+    def lower_instruction(self, inst: Instruction, depth: float = 0):
+        """Appends the bytecode of an instruction.
+
+        Args:
+            inst (Instruction): The instruction.
+            depth (float, optional): The lowest the stack can be before it (infinite if it is never run), so pops
+                which can't find an empty stack are left unchecked. Defaults to 0.
+        """
+        if inst[0] == InstructionType.SIMPLE:
+            op = SIMPLE_TO_OPCODE[inst[1]]
+            if op < Opcode.FALSE and depth >= 2:
+                self.code += bytes((Opcode.UNCHECKED_OP, op))
+            elif op in UNCHECKED_OPCODES and depth >= 1:
+                self.code.append(UNCHECKED_OPCODES[op])
+            else:
+                self.code.append(op)
+        elif inst[0] in (InstructionType.INTEGER, InstructionType.STRING):
+            index = self.add_const(inst[1])
+            if index < 256:
+                self.code += bytes((Opcode.CONST, index))
+            else:
+                self.code.append(Opcode.CONST_WIDE)
+                self.code += index.to_bytes(4, "little")
+        elif inst[0] == InstructionType.COND:
+            self.code += bytes((Opcode.UNCHECKED_COND if depth >= 1 else Opcode.COND, 0))
+            length_at = len(self.code) - 1
+            self.lower_instruction(inst[1], max(depth - 1, 0))
+            self.code[length_at] = len(self.code) - length_at - 1
+        elif inst[0] == InstructionType.POP:
+            self.code.append(Opcode.UNCHECKED_POP if depth >= 1 else Opcode.POP)
+        elif inst[0] == InstructionType.CONST_OP:
+            index = self.add_const(inst[1][1])
+            if index < 256:
+                self.code += bytes((Opcode.UNCHECKED_CONST_OP if depth >= 1 else Opcode.CONST_OP, SIMPLE_TO_OPCODE[inst[1][0]], index))
+            else: # Too big for a superinstruction, so push then operate.
+                self.lower_instruction(constant_instruction(inst[1][1]), depth)
+                self.lower_instruction((InstructionType.SIMPLE, inst[1][0]), depth + 1)
+        elif inst[0] == InstructionType.INT_OP:
+            if inst[1] == SimpleInstructionType.NEGATE:
+                self.code.append(Opcode.INT_NEGATE)
+            else:
+                self.code += bytes((Opcode.INT_OP, SIMPLE_TO_OPCODE[inst[1]]))
+        elif inst[0] == InstructionType.INT_CONST_OP:
+            index = self.add_const(inst[1][1])
+            if index < 256:
+                self.code += bytes((Opcode.INT_CONST_OP, SIMPLE_TO_OPCODE[inst[1][0]], index))
+            else:
+                self.lower_instruction((InstructionType.CONST_OP, inst[1]))
+        else:
+            # Only fail if the instruction is run, like the interpreter.
+            self.code.append(Opcode.INVALID)
+            self.code += self.add_const(f"Unknown instruction type '{inst}'").to_bytes(4, "little")
+
+
+class VM:
+    """Runs a Program. Equivalent to the Interpreter, but much faster.
+    """
+    def __init__(self, program: Program, output: Optional[Union[Output, Sink]] = None):
+        """
+        Args:
+            program (Program): The program to run.
+            output (Union[Output, Sink], optional): Where to print to. Defaults to a buffered sys.stdout.
+        """
+        self.program = program
+        self.node = program.start
+        self.stack = []
+        self.finished = False
+        self.output = output if isinstance(output, Output) else Output(output)
+
+    def start_interpreting(self):
+        program = self.program
+        code = program.code
+        consts = program.consts
+        next_edge = program.next_edge
+        false_edge = program.false_edge
+        edge_start = program.edge_start
+        edge_end = program.edge_end
+        edge_dst = program.edge_dst
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        write = self.output.write
+        node = self.node
+        # Enum lookups are slow, so use plain ints in the loop.
+        FALSE, NEGATE, CONST, CONST_WIDE, COND, DUPLICATE, PRINT, POP, CONST_OP, INT_OP, INT_NEGATE, INT_CONST_OP = (
+            int(op) for op in (Opcode.FALSE, Opcode.NEGATE, Opcode.CONST, Opcode.CONST_WIDE, Opcode.COND, Opcode.DUPLICATE, Opcode.PRINT, Opcode.POP, Opcode.CONST_OP,
+                               Opcode.INT_OP, Opcode.INT_NEGATE, Opcode.INT_CONST_OP))
+        UNCHECKED_OP, UNCHECKED_CONST_OP, UNCHECKED_COND, UNCHECKED_DUPLICATE, UNCHECKED_PRINT, UNCHECKED_POP = (
+            int(op) for op in (Opcode.UNCHECKED_OP, Opcode.UNCHECKED_CONST_OP, Opcode.UNCHECKED_COND, Opcode.UNCHECKED_DUPLICATE,
+                               Opcode.UNCHECKED_PRINT, Opcode.UNCHECKED_POP))
+        try:
+            while True:
+                edge = next_edge[node]
+                if edge < 0:
+                    break
+                if false_edge[node] >= 0 and not (pop() if stack else 0):
+                    edge = false_edge[node]
+                pc = edge_start[edge]
+                end = edge_end[edge]
+                while pc < end:
+                    op = code[pc]
+                    pc += 1
+                    if op < FALSE:
+                        a = pop() if stack else 0
+                        b = pop() if stack else 0
+                        push(BINARY_OPS[op](a, b))
+                    elif op < NEGATE:
+                        push(SMALL_CONSTANTS[op - FALSE])
+                    elif op == INT_CONST_OP:
+                        stack[-1] = INT_OPS[code[pc]](stack[-1], consts[code[pc + 1]])
+                        pc += 2
+                    elif op == INT_OP:
+                        a = pop()
+                        stack[-1] = INT_OPS[code[pc]](stack[-1], a)
+                        pc += 1
+                    elif op == UNCHECKED_OP:
+                        a = pop()
+                        stack[-1] = BINARY_OPS[code[pc]](a, stack[-1])
+                        pc += 1
+                    elif op == UNCHECKED_CONST_OP:
+                        stack[-1] = BINARY_OPS[code[pc]](consts[code[pc + 1]], stack[-1])
+                        pc += 2
+                    elif op == UNCHECKED_DUPLICATE:
+                        push(stack[-1])
+                    elif op == UNCHECKED_COND:
+                        if pop():
+                            pc += 1
+                        else:
+                            pc += 1 + code[pc]
+                    elif op == CONST:
+                        push(consts[code[pc]])
+                        pc += 1
+                    elif op == CONST_OP:
+                        b = pop() if stack else 0
+                        push(BINARY_OPS[code[pc]](consts[code[pc + 1]], b))
+                        pc += 2
+                    elif op == COND:
+                        if pop() if stack else 0:
+                            pc += 1
+                        else:
+                            pc += 1 + code[pc]
+                    elif op == DUPLICATE:
+                        a = pop() if stack else 0
+                        push(a)
+                        push(a)
+                    elif op == PRINT:
+                        write(pop() if stack else 0)
+                    elif op == NEGATE:
+                        a = pop() if stack else 0
+                        if type(a) == bool:
+                            push(not a)
+                        elif type(a) == int:
+                            push(-a)
+                        elif type(a) == str:
+                            push(a[::-1])
+                        else:
+                            push(a)
+                    elif op == UNCHECKED_PRINT:
+                        write(pop())
+                    elif op == UNCHECKED_POP:
+                        pop()
+                    elif op == POP:
+                        if stack:
+                            pop()
+                    elif op == INT_NEGATE:
+                        stack[-1] = -stack[-1]
+                    elif op == CONST_WIDE:
+                        push(consts[int.from_bytes(code[pc:pc + 4], "little")])
+                        pc += 4
+                    else:
+                        self.node = node
+                        raise ValueError(consts[int.from_bytes(code[pc:pc + 4], "little")])
+                node = edge_dst[edge]
+        finally:
+            self.output.flush()
+        self.node = node
+        self.finished = True
@@ -0,0 +1,258 @@
+"""Cache -- Stores compiled (optimised) graphs on disk, so unchanged programs don't need parsing again.
+
+Entries are keyed by a hash of the source code and COMPILER_VERSION, and evicted least recently used first.
+"""
+import hashlib
+import marshal
+import os
+import struct
+import tempfile
+from typing import Any, List, Optional, Tuple
+from asg import ASG, ASGArrowNode, ASGDecisionNode, ASGEdge, ASGNode, EdgeType
+from instructions import Instruction, InstructionType, SimpleInstructionType
+from optimise_graph import Optimiser
+from parsing import Parser
+from pathways_code import Code
+from preprocessing import preprocess
+from stats import PipelineStats, compile_with_stats
+from util import Direction
+
+COMPILER_VERSION = "5" # Change whenever the parser or optimiser would produce a different graph.
+MAGIC = b"PWAY"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sH") # Magic, format version
+DEFAULT_DIRECTORY = os.environ.get("PATHWAYS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "pathways"))
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024 # 256MB
+
+# Node kinds in the serialised format.
+START = 0
+TERMINAL = 1
+ARROW = 2
+DECISION = 3
+
+
+class CacheFormatError(ValueError):
+    """Raised when serialised data is not a graph this version can read.
+    """
+
+
+def encode_instruction(inst: Instruction) -> Any:
+    if inst[0] == InstructionType.SIMPLE:
+        return (inst[0].value, inst[1].value)
+    if inst[0] == InstructionType.COND:
+        return (inst[0].value, encode_instruction(inst[1]))
+    if inst[0] == InstructionType.CONST_OP:
+        return (inst[0].value, (inst[1][0].value, inst[1][1]))
+    return (inst[0].value, inst[1])
+
+def decode_instruction(data: Any) -> Instruction:
+    type = InstructionType(data[0])
+    if type == InstructionType.SIMPLE:
+        return (type, SimpleInstructionType(data[1]))
+    if type == InstructionType.COND:
+        return (type, decode_instruction(data[1]))
+    if type == InstructionType.CONST_OP:
+        return (type, (SimpleInstructionType(data[1][0]), data[1][1]))
+    return (type, data[1])
+
+def encode_graph(graph: ASG) -> Tuple[tuple, tuple]:
+    """Encodes a graph as tuples of ints, strings and bools.
+
+    Args:
+        graph (ASG): The graph
+
+    Returns:
+        Tuple[tuple, tuple]: The nodes and the edges.
+    """
+    ids = {node: i for i, node in enumerate(graph.nodes)}
+    nodes = []
+    for node in graph.nodes:
+        if node is graph.start:
+            nodes.append((START,))
+        elif node is graph.terminal:
+            nodes.append((TERMINAL,))
+        elif isinstance(node, ASGArrowNode):
+            nodes.append((ARROW, node.dir.value, node.x, node.y))
+        else:
+            nodes.append((DECISION,))
+    edges = [(ids[edge.src], ids[edge.dst], edge.type.value, tuple(map(encode_instruction, edge.code)), tuple(edge.path)) for edge in graph.edges]
+    return tuple(nodes), tuple(edges)
+
+def serialise_graph(graph: ASG) -> bytes:
+    """Serialises a graph into a versioned binary format.
+
+    Args:
+        graph (ASG): The graph
+
+    Returns:
+        bytes: The serialised graph.
+    """
+    return HEADER.pack(MAGIC, FORMAT_VERSION) + marshal.dumps(encode_graph(graph))
+
+def deserialise_graph(data: bytes) -> ASG:
+    """Loads a graph serialised by serialise_graph.
+
+    Args:
+        data (bytes): The serialised graph
+
+    Raises:
+        CacheFormatError: The data is not a graph in this format version.
+
+    Returns:
+        ASG: The graph.
+    """
+    if len(data) < HEADER.size or HEADER.unpack_from(data) != (MAGIC, FORMAT_VERSION):
+        raise CacheFormatError("Not a pathways graph, or from a different version")
+    try:
+        nodes, edges = marshal.loads(data[HEADER.size:])
+        return build_graph(nodes, edges)
+    except CacheFormatError:
+        raise
+    except (EOFError, ValueError, TypeError, IndexError, KeyError, AttributeError) as e: # Anything wrong with the contents.
+        raise CacheFormatError("Corrupt pathways graph") from e
+
+def build_graph(nodes: tuple, edges: tuple) -> ASG:
+    """Rebuilds a graph encoded by encode_graph. Raises whatever error it runs into if the encoding is wrong.
+    """
+    graph = ASG()
+    graph.nodes = []
+    node_list: List[ASGNode] = []
+    for kind, *fields in nodes:
+        if kind == START:
+            node = graph.start
+        elif kind == TERMINAL:
+            node = graph.terminal
+        elif kind == ARROW:
+            node = ASGArrowNode(Direction(fields[0]), fields[1], fields[2])
+            graph.arrow_nodes[(node.dir, node.x, node.y)] = node
+        elif kind == DECISION:
+            node = ASGDecisionNode()
+        else:
+            raise ValueError(f"Unknown node kind {kind!r}")
+        graph.add_node(node)
+        node_list.append(node)
+    if graph.start not in graph.nodes: # Start must be kept, but the terminal node might have been unreachable.
+        raise CacheFormatError("Graph has no start node")
+    for src, dst, type, code, path in edges:
+        if not (0 <= src < len(node_list) and 0 <= dst < len(node_list)):
+            raise IndexError(f"Edge between nodes {src!r} and {dst!r}, out of {len(node_list)}")
+        graph.add_edge(ASGEdge(node_list[src], node_list[dst], list(map(decode_instruction, code)), EdgeType(type), list(path)))
+    return graph
+
+
+class ProgramCache:
+    """A directory of compiled graphs.
+    Nothing is read until a program is looked up, and only that program's graph is loaded.
+    """
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_size: int = DEFAULT_MAX_SIZE):
+        """
+        Args:
+            directory (str, optional): Where to store compiled graphs. Defaults to $PATHWAYS_CACHE_DIR, or ~/.cache/pathways.
+            max_size (int, optional): Total size in bytes to evict down to. Defaults to 256MB.
+        """
+        self.directory = directory
+        self.max_size = max_size
+
+    @staticmethod
+    def key(source: str) -> str:
+        return hashlib.sha256(f"{COMPILER_VERSION}\0{source}".encode("utf-8", "surrogatepass")).hexdigest()
+
+    def path(self, source: str) -> str:
+        return os.path.join(self.directory, self.key(source) + ".pwc")
+
+    def get(self, source: str) -> Optional[ASG]:
+        """Loads a program's graph, if it is in the cache.
+
+        Args:
+            source (str): The program's source code
+
+        Returns:
+            Optional[ASG]: The graph, or None if it isn't cached (or the entry is unreadable).
+        """
+        path = self.path(source)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            graph = deserialise_graph(data)
+        except (OSError, CacheFormatError):
+            return None
+        try:
+            os.utime(path) # Mark as recently used.
+        except OSError:
+            pass
+        return graph
+
+    def put(self, source: str, graph: ASG):
+        """Stores a program's graph, then evicts old entries if the cache is too big.
+
+        Args:
+            source (str): The program's source code
+            graph (ASG): The compiled graph
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(serialise_graph(graph))
+            os.replace(temp_path, self.path(source)) # Atomic, so other processes never see half an entry.
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict()
+
+    def compile(self, source: str, stats: Optional[PipelineStats] = None) -> ASG:
+        """Gets a program's optimised graph, from the cache if possible, otherwise by compiling it.
+
+        Args:
+            source (str): The program's source code
+            stats (PipelineStats, optional): Record the lookup as a "cache" stage (counting hits), then each stage of
+                compiling if it was a miss. Defaults to not measuring.
+
+        Returns:
+            ASG: The optimised graph.
+        """
+        if stats is None:
+            graph = self.get(source)
+        else:
+            with stats.stage("cache") as stage:
+                graph = self.get(source)
+                stage.counts["hits"] = int(graph is not None)
+        if graph is None:
+            if stats is None:
+                graph = Optimiser(Parser(preprocess(Code(source)), lazy=True).get_graph()).optimise()
+            else:
+                graph = compile_with_stats(source, stats, lazy=True)
+            self.put(source, graph)
+        return graph
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache is no bigger than max_size.
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pwc"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue # Deleted by another process.
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Deletes every entry.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pwc"):
+                os.unlink(entry.path)
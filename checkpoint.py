@@ -0,0 +1,151 @@
+"""Checkpoint -- Saves the state of a running program, so it can carry on after its process restarts.
+
+A checkpoint holds the current node, the stack, the output which hasn't been flushed yet, the number of steps taken
+and a fingerprint of the graph. It can only be restored into an interpreter running the same compiled graph.
+Output flushed after the last checkpoint is written again after resuming from it.
+"""
+import hashlib
+import marshal
+import os
+import struct
+import tempfile
+import time
+from typing import Optional
+from asg import ASG
+from cache import encode_graph
+from interpreter import Interpreter
+
+MAGIC = b"PWCK"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sH32s") # Magic, format version, graph fingerprint
+DEFAULT_INTERVAL = 60.0 # Seconds between checkpoints.
+SLICE = 4096 # Steps between looking at the clock.
+
+
+class CheckpointError(ValueError):
+    """Raised when a checkpoint can't be read, or is for a different graph.
+    """
+
+
+def fingerprint(graph: ASG) -> bytes:
+    """Gets a hash of everything about a graph which affects how it runs.
+    The repr of the encoded graph is hashed, not its marshalled bytes, as marshal's output depends on which objects
+    happen to be shared (by reference counts), so it can differ between two compilations of the same program.
+
+    Returns:
+        bytes: The 32 byte fingerprint.
+    """
+    return hashlib.sha256(repr(encode_graph(graph)).encode("utf-8", "surrogatepass")).digest()
+
+def snapshot(interpreter: Interpreter, graph_fingerprint: Optional[bytes] = None) -> bytes:
+    """Serialises the state of an interpreter.
+
+    Args:
+        interpreter (Interpreter): The interpreter, stopped between steps.
+        graph_fingerprint (bytes, optional): fingerprint(interpreter.graph), if it is already known. Defaults to working it out.
+
+    Returns:
+        bytes: The checkpoint.
+    """
+    if graph_fingerprint is None:
+        graph_fingerprint = fingerprint(interpreter.graph)
+    interpreter.graph.nodes # Compacts the node table, so the index is a position in it.
+    output = "".join(interpreter.output.buffer)
+    state = (interpreter.node.index, tuple(interpreter.stack), output, interpreter.steps, interpreter.finished)
+    return HEADER.pack(MAGIC, FORMAT_VERSION, graph_fingerprint) + marshal.dumps(state)
+
+def restore(interpreter: Interpreter, data: bytes, graph_fingerprint: Optional[bytes] = None):
+    """Puts an interpreter back into the state it was in when a checkpoint was taken.
+
+    Args:
+        interpreter (Interpreter): A new interpreter, for the same graph as the checkpoint.
+        data (bytes): The checkpoint.
+        graph_fingerprint (bytes, optional): fingerprint(interpreter.graph), if it is already known. Defaults to working it out.
+
+    Raises:
+        CheckpointError: The data is not a checkpoint in this format version, or it is for a different graph.
+    """
+    if len(data) < HEADER.size:
+        raise CheckpointError("Not a pathways checkpoint")
+    magic, version, saved_fingerprint = HEADER.unpack_from(data)
+    if (magic, version) != (MAGIC, FORMAT_VERSION):
+        raise CheckpointError("Not a pathways checkpoint, or from a different version")
+    if graph_fingerprint is None:
+        graph_fingerprint = fingerprint(interpreter.graph)
+    if saved_fingerprint != graph_fingerprint:
+        raise CheckpointError("Checkpoint is for a different graph")
+    nodes = interpreter.graph.nodes
+    try:
+        index, stack, output, steps, finished = marshal.loads(data[HEADER.size:])
+        if type(index) is not int or not 0 <= index < len(nodes):
+            raise ValueError(f"Bad node index {index!r}")
+        if type(steps) is not int or steps < 0:
+            raise ValueError(f"Bad step count {steps!r}")
+        if type(stack) is not tuple or not all(type(value) in (int, bool, str) for value in stack):
+            raise ValueError("The stack must be a tuple of ints, bools and strings")
+        if type(output) is not str or type(finished) is not bool:
+            raise ValueError("Bad output or finished flag")
+    except (EOFError, ValueError, TypeError) as e:
+        raise CheckpointError("Corrupt pathways checkpoint") from e
+    interpreter.node = nodes[index]
+    interpreter.stack[:] = stack
+    interpreter.steps = steps
+    interpreter.finished = finished
+    interpreter.output.buffer = [output] if output else []
+    interpreter.output.size = len(output)
+
+
+class Checkpointer:
+    """Runs a program, saving a checkpoint to a file every so often, and resuming from it if it is already there.
+    """
+    def __init__(self, path: str, interval: float = DEFAULT_INTERVAL):
+        """
+        Args:
+            path (str): The checkpoint file.
+            interval (float, optional): Seconds between checkpoints. Defaults to DEFAULT_INTERVAL.
+        """
+        self.path = path
+        self.interval = interval
+
+    def run(self, interpreter: Interpreter) -> bool:
+        """Runs a program until it finishes, then deletes the checkpoint.
+
+        Args:
+            interpreter (Interpreter): A new interpreter for the program.
+
+        Raises:
+            CheckpointError: There is a checkpoint for a different graph (or one which can't be read).
+
+        Returns:
+            bool: Whether it resumed from a checkpoint.
+        """
+        graph_fingerprint = fingerprint(interpreter.graph)
+        resumed = self.load(interpreter, graph_fingerprint)
+        last = time.monotonic()
+        while not interpreter.run(SLICE):
+            if time.monotonic() - last >= self.interval:
+                self.save(interpreter, graph_fingerprint)
+                last = time.monotonic()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        return resumed
+
+    def load(self, interpreter: Interpreter, graph_fingerprint: Optional[bytes] = None) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        restore(interpreter, data, graph_fingerprint)
+        return True
+
+    def save(self, interpreter: Interpreter, graph_fingerprint: Optional[bytes] = None):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(snapshot(interpreter, graph_fingerprint))
+            os.replace(temp_path, self.path) # Atomic, so a crash never leaves half a checkpoint.
+        except BaseException:
+            os.unlink(temp_path)
+            raise
@@ -0,0 +1,285 @@
+"""Export -- Writes an ASG to a DOT or GraphML file, to look at in other tools (e.g. Graphviz, Gephi, yEd).
+
+Nodes and edges are written to the file as they are visited, so exporting a huge graph doesn't build a second copy of
+it in memory. Big graphs are hard to look at all at once, so part of the graph can be picked out:
+    near/radius: Only the edges passing within `radius` cells of a point in the code.
+    depth: Only nodes within `depth` edges (either way) of those edges, or of the start if there is no point.
+    profile/min_count: Only edges taken at least `min_count` times in a Profile.
+Long chains of nodes with one edge in and one edge out, and loops (strongly connected components), can also be
+collapsed into single summary nodes.
+
+Usage: python export.py program [-o out.dot | out.graphml] [--near X,Y] [--radius R] [--depth D] [--profile]
+    [--min-count N] [--collapse-chains] [--collapse-loops] [--cache-dir DIR]
+"""
+import argparse
+import sys
+from typing import Dict, Iterator, List, Optional, Set, TextIO, Tuple
+from xml.sax.saxutils import escape, quoteattr
+from asg import ASG, ASGArrowNode, ASGDecisionNode, ASGEdge, ASGNode, ASGStartNode, ASGTerminalNode, EdgeType
+from instructions import stringify_instrs
+from profiler import Profile
+
+MAX_LABEL = 40 # Characters of an edge's code to show. Longer code is cut short with "...".
+MIN_CHAIN = 3 # Fewest nodes in a chain worth collapsing.
+
+# (id, label, kind) where kind is the type of node, "chain" or "loop".
+ExportNode = Tuple[str, str, str]
+# (source id, target id, label, edge type, times taken or None)
+ExportEdge = Tuple[str, str, str, str, Optional[int]]
+
+
+class Exporter:
+    """Picks out part of a graph, and writes it to a file.
+    """
+    def __init__(self, graph: ASG, near: Optional[Tuple[int, int]] = None, radius: int = 0, depth: Optional[int] = None,
+                 profile: Optional[Profile] = None, min_count: int = 1, collapse_chains: bool = False, collapse_loops: bool = False):
+        """
+        Args:
+            graph (ASG): The graph to export.
+            near (Tuple[int, int], optional): Only export edges passing near this (x, y) cell. Defaults to anywhere.
+            radius (int, optional): How far from `near` (in rows or columns) an edge can pass. Defaults to 0.
+            depth (int, optional): Also export nodes this many edges away from the edges near `near` (or from the start).
+                Defaults to no limit.
+            profile (Profile, optional): Only export edges which were taken, and show how often. Defaults to exporting every edge.
+            min_count (int, optional): Times an edge must have been taken, with a profile. Defaults to 1.
+            collapse_chains (bool, optional): Replace chains of at least MIN_CHAIN nodes with one node. Defaults to False.
+            collapse_loops (bool, optional): Replace strongly connected components with one node. Defaults to False.
+        """
+        self.graph = graph
+        self.near = near
+        self.radius = radius
+        self.depth = depth
+        self.profile = profile
+        self.min_count = min_count
+        self.collapse_chains = collapse_chains
+        self.collapse_loops = collapse_loops
+        # Worked out by select(). None means every node.
+        self.nodes: Optional[Set[ASGNode]] = None
+        # The summary node each collapsed node is part of, and the (label, kind) of each summary node.
+        self.groups: Dict[ASGNode, str] = {}
+        self.summaries: Dict[str, Tuple[str, str]] = {}
+
+    def is_hot(self, edge: ASGEdge) -> bool:
+        return self.profile is None or self.profile.edge_counts.get(edge, 0) >= self.min_count
+
+    def is_near(self, edge: ASGEdge) -> bool:
+        x, y = self.near
+        return any(abs(cx - x) <= self.radius and abs(cy - y) <= self.radius for cx, cy in edge.cells())
+
+    def includes(self, edge: ASGEdge) -> bool:
+        """Checks if an edge is exported (possibly inside a summary node).
+        """
+        return self.is_hot(edge) and (self.nodes is None or (edge.src in self.nodes and edge.dst in self.nodes))
+
+    def select(self):
+        """Works out which nodes to export, and which to collapse.
+        """
+        self.nodes = None
+        if self.near is not None:
+            self.nodes = set()
+            for edge in self.graph.edges:
+                if self.is_hot(edge) and self.is_near(edge):
+                    self.nodes.update((edge.src, edge.dst))
+        if self.depth is not None:
+            self.nodes = self.within_depth(self.nodes if self.nodes is not None else {self.graph.start})
+        elif self.nodes is None and self.profile is not None:
+            self.nodes = {node for edge in self.profile.edge_counts if self.is_hot(edge) for node in (edge.src, edge.dst)}
+        self.groups = {}
+        self.summaries = {}
+        if self.collapse_loops:
+            self.find_loops()
+        if self.collapse_chains:
+            self.find_chains()
+
+    def within_depth(self, roots: Set[ASGNode]) -> Set[ASGNode]:
+        """Finds the nodes within self.depth edges of some nodes, following exported edges either way.
+        """
+        found = set(roots)
+        frontier = list(roots)
+        for _ in range(self.depth):
+            next_frontier = []
+            for node in frontier:
+                for edge in node.out_edges + node.in_edges:
+                    if not self.is_hot(edge):
+                        continue
+                    for other in (edge.src, edge.dst):
+                        if other not in found:
+                            found.add(other)
+                            next_frontier.append(other)
+            frontier = next_frontier
+        return found
+
+    def find_loops(self):
+        for component in self.graph.strongly_connected_components():
+            members = [node for node in component if self.nodes is None or node in self.nodes]
+            if len(members) < 2:
+                continue
+            key = f"loop{len(self.summaries)}"
+            for node in members:
+                self.groups[node] = key
+            inside = set(members)
+            edges = [edge for node in members for edge in node.out_edges if edge.dst in inside and self.includes(edge)]
+            size = sum(len(edge.code) for edge in edges)
+            self.summaries[key] = (f"loop: {len(members)} nodes, {len(edges)} edges, {size} instructions", "loop")
+
+    def find_chains(self):
+        def links(node: ASGNode) -> Tuple[List[ASGEdge], List[ASGEdge]]:
+            return ([edge for edge in node.in_edges if self.includes(edge)],
+                    [edge for edge in node.out_edges if self.includes(edge)])
+        def is_link(node: ASGNode) -> bool:
+            if isinstance(node, (ASGStartNode, ASGTerminalNode)) or node in self.groups:
+                return False
+            ins, outs = links(node)
+            return len(ins) == 1 and len(outs) == 1
+        for node in self.graph.nodes: # In graph order, so the chain ids are the same every run.
+            if (self.nodes is not None and node not in self.nodes) or node in self.groups or not is_link(node):
+                continue
+            head = node # Walk back to the start of the chain.
+            while is_link(links(head)[0][0].src) and links(head)[0][0].src is not node:
+                head = links(head)[0][0].src
+            chain = [head]
+            while True:
+                after = links(chain[-1])[1][0].dst
+                if after is head or not is_link(after):
+                    break
+                chain.append(after)
+            if len(chain) < MIN_CHAIN:
+                for member in chain:
+                    self.groups[member] = "" # Checked, but not collapsed.
+                continue
+            key = f"chain{len(self.summaries)}"
+            for member in chain:
+                self.groups[member] = key
+            size = sum(len(links(member)[1][0].code) for member in chain[:-1])
+            self.summaries[key] = (f"chain: {len(chain)} nodes, {size} instructions", "chain")
+        self.groups = {node: key for node, key in self.groups.items() if key}
+
+    @staticmethod
+    def node_id(node: ASGNode) -> str:
+        return f"n{node.id}"
+
+    @staticmethod
+    def node_label(node: ASGNode) -> str:
+        if isinstance(node, ASGArrowNode):
+            return repr(node)[1:-1]
+        if isinstance(node, ASGDecisionNode):
+            return "?"
+        if isinstance(node, ASGStartNode):
+            return "start"
+        if isinstance(node, ASGTerminalNode):
+            return "end"
+        return type(node).__name__
+
+    @staticmethod
+    def edge_label(edge: ASGEdge) -> str:
+        label = stringify_instrs(edge.code)
+        return label if len(label) <= MAX_LABEL else label[:MAX_LABEL - 3] + "..."
+
+    def iter_nodes(self) -> Iterator[ExportNode]:
+        """Iterates over the nodes to export, with each summary node in place of the nodes it collapses.
+        """
+        for node in self.graph.nodes:
+            if (self.nodes is None or node in self.nodes) and node not in self.groups:
+                yield self.node_id(node), self.node_label(node), type(node).__name__
+        for key, (label, kind) in self.summaries.items():
+            yield key, label, kind
+
+    def iter_edges(self) -> Iterator[ExportEdge]:
+        """Iterates over the edges to export, leaving out edges inside summary nodes.
+        """
+        for edge in self.graph.edges:
+            if not self.includes(edge):
+                continue
+            src = self.groups.get(edge.src) or self.node_id(edge.src)
+            dst = self.groups.get(edge.dst) or self.node_id(edge.dst)
+            if src == dst and edge.src in self.groups:
+                continue
+            count = self.profile.edge_counts.get(edge, 0) if self.profile is not None else None
+            yield src, dst, self.edge_label(edge), edge.type.name, count
+
+    def write_dot(self, f: TextIO):
+        self.select()
+        f.write("digraph ASG {\n    node [shape=box, fontname=monospace];\n    edge [fontname=monospace];\n")
+        for key, label, kind in self.iter_nodes():
+            shape = {"ASGDecisionNode": "diamond", "ASGStartNode": "oval", "ASGTerminalNode": "oval", "chain": "box3d", "loop": "folder"}.get(kind, "box")
+            f.write(f"    {key} [label={dot_quote(label)}, shape={shape}];\n")
+        for src, dst, label, type, count in self.iter_edges():
+            attributes = [f"label={dot_quote(label if count is None else f'{label} ({count})')}"]
+            if type != EdgeType.ALWAYS.name:
+                attributes.append("color=green" if type == EdgeType.TRUE.name else "color=red")
+            f.write(f"    {src} -> {dst} [{', '.join(attributes)}];\n")
+        f.write("}\n")
+
+    def write_graphml(self, f: TextIO):
+        self.select()
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                '  <key id="label" for="all" attr.name="label" attr.type="string"/>\n'
+                '  <key id="kind" for="node" attr.name="kind" attr.type="string"/>\n'
+                '  <key id="type" for="edge" attr.name="type" attr.type="string"/>\n'
+                '  <key id="count" for="edge" attr.name="count" attr.type="long"/>\n'
+                '  <graph id="ASG" edgedefault="directed">\n')
+        for key, label, kind in self.iter_nodes():
+            f.write(f'    <node id="{key}"><data key="label">{escape(label)}</data><data key="kind">{kind}</data></node>\n')
+        for src, dst, label, type, count in self.iter_edges():
+            data = f'<data key="label">{escape(label)}</data><data key="type">{type}</data>'
+            if count is not None:
+                data += f'<data key="count">{count}</data>'
+            f.write(f'    <edge source={quoteattr(src)} target={quoteattr(dst)}>{data}</edge>\n')
+        f.write("  </graph>\n</graphml>\n")
+
+    def write(self, f: TextIO, format: str = "dot"):
+        """Writes the graph.
+
+        Args:
+            f (TextIO): The file to write to.
+            format (str, optional): "dot" or "graphml". Defaults to "dot".
+        """
+        if format == "dot":
+            self.write_dot(f)
+        elif format == "graphml":
+            self.write_graphml(f)
+        else:
+            raise ValueError(f"Unknown export format '{format}'")
+
+
+def dot_quote(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from batch import compile_source
+    from cache import ProgramCache
+    from profiler import ProfilingInterpreter
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help="the program to export")
+    parser.add_argument("-o", "--output", default=None, help="file to write to, ending in .dot or .graphml (default: DOT to stdout)")
+    parser.add_argument("--near", default=None, metavar="X,Y", help="only edges passing near this cell")
+    parser.add_argument("--radius", type=int, default=0, help="cells away from --near an edge can pass")
+    parser.add_argument("--depth", type=int, default=None, help="only nodes this many edges from --near (or the start)")
+    parser.add_argument("--profile", action="store_true", help="run the program, and only export the edges it takes")
+    parser.add_argument("--min-count", type=int, default=1, help="times an edge must be taken, with --profile")
+    parser.add_argument("--collapse-chains", action="store_true", help="replace long chains of nodes with one node")
+    parser.add_argument("--collapse-loops", action="store_true", help="replace strongly connected components with one node")
+    parser.add_argument("--cache-dir", default=None, help="cache compiled programs in this directory")
+    args = parser.parse_args(argv)
+
+    with open(args.file, encoding="utf-8") as f:
+        graph = compile_source(f.read(), ProgramCache(args.cache_dir) if args.cache_dir else None)
+    profile = None
+    if args.profile:
+        interpreter = ProfilingInterpreter(graph, []) # Don't mix the program's output into the graph.
+        interpreter.start_interpreting()
+        profile = interpreter.profile
+    near = tuple(int(n) for n in args.near.split(",")) if args.near else None
+    exporter = Exporter(graph, near, args.radius, args.depth, profile, args.min_count, args.collapse_chains, args.collapse_loops)
+    if args.output is None:
+        exporter.write(sys.stdout)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            exporter.write(f, "graphml" if args.output.endswith(".graphml") else "dot")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""Incremental -- Keeps a compiled graph up to date as single characters of the code are edited.
+
+Changing the character at (x, y) can only change 4 lines: row y (left and right) and column x (up and down).
+Only those lines are lexed again, and only the parts of the graph which came from them are replaced.
+The exception is adding or removing a comment bracket, which also changes every line through the boxes it opens or closes.
+
+Two graphs are kept:
+* The raw graph, straight from the lines. Every edge and decision node belongs to the line that made it,
+  and every arrow node to the line in its direction.
+* The optimised graph. Each of its edges remembers which raw edges it was joined from, so that when a raw edge is
+  replaced, only the optimised edges containing it have to be split up and optimised again.
+"""
+from typing import Dict, List, Optional, Set, Tuple
+from asg import ASG, ASGArrowNode, ASGDecisionNode, ASGEdge, ASGNode, EdgeType, Segment
+from instructions import Instruction
+from optimise_graph import Optimiser
+from parsing import Line, Parser
+from pathways_code import Code
+from preprocessing import COMMENT_END, COMMENT_START, preprocess
+from util import Direction
+
+LineKey = Tuple[Direction, int]
+ArrowKey = Tuple[Direction, int, int]
+
+
+class TrackedEdge(ASGEdge):
+    """An edge of the optimised graph, which remembers the raw edges it was made from.
+    """
+    __slots__ = ("parts", "registry")
+
+    def __init__(self, src: ASGNode, dst: ASGNode, code: List[Instruction], type: EdgeType, parts: List[ASGEdge], registry: Dict[ASGEdge, "TrackedEdge"], path: Optional[List[Segment]] = None):
+        super().__init__(src, dst, code, type, path)
+        self.parts = parts
+        self.registry = registry
+        for part in parts:
+            registry[part] = self
+
+    def __add__(self, other: "TrackedEdge") -> "TrackedEdge":
+        return TrackedEdge(self.src, other.dst, self.code + other.code, self.type, self.parts + other.parts, self.registry, self.path + other.path)
+
+
+class TrackedASG(ASG):
+    """The optimised graph. `raws` maps each node to the raw node it is a copy of.
+    """
+    def __init__(self, copies: Dict[ASGNode, ASGNode], registry: Dict[ASGEdge, TrackedEdge]):
+        super().__init__()
+        self.copies = copies
+        self.registry = registry
+        self.raws: Dict[ASGNode, ASGNode] = {}
+        self.new_edges: List[TrackedEdge] = []
+
+    def add_edge(self, edge: TrackedEdge):
+        super().add_edge(edge)
+        self.new_edges.append(edge)
+
+    def remove_edge(self, edge: TrackedEdge):
+        super().remove_edge(edge)
+        for part in edge.parts:
+            if self.registry.get(part) is edge:
+                del self.registry[part]
+
+    def remove_node(self, node: ASGNode):
+        super().remove_node(node)
+        raw = self.raws.pop(node)
+        if self.copies.get(raw) is node:
+            del self.copies[raw]
+
+
+class IncrementalParser:
+    """Parses code, then keeps its optimised graph up to date as it is edited with `set`.
+    """
+    def __init__(self, code: Code):
+        self.code = preprocess(code)
+        self.parser = Parser(code)
+        self.raw = ASG()
+        self.line_arrows: Dict[LineKey, Set[ArrowKey]] = {}
+        self.line_edges: Dict[LineKey, List[ASGEdge]] = {}
+        self.line_decisions: Dict[LineKey, List[ASGNode]] = {}
+        self.edge_lines: Dict[ASGEdge, LineKey] = {}
+        for d in Direction:
+            for i, line in self.parser.lines[d].items():
+                self.add_line_arrows((d, i), line)
+        for d in Direction:
+            for i, line in self.parser.lines[d].items():
+                self.add_line_edges((d, i), line)
+
+        self.copies: Dict[ASGNode, ASGNode] = {}
+        self.registry: Dict[ASGEdge, TrackedEdge] = {}
+        self.graph = TrackedASG(self.copies, self.registry)
+        self.graph.raws[self.graph.start] = self.raw.start
+        self.graph.raws[self.graph.terminal] = self.raw.terminal
+        self.copies[self.raw.start] = self.graph.start
+        self.copies[self.raw.terminal] = self.graph.terminal
+        self.pending: List[ASGNode] = [self.raw.start]
+        self.copy_pending()
+        Optimiser(self.graph).optimise(propagate=False)
+
+    def get_graph(self) -> ASG:
+        """Gets the optimised graph. It is updated in place by `set`.
+        """
+        return self.graph
+
+    def set(self, x: int, y: int, v: str) -> ASG:
+        """Changes a character of the code, and updates the graph.
+
+        Args:
+            x (int): the x coordinate to set
+            y (int): the y coordinate to set
+            v (str): the value to set to
+
+        Returns:
+            ASG: The (updated) optimised graph.
+        """
+        old = self.code.get(x, y)
+        self.code.set(x, y, v)
+        keys = [(Direction.RIGHT, y), (Direction.LEFT, y), (Direction.DOWN, x), (Direction.UP, x)]
+        if old != v and {old, v} & {COMMENT_START, COMMENT_END}:
+            keys.extend(key for key in self.find_comments() if key not in keys)
+        lines = {key: self.lex_line(*key) for key in keys}
+
+        new_arrows = {key: self.get_line_arrows(line) for key, line in lines.items()}
+        gone_arrows = set().union(*(self.line_arrows.get(key, set()) - new_arrows[key] for key in keys))
+        # Lines with exits into arrows which are going need linking again.
+        relink = set(keys)
+        for arrow in gone_arrows:
+            relink.update(self.edge_lines[edge] for edge in self.raw.get_arrow_node(*arrow).in_edges)
+
+        removed_edges: Set[ASGEdge] = set()
+        removed_nodes: List[ASGNode] = []
+        for key in relink:
+            removed_edges.update(self.line_edges.pop(key, []))
+            removed_nodes.extend(self.line_decisions.pop(key, []))
+        removed_nodes.extend(self.raw.get_arrow_node(*arrow) for arrow in gone_arrows)
+        for edge in removed_edges:
+            self.raw.remove_edge(edge)
+            del self.edge_lines[edge]
+        for node in removed_nodes:
+            self.raw.remove_node(node)
+
+        for (d, i), line in lines.items():
+            if line is None:
+                self.parser.lines[d].pop(i, None)
+            else:
+                self.parser.lines[d][i] = line
+            self.line_arrows.pop((d, i), None)
+            if line is not None:
+                self.add_line_arrows((d, i), line)
+        added_edges: List[ASGEdge] = []
+        for d, i in relink:
+            if i in self.parser.lines[d]:
+                added_edges.extend(self.add_line_edges((d, i), self.parser.lines[d][i]))
+
+        self.update_graph(removed_edges, removed_nodes, added_edges)
+        return self.graph
+
+    def find_comments(self) -> List[LineKey]:
+        """Finds the comment boxes again, after a bracket has changed.
+
+        Returns:
+            List[LineKey]: The lines through boxes which have appeared or gone.
+        """
+        def corners(code: Code) -> Set[Tuple[int, int, int, int]]:
+            return {(box.x, box.y, box.x2, box.y2) for box in code.comments.boxes} if code.comments else set()
+        old = corners(self.code)
+        changed = old ^ corners(preprocess(self.code))
+        keys: Set[LineKey] = set()
+        for x, y, x2, y2 in changed:
+            keys.update(key for i in range(y, y2 + 1) for key in ((Direction.RIGHT, i), (Direction.LEFT, i)))
+            keys.update(key for i in range(x, x2 + 1) for key in ((Direction.DOWN, i), (Direction.UP, i)))
+        return list(keys)
+
+    def lex_line(self, dir: Direction, index: int) -> Optional[Line]:
+        """Lexes a single line of the code.
+
+        Returns:
+            Optional[Line]: The line, or None if it is useless.
+        """
+        line = self.parser.lex_line(dir, index)
+        return None if line.is_useless() else line
+
+    @staticmethod
+    def get_line_arrows(line: Optional[Line]) -> Set[ArrowKey]:
+        if line is None:
+            return set()
+        graph = ASG()
+        Parser.add_arrow_nodes(graph, line)
+        return set(graph.arrow_nodes)
+
+    def add_line_arrows(self, key: LineKey, line: Line):
+        arrows = self.get_line_arrows(line)
+        self.line_arrows[key] = arrows
+        for arrow in arrows:
+            if arrow not in self.raw.arrow_nodes:
+                self.raw.add_arrow_node(ASGArrowNode(*arrow))
+
+    def add_line_edges(self, key: LineKey, line: Line) -> List[ASGEdge]:
+        edges_before = len(self.raw.edges)
+        nodes_before = len(self.raw.nodes)
+        line.add_all_edges(self.raw)
+        edges = self.raw.edges[edges_before:]
+        self.line_edges[key] = edges
+        self.line_decisions[key] = self.raw.nodes[nodes_before:]
+        for edge in edges:
+            self.edge_lines[edge] = key
+        return edges
+
+    # Optimised graph
+
+    def update_graph(self, removed_edges: Set[ASGEdge], removed_nodes: List[ASGNode], added_edges: List[ASGEdge]):
+        """Replaces raw edges and nodes in the optimised graph, then optimises only the parts which changed.
+        """
+        self.graph.new_edges = []
+        for edge in removed_edges:
+            tracked = self.registry.get(edge)
+            if tracked is not None:
+                self.split(tracked)
+        for node in removed_nodes:
+            copy = self.copies.get(node)
+            if copy is not None:
+                copy.remove(self.graph)
+        for edge in added_edges:
+            if self.is_present(edge.src):
+                self.copy_edge(edge)
+        self.copy_pending()
+
+        optimiser = Optimiser(self.graph)
+        optimiser.remove_unreachable()
+        touched = [node for edge in self.graph.new_edges for node in (edge.src, edge.dst)]
+        optimiser.remove_boring_nodes(touched)
+        optimiser.fold_constants(edge for edge in self.graph.new_edges if edge.connected)
+        self.graph.new_edges = []
+
+    def is_present(self, node: ASGNode) -> bool:
+        """Checks if a raw node is in the optimised graph, either as a node or in the middle of an edge.
+        """
+        return node in self.copies or any(edge in self.registry for edge in node.in_edges)
+
+    def split(self, tracked: TrackedEdge):
+        """Replaces an optimised edge with (copies of) the raw edges it was made from, except any that have been removed.
+        """
+        self.graph.remove_edge(tracked)
+        for part in tracked.parts:
+            if part.connected:
+                self.copy_edge(part)
+
+    def copy_node(self, node: ASGNode) -> ASGNode:
+        """Gets the copy of a raw node in the optimised graph, adding it if needed.
+        """
+        if node in self.copies:
+            return self.copies[node]
+        for edge in node.in_edges:
+            tracked = self.registry.get(edge)
+            if tracked is not None and tracked.parts[-1] is not edge:
+                self.split(tracked) # It is in the middle of an edge, so split the edge to get it back.
+                return self.copies[node]
+        if node is self.raw.start or node is self.raw.terminal:
+            copy = self.graph.start if node is self.raw.start else self.graph.terminal
+            self.graph.add_node(copy)
+        elif isinstance(node, ASGArrowNode):
+            copy = ASGArrowNode(node.dir, node.x, node.y)
+            self.graph.add_arrow_node(copy)
+        else:
+            copy = ASGDecisionNode()
+            self.graph.add_decision_node(copy)
+        self.graph.raws[copy] = node
+        self.copies[node] = copy
+        self.pending.append(node) # Newly reachable, so everything after it is too.
+        return copy
+
+    def copy_edge(self, edge: ASGEdge):
+        """Adds a copy of a raw edge to the optimised graph (unless it is already there).
+        """
+        if edge in self.registry:
+            return
+        src = self.copy_node(edge.src)
+        if edge in self.registry: # Copied while adding its source.
+            return
+        dst = self.copy_node(edge.dst)
+        if edge in self.registry:
+            return
+        self.graph.add_edge(TrackedEdge(src, dst, list(edge.code), edge.type, [edge], self.registry, list(edge.path)))
+
+    def copy_pending(self):
+        """Copies the out edges of newly added nodes, until everything reachable from them is in the optimised graph.
+        """
+        while self.pending:
+            for edge in self.pending.pop().out_edges:
+                self.copy_edge(edge)
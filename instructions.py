@@ -16,6 +16,10 @@ class InstructionType(enum.Enum):
     INVALID = 7 # Character of the invalid operation. Only used in testing.
     POP = 8 # None. Used for a pop with no replacement.
     EOL = 9 # None. Marks the end of a line.
+    CONST_OP = 10 # (SimpleInstructionType, value). Pushes value, then runs the (binary) simple instruction.
+    # Specialised by type_analysis, where the operands are known to be ints already on the stack. Never in a graph.
+    INT_OP = 11 # SimpleInstructionType. A binary operation, or ~.
+    INT_CONST_OP = 12 # (SimpleInstructionType, int). A CONST_OP.
     
     def __str__(self):
         return self.name
@@ -52,6 +56,68 @@ class SimpleInstructionType(enum.Enum):
         return self.value
     __repr__ = __str__
 
+# The simple instructions which pop a, then b, then push a function of them.
+BINARY_OPERATIONS = {
+    SimpleInstructionType.AND: lambda a, b: a and b,
+    SimpleInstructionType.OR: lambda a, b: a or b,
+    SimpleInstructionType.ADD: lambda a, b: b + a,
+    SimpleInstructionType.SUB: lambda a, b: b - a,
+    SimpleInstructionType.MUL: lambda a, b: b * a,
+    SimpleInstructionType.DIV: lambda a, b: b // a,
+    SimpleInstructionType.MOD: lambda a, b: b % a,
+    SimpleInstructionType.EQUAL: lambda a, b: b == a,
+    SimpleInstructionType.LESS: lambda a, b: b < a,
+    SimpleInstructionType.GREATER: lambda a, b: b > a,
+}
+
+# The simple instructions which only push a constant.
+CONSTANT_VALUES = {
+    SimpleInstructionType.TRUE: True,
+    SimpleInstructionType.FALSE: False,
+    **{SimpleInstructionType(str(i)): i for i in range(10)},
+}
+
+def is_constant(inst: "Instruction") -> bool:
+    """Checks if an instruction only pushes a constant.
+    """
+    return inst[0] in (InstructionType.INTEGER, InstructionType.STRING) or (inst[0] == InstructionType.SIMPLE and inst[1] in CONSTANT_VALUES)
+
+def constant_value(inst: "Instruction"):
+    """Gets the value pushed by a constant instruction (see is_constant)
+    """
+    if inst[0] == InstructionType.SIMPLE:
+        return CONSTANT_VALUES[inst[1]]
+    return inst[1]
+
+def constant_instruction(value) -> "Instruction":
+    """Gets the shortest instruction which pushes a value.
+
+    Args:
+        value (int | bool | str): The value to push
+
+    Returns:
+        Instruction: The instruction.
+    """
+    if type(value) == bool:
+        return (InstructionType.SIMPLE, SimpleInstructionType.TRUE if value else SimpleInstructionType.FALSE)
+    if type(value) == int and 0 <= value <= 9:
+        return (InstructionType.SIMPLE, SimpleInstructionType(str(value)))
+    if type(value) == int:
+        return (InstructionType.INTEGER, value)
+    return (InstructionType.STRING, value)
+
+def negate(value):
+    """The result of the ~ instruction.
+    """
+    if type(value) == bool:
+        return not value
+    elif type(value) == int:
+        return -value
+    elif type(value) == str:
+        return value[::-1]
+    return value
+
+
 class Instruction:
     def __init__(self, type: InstructionType, x: int, y: int, dir: Direction):
         self.x = x
@@ -141,6 +207,8 @@ def stringify_instr(i: Instruction) -> str:
         return f"{'n' if i[1]>0 else 'N'}{abs(i[1])}"
     if i[0] == InstructionType.COND:
         return "?" + stringify_instr(i[1])
+    if i[0] == InstructionType.CONST_OP:
+        return stringify_instr(constant_instruction(i[1][1])) + str(i[1][0])
     if i[0] == InstructionType.STRING:
         return "\"" + i[1].replace("\n", "\\n").replace("\t", "\\t").replace("\r", "\\r").replace("\\", "\\\\").replace("\"", "\\\"") + "\""
     return str(i)
@@ -1,35 +1,103 @@
 from sre_constants import IN
-from asg import ASG, ASGArrowNode, ASGDecisionNode, ASGNode, ASGStartNode, ASGTerminalNode
+from typing import TYPE_CHECKING, Optional, Union
+from asg import ASG, ASGDecisionNode, ASGEdge, ASGTerminalNode
 from instructions import Instruction, InstructionType, SimpleInstructionType
+from output import Output, Sink
+if TYPE_CHECKING:
+    from stats import PipelineStats
 
 
 class Interpreter:
-    def __init__(self, graph: ASG):
+    def __init__(self, graph: ASG, output: Optional[Union[Output, Sink]] = None):
+        """
+        Args:
+            graph (ASG): The graph to run.
+            output (Union[Output, Sink], optional): Where to print to. Defaults to a buffered sys.stdout.
+        """
         self.graph = graph
         self.node = self.graph.start
         self.stack = []
         self.finished = False
+        self.output = output if isinstance(output, Output) else Output(output)
+        self.steps = 0 # Edges taken so far.
+        self.instructions = 0 # Instructions run so far (a `?` and the instruction after it count as one).
     
     def start_interpreting(self):
-        while not self.finished:
-            self.interpret_next_node()
+        """Runs the program until it finishes. Doesn't count steps, which makes it a little faster than run().
+        """
+        try:
+            while not self.finished:
+                self.interpret_next_node()
+        finally:
+            self.output.flush()
+
+    def run(self, max_steps: Optional[int] = None, stats: Optional["PipelineStats"] = None) -> bool:
+        """Runs the program for a while. Call it again to carry on from where it stopped.
+
+        Args:
+            max_steps (int, optional): The most steps to take (a step is one edge, or more in subclasses which skip loops;
+                a call of a compiled trace is a bounded number of steps). Defaults to running until the program finishes.
+            stats (PipelineStats, optional): Record the time taken, and the steps and instructions run, as an "interpret"
+                stage. Defaults to not measuring.
+
+        Returns:
+            bool: Whether the program has finished.
+        """
+        if stats is None:
+            return self.run_steps(max_steps)
+        steps, instructions = self.steps, self.instructions
+        with stats.stage("interpret") as stage:
+            try:
+                return self.run_steps(max_steps)
+            finally:
+                stage.counts["steps"] = self.steps - steps
+                stage.counts["instructions"] = self.instructions - instructions
+
+    def run_steps(self, max_steps: Optional[int]) -> bool:
+        if self.finished:
+            return True
+        steps = 0
+        try:
+            if max_steps is None:
+                while not self.finished:
+                    self.interpret_next_node()
+                    steps += 1
+            else:
+                for steps in range(1, max_steps + 1):
+                    self.interpret_next_node()
+                    if self.finished:
+                        break
+                if not self.finished and isinstance(self.node, ASGTerminalNode):
+                    self.interpret_next_node() # Finishing doesn't take a step.
+                    steps += 1
+        finally:
+            self.steps += steps - self.finished # Reaching the terminal node isn't a step either.
+            self.output.flush()
+        return self.finished
 
     def interpret_next_node(self):
         if isinstance(self.node, ASGTerminalNode):
             self.finished = True
+            self.output.flush()
             return
-        if isinstance(self.node, (ASGStartNode, ASGArrowNode)):
-            edge = self.node.out_edges[0]
-        elif isinstance(self.node, ASGDecisionNode):
-            if self.pop():
-                edge = self.node.true
-            else:
-                edge = self.node.false
+        edge = self.next_edge()
+        self.instructions += len(edge.code)
+        self.run_edge(edge)
+
+    def next_edge(self) -> ASGEdge:
+        """Gets the edge to take out of the current node, popping the condition if it is a decision node.
+        """
+        if isinstance(self.node, ASGDecisionNode):
+            return self.node.true if self.pop() else self.node.false
+        return self.node.out_edges[0]
+
+    def run_edge(self, edge: ASGEdge):
+        """Runs the code of an edge, and moves to the node at its end.
+        """
         for inst in edge.code:
             self.run_instruction(inst)
         self.node = edge.dst
 
-
     def run_instruction(self, inst: Instruction):
         if inst[0] == InstructionType.SIMPLE:
             self.run_simple_instruction(inst[1])
@@ -40,6 +108,9 @@ class Interpreter:
                 self.run_instruction(inst[1])
         elif inst[0] == InstructionType.POP:
             self.pop()
+        elif inst[0] == InstructionType.CONST_OP:
+            self.push(inst[1][1])
+            self.run_simple_instruction(inst[1][0])
         else:
             raise ValueError(f"Unknown instruction type '{inst}'")
     
@@ -100,7 +171,7 @@ class Interpreter:
         elif inst == SimpleInstructionType.FALSE:
             self.push(False)
         elif inst == SimpleInstructionType.PRINT:
-            print(self.pop())
+            self.output.write(self.pop())
         elif inst == SimpleInstructionType.DUPLICATE:
             val = self.pop()
             self.push(val)
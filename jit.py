@@ -0,0 +1,163 @@
+"""JIT -- Compiles hot loops into python functions while the program runs.
+
+The interpreter counts how often it reaches each node. Once a node is hot, it records the edges taken until it gets
+back to that node, then compiles that trace into one function which runs the loop over and over.
+At each decision node in the trace there is a guard. If the decision goes the other way to when the trace was
+recorded, the function returns the edge to take instead, and the interpreter carries on from there.
+A trace only goes round at most TRACE_ITERATIONS times per call (fewer if run() has fewer steps left), so a loop which
+never exits still hands control back to run(), a scheduler or a CPU budget. Every edge a trace takes is counted in `steps`.
+"""
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+from asg import ASG, ASGDecisionNode, ASGEdge, ASGNode, ASGTerminalNode
+from interpreter import Interpreter
+from output import Output, Sink
+from stack_analysis import StackAnalysis, min_depth_after
+from transpiler import HEADER, Transpiler
+
+HOT_THRESHOLD = 50 # Times a node is reached before recording a trace from it.
+MAX_TRACE_EDGES = 1000 # Give up recording a trace longer than this.
+TRACE_ITERATIONS = 1000 # Most times round a loop in one call of its trace.
+
+# Runs a loop until a guard fails or it has gone round `iterations` times. Called with the stack, push, pop, write and
+# iterations. Returns how many edges of the loop it took, and the edge to leave by (None if it ran out of iterations).
+Trace = Callable[[list, Callable, Callable, Callable, int], Tuple[int, Optional[ASGEdge]]]
+
+
+class TraceCompiler(Transpiler):
+    """Compiles a loop of edges into a python function.
+    """
+    def __init__(self, graph: ASG, trace: List[ASGEdge], analysis: Optional[StackAnalysis] = None):
+        """
+        Args:
+            graph (ASG): The graph the trace is in.
+            trace (List[ASGEdge]): The edges of the loop, starting and ending at the same node.
+            analysis (StackAnalysis, optional): Stack depths of the graph, used to skip empty stack checks. Defaults to analysing the graph.
+        """
+        super().__init__(graph, analysis)
+        self.trace = trace
+        self.exits: List[ASGEdge] = []
+
+    def transpile_trace(self) -> str:
+        """Generates the source of a function `trace(stack, push, pop, write, iterations)` (see Trace).
+        """
+        if self.analysis is None:
+            self.analysis = StackAnalysis(self.graph)
+        self.exits = []
+        lines = ["def trace(stack, push, pop, write, iterations):", "    for iteration in range(iterations):"]
+        depth = self.analysis.node_depth[self.trace[0].src] # A lower bound every time round.
+        for taken, edge in enumerate(self.trace):
+            node = edge.src
+            if isinstance(node, ASGDecisionNode):
+                expected = edge is node.true
+                self.exits.append(node.false if expected else node.true)
+                lines.append(f"        if {'not ' if expected else ''}{self.pop(depth)}:")
+                lines.append(f"            return iteration * {len(self.trace)} + {taken}, _exits[{len(self.exits) - 1}]")
+                depth = max(depth - 1, 0)
+            for inst in edge.code:
+                lines.extend(self.transpile_instruction(inst, 2, depth))
+                depth = min_depth_after(inst, depth)
+        lines.append(f"    return iterations * {len(self.trace)}, None")
+        return "\n".join(lines) + "\n"
+
+    def compile(self) -> Trace:
+        """Compiles the trace.
+
+        Returns:
+            Trace: The trace function.
+        """
+        source = self.transpile_trace()
+        namespace = {"__name__": "pathways_trace", "_exits": self.exits}
+        exec(compile(HEADER + source, "<pathways trace>", "exec"), namespace)
+        return namespace["trace"]
+
+
+class TracingInterpreter(Interpreter):
+    """An interpreter which compiles hot loops as it goes.
+    """
+    def __init__(self, graph: ASG, output: Optional[Union[Output, Sink]] = None, hot_threshold: int = HOT_THRESHOLD,
+                 trace_iterations: int = TRACE_ITERATIONS):
+        """
+        Args:
+            graph (ASG): The graph to run.
+            output (Union[Output, Sink], optional): Where to print to. Defaults to a buffered sys.stdout.
+            hot_threshold (int, optional): Times a node is reached before tracing from it. Defaults to HOT_THRESHOLD.
+            trace_iterations (int, optional): Most times round a loop in one step. Defaults to TRACE_ITERATIONS.
+        """
+        super().__init__(graph, output)
+        self.hot_threshold = hot_threshold
+        self.trace_iterations = trace_iterations
+        self.counts: Dict[ASGNode, int] = {}
+        self.traces: Dict[ASGNode, Trace] = {}
+        # Instructions in the first i edges of each trace, for i from 0 to its length.
+        self.trace_instructions: Dict[ASGNode, List[int]] = {}
+        self.untraceable: Set[ASGNode] = set()
+        self.recording: Optional[List[ASGEdge]] = None
+        self.recorded: Set[ASGNode] = set()
+        self.analysis: Optional[StackAnalysis] = None
+        self.step_limit: Optional[int] = None # Steps to stop at, while in run().
+
+    def run_steps(self, max_steps: Optional[int]) -> bool:
+        self.step_limit = None if max_steps is None else self.steps + max_steps
+        try:
+            return super().run_steps(max_steps)
+        finally:
+            self.step_limit = None
+
+    def interpret_next_node(self):
+        node = self.node
+        if self.recording is None:
+            trace = self.traces.get(node)
+            if trace is not None:
+                self.run_trace(trace)
+                return
+        if isinstance(node, ASGTerminalNode):
+            self.finished = True
+            self.output.flush()
+            return
+        edge = self.next_edge()
+        if self.recording is not None:
+            self.record(edge)
+        elif node not in self.untraceable:
+            self.counts[node] = self.counts.get(node, 0) + 1
+            if self.counts[node] >= self.hot_threshold:
+                self.recording = []
+                self.recorded = set()
+                self.record(edge)
+        self.instructions += len(edge.code)
+        self.run_edge(edge)
+
+    def run_trace(self, trace: Trace):
+        """Runs the trace of the current node, as one step, then takes the edge it leaves by (if it did leave).
+        """
+        instructions = self.trace_instructions[self.node]
+        iterations = self.trace_iterations
+        if self.step_limit is not None: # Don't go far past the end of run(max_steps).
+            iterations = max(1, min(iterations, (self.step_limit - self.steps) // (len(instructions) - 1)))
+        taken, edge = trace(self.stack, self.stack.append, self.stack.pop, self.output.write, iterations)
+        loops, rest = divmod(taken, len(instructions) - 1)
+        self.instructions += loops * instructions[-1] + instructions[rest]
+        if edge is None:
+            self.steps += taken - 1 # run() counts the call as a step.
+            return
+        self.steps += taken
+        self.instructions += len(edge.code)
+        self.run_edge(edge)
+
+    def record(self, edge: ASGEdge):
+        """Adds an edge to the trace being recorded, and compiles the trace once it gets back to where it started.
+        """
+        self.recording.append(edge)
+        self.recorded.add(edge.src)
+        head = self.recording[0].src
+        if edge.dst is head:
+            if self.analysis is None:
+                self.analysis = StackAnalysis(self.graph)
+            self.traces[head] = TraceCompiler(self.graph, self.recording, self.analysis).compile()
+            self.trace_instructions[head] = [0]
+            for recorded in self.recording:
+                self.trace_instructions[head].append(self.trace_instructions[head][-1] + len(recorded.code))
+            self.recording = None
+        elif edge.dst in self.recorded or isinstance(edge.dst, ASGTerminalNode) or len(self.recording) >= MAX_TRACE_EDGES:
+            # Went into an inner loop (which will get its own trace), or left the loop.
+            self.untraceable.add(head)
+            self.recording = None
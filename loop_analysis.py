@@ -0,0 +1,315 @@
+"""Loop analysis -- Finds counting loops in the ASG, and works out where they end without running every iteration.
+
+A counting loop is a cycle through one decision node, whose code only does integer arithmetic (`+`, `-`, `*`, `~`
+and comparisons) on a fixed number of values at the top of the stack. Every value must either change by the same
+amount each time round (an induction variable), or be worked out from the induction variables. The value which
+decides whether to go round again is then a linear function of the iteration number, so the number of iterations can
+be solved for, and the stack after the last one worked out directly.
+
+Anything else (printing, strings, division, values which aren't ints, loops which never end) is left to the interpreter.
+"""
+import operator
+from typing import Dict, List, Optional, Set, Union
+from asg import ASG, ASGArrowNode, ASGDecisionNode, ASGEdge, ASGStartNode
+from instructions import CONSTANT_VALUES, Instruction, InstructionType, SimpleInstructionType
+from interpreter import Interpreter
+from output import Output, Sink
+
+MAX_CYCLE_EDGES = 100
+MAX_BACKOFF = 1024 # Most visits to wait before trying to skip a loop again, after it couldn't be skipped.
+
+# Relations with 0, and their opposites.
+NEGATED = {"==": "!=", "!=": "==", "<": ">=", ">=": "<", ">": "<=", "<=": ">"}
+RELATIONS = {"==": operator.eq, "!=": operator.ne, "<": operator.lt, ">=": operator.ge, ">": operator.gt, "<=": operator.le}
+
+
+class Linear:
+    """An integer: the sum of coefficient * x[depth], plus a constant.
+    x[depth] is the value that far down the stack (0 is the top) when an iteration starts.
+    """
+    __slots__ = ("terms", "const")
+
+    def __init__(self, terms: Dict[int, int], const: int):
+        self.terms = {depth: coef for depth, coef in terms.items() if coef != 0}
+        self.const = const
+
+    def __add__(self, other: "Linear") -> "Linear":
+        terms = dict(self.terms)
+        for depth, coef in other.terms.items():
+            terms[depth] = terms.get(depth, 0) + coef
+        return Linear(terms, self.const + other.const)
+
+    def __mul__(self, k: int) -> "Linear":
+        return Linear({depth: coef * k for depth, coef in self.terms.items()}, self.const * k)
+
+    def __neg__(self) -> "Linear":
+        return self * -1
+
+    def __sub__(self, other: "Linear") -> "Linear":
+        return self + -other
+
+    def evaluate(self, x: Dict[int, int]) -> int:
+        return sum(coef * x[depth] for depth, coef in self.terms.items()) + self.const
+
+    def __repr__(self):
+        return " + ".join([f"{coef}*x{depth}" for depth, coef in self.terms.items()] + [str(self.const)])
+
+
+class Condition:
+    """A bool: whether a Linear is <relation> 0.
+    """
+    __slots__ = ("linear", "relation")
+
+    def __init__(self, linear: Linear, relation: str):
+        self.linear = linear
+        self.relation = relation
+
+    def __invert__(self) -> "Condition":
+        return Condition(self.linear, NEGATED[self.relation])
+
+    def evaluate(self, x: Dict[int, int]) -> bool:
+        return RELATIONS[self.relation](self.linear.evaluate(x), 0)
+
+    def __repr__(self):
+        return f"{self.linear!r} {self.relation} 0"
+
+
+Value = Union[Linear, Condition]
+
+
+def first_solution(a: int, b: int, relation: str) -> Optional[int]:
+    """Finds the smallest u >= 0 where a + b*u <relation> 0.
+
+    Returns:
+        Optional[int]: u, or None if there isn't one.
+    """
+    if relation == "==":
+        if b == 0:
+            return 0 if a == 0 else None
+        return -a // b if a % b == 0 and -a // b >= 0 else None
+    if relation == "!=":
+        if a != 0:
+            return 0
+        return 1 if b != 0 else None
+    if relation in (">", ">="): # Flip to < or <=.
+        a, b, relation = -a, -b, "<" if relation == ">" else "<="
+    if (a < 0) if relation == "<" else (a <= 0):
+        return 0
+    if b >= 0:
+        return None
+    # a >= 0 (or a > 0 for <=) and b < 0: a - |b|*u < 0 from u = a // |b| + 1, and <= 0 from u = ceil(a / |b|).
+    return a // -b + 1 if relation == "<" else -(-a // -b)
+
+
+def simulate(code: List[Instruction]) -> Optional[List[Value]]:
+    """Works out what an iteration does to the stack. The value deciding whether to run it is popped first.
+
+    Args:
+        code (List[Instruction]): The code of the iteration.
+
+    Returns:
+        Optional[List[Value]]: The value at each depth afterwards (0 is the top), in terms of the values before.
+            None if the code does anything but integer arithmetic, or doesn't leave the stack the same size.
+    """
+    stack: List[Value] = []
+    depth = 0 # Values below the top which have been used.
+    def pop() -> Value:
+        nonlocal depth
+        if stack:
+            return stack.pop()
+        depth += 1
+        return Linear({depth - 1: 1}, 0)
+
+    pop() # The decision
+    for inst in code:
+        if inst[0] == InstructionType.CONST_OP:
+            op, value = inst[1]
+            if type(value) != int:
+                return None
+            stack.append(Linear({}, value))
+            inst = (InstructionType.SIMPLE, op)
+        if inst[0] == InstructionType.SIMPLE:
+            op = inst[1]
+            if op in CONSTANT_VALUES:
+                if type(CONSTANT_VALUES[op]) != int:
+                    return None
+                stack.append(Linear({}, CONSTANT_VALUES[op]))
+            elif op == SimpleInstructionType.DUPLICATE:
+                value = pop()
+                stack.extend((value, value))
+            elif op == SimpleInstructionType.NEGATE:
+                value = pop()
+                stack.append(~value if isinstance(value, Condition) else -value)
+            elif op in (SimpleInstructionType.ADD, SimpleInstructionType.SUB, SimpleInstructionType.MUL,
+                        SimpleInstructionType.EQUAL, SimpleInstructionType.LESS, SimpleInstructionType.GREATER):
+                a = pop()
+                b = pop()
+                if not isinstance(a, Linear) or not isinstance(b, Linear):
+                    return None
+                if op == SimpleInstructionType.ADD:
+                    stack.append(b + a)
+                elif op == SimpleInstructionType.SUB:
+                    stack.append(b - a)
+                elif op == SimpleInstructionType.MUL:
+                    if a.terms and b.terms:
+                        return None # Not linear
+                    stack.append(b * a.const if not a.terms else a * b.const)
+                else:
+                    stack.append(Condition(b - a, {SimpleInstructionType.EQUAL: "==", SimpleInstructionType.LESS: "<", SimpleInstructionType.GREATER: ">"}[op]))
+            else:
+                return None
+        elif inst[0] == InstructionType.INTEGER:
+            stack.append(Linear({}, inst[1]))
+        elif inst[0] == InstructionType.POP:
+            pop()
+        else:
+            return None
+    if len(stack) != depth:
+        return None
+    return stack[::-1]
+
+
+class CountingLoop:
+    """A loop which can be run all at once.
+    """
+    def __init__(self, node: ASGDecisionNode, cycle: List[ASGEdge], updates: List[Value]):
+        """
+        Args:
+            node (ASGDecisionNode): The decision node the loop goes through.
+            cycle (List[ASGEdge]): The edges from the decision node back to it.
+            updates (List[Value]): The value at each depth after an iteration.
+        """
+        self.node = node
+        self.cycle = cycle
+        self.continues = cycle[0] is node.true # Whether the decision is truthy to go round again.
+        self.updates = updates
+        self.steps: Dict[int, int] = {} # Induction variables, and how much they change by each iteration.
+        self.needs_int: Set[int] = set()
+        for depth, update in enumerate(updates):
+            if isinstance(update, Linear) and update.terms == {depth: 1}:
+                self.steps[depth] = update.const
+                if update.const != 0:
+                    self.needs_int.add(depth)
+            else:
+                linear = update.linear if isinstance(update, Condition) else update
+                self.needs_int.update(linear.terms)
+
+    @classmethod
+    def find(cls, node: ASGDecisionNode) -> "Optional[CountingLoop]":
+        """Checks whether a decision node is the start of a counting loop.
+        """
+        for edge in (node.true, node.false):
+            cycle = [edge]
+            while cycle[-1].dst is not node and len(cycle) < MAX_CYCLE_EDGES:
+                dst = cycle[-1].dst
+                if not isinstance(dst, (ASGArrowNode, ASGStartNode)) or not dst.out_edges:
+                    break
+                cycle.append(dst.out_edges[0])
+            if cycle[-1].dst is not node:
+                continue
+            updates = simulate([inst for edge in cycle for inst in edge.code])
+            if updates is None:
+                return None
+            loop = cls(node, cycle, updates)
+            # Anything which isn't an induction variable must only depend on induction variables.
+            if all(depth in loop.steps for update in updates
+                   for depth in (update.linear if isinstance(update, Condition) else update).terms):
+                return loop
+            return None
+        return None
+
+    def iterations(self, stack: list) -> Optional[int]:
+        """Works out how many more times the loop will go round, when the interpreter is at its decision node.
+
+        Args:
+            stack (list): The stack.
+
+        Returns:
+            Optional[int]: The number of iterations, or None if it can't be worked out (or is infinite).
+        """
+        depth = len(self.updates)
+        if len(stack) < depth:
+            return None
+        x = {d: stack[-1 - d] for d in self.needs_int}
+        if any(type(value) != int for value in x.values()):
+            return None
+        if bool(stack[-1]) != self.continues:
+            return 0
+        # The decision at iteration u + 1 is the update of the top, evaluated with x[d] + u*step[d].
+        update = self.updates[0]
+        linear = update.linear if isinstance(update, Condition) else update
+        a = linear.evaluate(x)
+        b = sum(coef * self.steps[d] for d, coef in linear.terms.items())
+        relation = update.relation if isinstance(update, Condition) else "!="
+        if self.continues:
+            relation = NEGATED[relation]
+        u = first_solution(a, b, relation)
+        return None if u is None else u + 1
+
+    def skip(self, stack: list) -> Optional[int]:
+        """Runs every remaining iteration at once, leaving the interpreter to take the decision out of the loop.
+
+        Args:
+            stack (list): The stack, when the interpreter is at the decision node. Changed in place.
+
+        Returns:
+            Optional[int]: The number of iterations skipped, or None if the loop couldn't be skipped.
+        """
+        n = self.iterations(stack)
+        if not n:
+            return n
+        x = {d: stack[-1 - d] for d in self.needs_int}
+        # Values of the induction variables at the start of the last iteration.
+        last = {d: x[d] + (n - 1) * self.steps[d] for d in x if d in self.steps}
+        for depth, update in enumerate(self.updates):
+            if depth in self.steps:
+                if self.steps[depth]:
+                    stack[-1 - depth] = last[depth] + self.steps[depth]
+            else:
+                stack[-1 - depth] = update.evaluate(last)
+        return n
+
+
+class LoopAnalysis:
+    """Finds every counting loop in a graph.
+    """
+    def __init__(self, graph: ASG):
+        self.loops: Dict[ASGDecisionNode, CountingLoop] = {}
+        for node in graph.nodes:
+            if isinstance(node, ASGDecisionNode):
+                loop = CountingLoop.find(node)
+                if loop is not None:
+                    self.loops[node] = loop
+
+
+class AcceleratingInterpreter(Interpreter):
+    """An interpreter which skips to the end of counting loops.
+    Skipping a loop counts as one step.
+    """
+    def __init__(self, graph: ASG, output: Optional[Union[Output, Sink]] = None, analysis: Optional[LoopAnalysis] = None):
+        """
+        Args:
+            graph (ASG): The graph to run.
+            output (Union[Output, Sink], optional): Where to print to. Defaults to a buffered sys.stdout.
+            analysis (LoopAnalysis, optional): The loops in the graph. Defaults to analysing it.
+        """
+        super().__init__(graph, output)
+        self.loops = (analysis or LoopAnalysis(graph)).loops
+        self.skipped = 0 # Iterations not run.
+        # Loops which couldn't be skipped: [visits until trying again, visits to wait next time].
+        self.backoff: Dict[ASGDecisionNode, List[int]] = {}
+
+    def interpret_next_node(self):
+        loop = self.loops.get(self.node)
+        if loop is not None:
+            backoff = self.backoff.get(self.node)
+            if backoff is not None and backoff[0] > 0:
+                backoff[0] -= 1
+            else:
+                skipped = loop.skip(self.stack)
+                if skipped is None:
+                    wait = min(backoff[1] * 2, MAX_BACKOFF) if backoff is not None else 1
+                    self.backoff[self.node] = [wait, wait]
+                else:
+                    self.skipped += skipped
+        super().interpret_next_node()
@@ -1,17 +1,38 @@
-from optimise_graph import Optimiser
-from pathways_code import Code
-from parsing import Parser
-from preprocessing import preprocess
+import argparse
+import sys
+from cache import ProgramCache
+from export import Exporter
 from interpreter import Interpreter
+from reference import run_fast_start
+from stats import PipelineStats
 
 test_code = """\
 2">!"v
   ^  <
 """
 
-parser = Parser(preprocess(Code(test_code)))
-print(parser)
-graph = parser.get_graph()
-graph = Optimiser(graph).optimise()
-Interpreter(graph).start_interpreting()
-graph.show()
+parser = argparse.ArgumentParser(description="Runs a program, then shows its graph.")
+parser.add_argument("program", nargs="?", default=None, help="the program to run (default: a small test program)")
+parser.add_argument("graph", nargs="?", default=None, help="write the graph to this .dot or .graphml file, instead of printing it. For more options, use export.py")
+parser.add_argument("--stats", action="store_true", help="print the time taken by each stage to stderr")
+parser.add_argument("--trace-memory", action="store_true", help="also measure the peak memory of each stage, with --stats (slow)")
+parser.add_argument("--fast-start", action="store_true", help="start running straight from the grid, and only compile if it takes a while. Doesn't show the graph")
+args = parser.parse_args()
+
+if args.program is not None:
+    with open(args.program, encoding="utf-8") as f:
+        test_code = f.read()
+
+if args.fast_start:
+    run_fast_start(test_code, cache=ProgramCache())
+    sys.exit()
+stats = PipelineStats(args.trace_memory) if args.stats else None
+graph = ProgramCache().compile(test_code, stats) # Only parses if the program has changed since last time.
+Interpreter(graph).run(stats=stats)
+if stats is not None:
+    print(stats.report(), file=sys.stderr)
+if args.graph is not None:
+    with open(args.graph, "w", encoding="utf-8") as f:
+        Exporter(graph).write(f, "graphml" if args.graph.endswith(".graphml") else "dot")
+else:
+    graph.show()
@@ -1,35 +1,317 @@
-from asg import ASG
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from asg import ASG, ASGDecisionNode, ASGEdge, ASGNode, EdgeType
+from instructions import BINARY_OPERATIONS, Instruction, InstructionType, SimpleInstructionType, constant_instruction, constant_value, is_constant, negate
+
+MAX_FOLDED_STRING = 1024 # Don't fold strings longer than this, so `"a"n999999999*` doesn't run at compile time.
+MAX_FOLDED_INT_BITS = 1024 # Don't fold integers bigger than this, so repeated squaring with `d*` doesn't either.
+MAX_KNOWN_VALUES = 32 # Constant propagation only tracks this many values at the top of the stack.
+MAX_COPIED_CODE = 16 # Instructions which may be copied onto the edges into a decision with a known outcome, to remove it.
+
+UNKNOWN = object() # A stack value which isn't known at compile time.
+# What is known about the stack at some point: the values at the top, and whether they are the whole stack.
+Known = Tuple[Tuple[Any, ...], bool]
+# A pass of optimise(): (name, nodes before, edges before, nodes after, edges after, seconds)
+PassRecord = Tuple[str, int, int, int, int, float]
 
 
 class Optimiser:
     def __init__(self, graph: ASG) -> None:
         self.graph = graph
+        self.passes: Optional[List[PassRecord]] = None # Set to a list to record each pass of optimise() in it.
     
-    def optimise(self) -> ASG:
-        self.remove_unreachable()
-        self.remove_boring_nodes()
+    def optimise(self, propagate: bool = True) -> ASG:
+        """Optimises the graph in place.
+
+        Args:
+            propagate (bool, optional): Also propagate constants between edges. This depends on the whole graph, so
+                the incremental parser turns it off. Defaults to True.
+
+        Returns:
+            ASG: The graph.
+        """
+        self.run_pass(self.remove_unreachable)
+        self.run_pass(self.remove_boring_nodes)
+        self.run_pass(self.fold_constants)
+        if propagate and self.run_pass(self.propagate_constants):
+            self.run_pass(self.remove_unreachable)
+            self.run_pass(self.remove_boring_nodes)
+            self.run_pass(self.fold_constants)
         return self.graph
+
+    def run_pass(self, optimisation: Callable[[], Any]) -> Any:
+        """Runs an optimisation, recording it in self.passes if that is a list.
+        """
+        if self.passes is None:
+            return optimisation()
+        nodes, edges = self.graph.node_count, self.graph.edge_count
+        start = time.perf_counter()
+        result = optimisation()
+        self.passes.append((optimisation.__name__, nodes, edges, self.graph.node_count, self.graph.edge_count, time.perf_counter() - start))
+        return result
     
-    def remove_boring_nodes(self):
-        i = 0
-        while i < len(self.graph.nodes):
-            node = self.graph.nodes[i]
-            if node.indeg == 1 and node.outdeg == 1:
-                in_edge = node.in_edges[0]
-                out_edge = node.out_edges[0]
-                in_edge.disconnect()
-                out_edge.disconnect()
-                self.graph.remove_edge(in_edge)
-                self.graph.remove_edge(out_edge)
-                self.graph.remove_node(node)
-                self.graph.add_edge(in_edge + out_edge)
-            else:
-                i += 1
+    def remove_boring_nodes(self, nodes: Optional[Iterable[ASGNode]] = None):
+        """Removes nodes with one edge in and one edge out, joining the edges.
+
+        Args:
+            nodes (Iterable[ASGNode], optional): Only consider these nodes. Defaults to every node.
+        """
+        # Removing a node doesn't change the degree of any other node, so one pass is enough.
+        for node in list(self.graph.nodes) if nodes is None else nodes:
+            if self.is_boring(node): # Removed nodes have no edges, so are never boring.
+                self.remove_boring_node(node)
+
+    @staticmethod
+    def is_boring(node: ASGNode) -> bool:
+        return node.indeg == 1 and node.outdeg == 1 and node.in_edges[0] is not node.out_edges[0]
+
+    def remove_boring_node(self, node: ASGNode):
+        in_edge = node.in_edges[0]
+        out_edge = node.out_edges[0]
+        in_edge.disconnect()
+        out_edge.disconnect()
+        self.graph.remove_edge(in_edge)
+        self.graph.remove_edge(out_edge)
+        self.graph.remove_node(node)
+        self.graph.add_edge(in_edge + out_edge)
     
     def remove_unreachable(self):
         self.graph.set_visited()
         self.graph.start.visit()
-        for node in self.graph.nodes:
+        for node in list(self.graph.nodes):
             if not node.is_visited:
                 # Unreachable
-                node.remove(self.graph)
\ No newline at end of file
+                node.remove(self.graph)
+
+    def fold_constants(self, edges: Optional[Iterable[ASGEdge]] = None):
+        """Runs the peephole optimiser on the code of edges.
+
+        Args:
+            edges (Iterable[ASGEdge], optional): The edges to optimise. Defaults to every edge.
+        """
+        for edge in self.graph.edges if edges is None else edges:
+            edge.code = self.peephole(edge.code)
+
+    def peephole(self, code: List[Instruction]) -> List[Instruction]:
+        """Folds constant expressions, and fuses a constant push followed by a binary operator into a CONST_OP.
+        Anything which would raise an error is left for runtime.
+
+        Args:
+            code (List[Instruction]): The code of an edge
+
+        Returns:
+            List[Instruction]: Equivalent code.
+        """
+        out: List[Instruction] = []
+        for inst in code:
+            self.peephole_instruction(out, inst)
+        return out
+
+    def peephole_instruction(self, out: List[Instruction], inst: Instruction):
+        """Adds an instruction to the end of some (already optimised) code, optimising it if possible.
+        """
+        top_known = len(out) > 0 and is_constant(out[-1])
+        if inst[0] == InstructionType.SIMPLE and inst[1] in BINARY_OPERATIONS and top_known:
+            if len(out) > 1 and is_constant(out[-2]) and not self.is_too_big(inst[1], constant_value(out[-1]), constant_value(out[-2])):
+                try:
+                    result = BINARY_OPERATIONS[inst[1]](constant_value(out[-1]), constant_value(out[-2]))
+                except Exception:
+                    pass # e.g. Division by zero. Must still happen at runtime.
+                else:
+                    out[-2:] = [constant_instruction(result)]
+                    return
+            out[-1] = (InstructionType.CONST_OP, (inst[1], constant_value(out[-1])))
+        elif inst[0] == InstructionType.SIMPLE and inst[1] == SimpleInstructionType.NEGATE and top_known:
+            out[-1] = constant_instruction(negate(constant_value(out[-1])))
+        elif inst[0] == InstructionType.SIMPLE and inst[1] == SimpleInstructionType.DUPLICATE and top_known:
+            out.append(out[-1])
+        elif inst[0] == InstructionType.POP and top_known:
+            out.pop()
+        elif inst[0] == InstructionType.COND and top_known:
+            if constant_value(out.pop()):
+                self.peephole_instruction(out, inst[1])
+        else:
+            out.append(inst)
+
+    @staticmethod
+    def is_too_big(inst: SimpleInstructionType, a, b) -> bool:
+        """Checks if folding a binary operation would make a string longer than MAX_FOLDED_STRING,
+        or an integer longer than MAX_FOLDED_INT_BITS. Sizes are estimated without doing the operation,
+        and string formatting is never folded, as its length depends on the format.
+        """
+        if inst == SimpleInstructionType.MOD and str in (type(a), type(b)):
+            return True # String formatting can pad to any width, like `"%0999999999d"1%`.
+        if type(a) == str and type(b) == str:
+            return inst == SimpleInstructionType.ADD and len(a) + len(b) > MAX_FOLDED_STRING
+        if inst == SimpleInstructionType.MUL and type(a) == str and type(b) in (int, bool):
+            return len(a) * b > MAX_FOLDED_STRING
+        if inst == SimpleInstructionType.MUL and type(b) == str and type(a) in (int, bool):
+            return len(b) * a > MAX_FOLDED_STRING
+        if type(a) in (int, bool) and type(b) in (int, bool):
+            if inst == SimpleInstructionType.MUL:
+                return a.bit_length() + b.bit_length() > MAX_FOLDED_INT_BITS
+            if inst in (SimpleInstructionType.ADD, SimpleInstructionType.SUB):
+                return max(a.bit_length(), b.bit_length()) + 1 > MAX_FOLDED_INT_BITS
+        return False
+
+    def propagate_constants(self) -> bool:
+        """Sparse conditional constant propagation. Works out which stack values are known at each node, only
+        following edges which can be taken. Decisions and conditions with known outcomes are replaced with pops,
+        and edges which can never be taken are removed.
+
+        Returns:
+            bool: Whether anything changed.
+        """
+        # The stack isn't known to start empty, as it can be given inputs (e.g. by batch.Job).
+        states: Dict[ASGNode, Known] = {self.graph.start: ((), False)}
+        taken: Set[ASGEdge] = set()
+        todo = [self.graph.start]
+        while todo:
+            node = todo.pop()
+            for edge, state in self.out_states(node, states[node]):
+                taken.add(edge)
+                after = self.run_known(edge.code, state)
+                old = states.get(edge.dst)
+                new = after if old is None else self.join(old, after)
+                if new != old: # Values only ever become UNKNOWN, so this always stops.
+                    states[edge.dst] = new
+                    todo.append(edge.dst)
+
+        changed = False
+        for node, state in states.items():
+            for edge, before in self.out_states(node, state):
+                conds: List[Any] = []
+                self.run_known(edge.code, before, conds)
+                if any(cond is not UNKNOWN for cond in conds):
+                    edge.code = self.remove_known_conds(edge.code, conds)
+                    changed = True
+        for edge in list(self.graph.edges):
+            if edge not in taken:
+                self.graph.remove_edge(edge)
+                changed = True
+        for node in list(states):
+            if isinstance(node, ASGDecisionNode) and node.outdeg == 1:
+                self.remove_decided(node)
+        return changed
+
+    def out_states(self, node: ASGNode, state: Known) -> Iterator[Tuple[ASGEdge, Known]]:
+        """Gets the edges which can be taken out of a node, and what is known about the stack as they start.
+        """
+        if not isinstance(node, ASGDecisionNode):
+            for edge in node.out_edges:
+                yield edge, state
+            return
+        cond, state = self.pop_known(state)
+        for edge in (node.true, node.false):
+            if edge is not None and (cond is UNKNOWN or bool(cond) == (edge is node.true)):
+                yield edge, state
+
+    @staticmethod
+    def pop_known(state: Known) -> Tuple[Any, Known]:
+        values, exact = state
+        if values:
+            return values[-1], (values[:-1], exact)
+        return (0 if exact else UNKNOWN), state # Popping an empty stack gives 0.
+
+    @staticmethod
+    def join(a: Known, b: Known) -> Known:
+        """Gets what is known about the stack when it could be either of two states.
+        """
+        length = min(len(a[0]), len(b[0]))
+        values = tuple(x if type(x) is type(y) and x == y else UNKNOWN for x, y in zip(a[0][len(a[0]) - length:], b[0][len(b[0]) - length:]))
+        return values, a[1] and b[1] and len(a[0]) == len(b[0])
+
+    def run_known(self, code: List[Instruction], state: Known, conds: Optional[List[Any]] = None) -> Known:
+        """Works out what is known about the stack after some code.
+
+        Args:
+            code (List[Instruction]): The code.
+            state (Known): What is known before it.
+            conds (List[Any], optional): If given, the value popped by each COND instruction is added to it, in order.
+
+        Returns:
+            Known: What is known after it.
+        """
+        for inst in code:
+            if inst[0] == InstructionType.COND:
+                cond, state = self.pop_known(state)
+                if conds is not None:
+                    conds.append(cond)
+                if cond is UNKNOWN:
+                    state = self.join(state, self.run_known([inst[1]], state))
+                elif cond:
+                    state = self.run_known([inst[1]], state)
+                continue
+            values, exact = state
+            stack = list(values)
+            def pop():
+                if stack:
+                    return stack.pop()
+                return 0 if exact else UNKNOWN
+            if is_constant(inst):
+                stack.append(constant_value(inst))
+            elif inst[0] == InstructionType.CONST_OP or (inst[0] == InstructionType.SIMPLE and inst[1] in BINARY_OPERATIONS):
+                op, a = inst[1] if inst[0] == InstructionType.CONST_OP else (inst[1], pop())
+                b = pop()
+                stack.append(self.fold(op, a, b))
+            elif inst[0] == InstructionType.SIMPLE and inst[1] == SimpleInstructionType.NEGATE:
+                a = pop()
+                stack.append(UNKNOWN if a is UNKNOWN else negate(a))
+            elif inst[0] == InstructionType.SIMPLE and inst[1] == SimpleInstructionType.DUPLICATE:
+                a = pop()
+                stack.extend((a, a))
+            elif inst[0] == InstructionType.POP or (inst[0] == InstructionType.SIMPLE and inst[1] == SimpleInstructionType.PRINT):
+                pop()
+            else:
+                return (), False # Raises when run, so never continues.
+            if len(stack) > MAX_KNOWN_VALUES:
+                del stack[:-MAX_KNOWN_VALUES]
+                exact = False
+            state = tuple(stack), exact
+        return state
+
+    def fold(self, op: SimpleInstructionType, a, b):
+        """Gets the result of a binary operation on known values, if it can be worked out at compile time.
+        """
+        if a is UNKNOWN or b is UNKNOWN or self.is_too_big(op, a, b):
+            return UNKNOWN
+        try:
+            return BINARY_OPERATIONS[op](a, b)
+        except Exception:
+            return UNKNOWN # Raises when run, so the value doesn't matter.
+
+    @staticmethod
+    def remove_known_conds(code: List[Instruction], conds: List[Any]) -> List[Instruction]:
+        """Replaces the COND instructions whose conditions are known with a pop, and their instruction if it runs.
+        """
+        out = []
+        conds = iter(conds)
+        for inst in code:
+            if inst[0] != InstructionType.COND:
+                out.append(inst)
+                continue
+            cond = next(conds, UNKNOWN) # Code after an instruction which raises is never run.
+            if cond is UNKNOWN:
+                out.append(inst)
+            else:
+                out.append((InstructionType.POP, None))
+                if cond:
+                    out.append(inst[1])
+        return out
+
+    def remove_decided(self, node: ASGDecisionNode):
+        """Removes a decision node which only has one edge left, by moving its pop onto the edges into it.
+        If that would copy too much code, the missing edge is replaced with a copy of the other instead.
+        """
+        live = node.out_edges[0]
+        in_edges = list(node.in_edges)
+        if live.dst is not node and all(edge.src is not node for edge in in_edges) \
+                and (len(in_edges) == 1 or len(live.code) * len(in_edges) <= MAX_COPIED_CODE):
+            for edge in in_edges:
+                self.graph.remove_edge(edge)
+                self.graph.add_edge(ASGEdge(edge.src, live.dst, edge.code + [(InstructionType.POP, None)] + live.code, edge.type, edge.path + live.path))
+            self.graph.remove_edge(live)
+            self.graph.remove_node(node)
+        else:
+            type = EdgeType.FALSE if live is node.true else EdgeType.TRUE
+            self.graph.add_edge(ASGEdge(node, live.dst, list(live.code), type, list(live.path)))
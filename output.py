@@ -0,0 +1,59 @@
+"""Output -- Where the print instruction (`!`) writes to.
+
+Printed values are buffered, and written to the sink in chunks, so output-heavy programs aren't slowed down by a
+write per value. The buffer is flushed once it is big enough, and when the program finishes.
+"""
+import sys
+from typing import Callable, List, Optional, TextIO, Union
+
+DEFAULT_BUFFER_SIZE = 1 << 16 # Characters.
+
+# A file-like object, a list to append text to, or a function to call with text.
+Sink = Union[TextIO, List[str], Callable[[str], object]]
+
+
+class Output:
+    """A buffered destination for printed values.
+    """
+    def __init__(self, sink: Optional[Sink] = None, buffer_size: Optional[int] = None):
+        """
+        Args:
+            sink (Sink, optional): Where to write text to. A list collects the text in chunks, and a function is called with each chunk.
+                Defaults to sys.stdout (looked up when writing, so redirecting stdout still works).
+            buffer_size (int, optional): Characters to hold before writing them, or 0 to write every value straight away.
+                Defaults to 0 if the sink is a terminal, for interactive use, otherwise DEFAULT_BUFFER_SIZE.
+        """
+        self.sink = sink
+        if buffer_size is None:
+            isatty = getattr(sys.stdout if sink is None else sink, "isatty", None)
+            buffer_size = 0 if isatty is not None and isatty() else DEFAULT_BUFFER_SIZE
+        self.buffer_size = buffer_size
+        self.buffer: List[str] = []
+        self.size = 0
+
+    def write(self, value):
+        """Prints a value, followed by a newline, like print().
+        """
+        text = f"{value}\n"
+        self.buffer.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Writes everything in the buffer to the sink.
+        """
+        if not self.buffer:
+            return
+        text = "".join(self.buffer)
+        self.buffer = []
+        self.size = 0
+        sink = sys.stdout if self.sink is None else self.sink
+        if isinstance(sink, list):
+            sink.append(text)
+        elif hasattr(sink, "write"):
+            sink.write(text)
+            if self.buffer_size == 0:
+                sink.flush()
+        else:
+            sink(text)
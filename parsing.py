@@ -1,8 +1,46 @@
-from asg import ASG, ASGNode
+from asg import ASG, ASGArrowNode, ASGDecisionNode, ASGEdge, ASGNode, EdgeType
 from util import Direction, DIR_TO_SYMBOL, SYM_TO_DIR
 from pathways_code import Code
 from instructions import InstructionType, SimpleInstructionType, Instruction
-from typing import Tuple, List
+from typing import Callable, Optional, Tuple, List, TYPE_CHECKING
+import bisect
+import multiprocessing
+
+if TYPE_CHECKING:
+    from preprocessing import CommentIndex
+
+PARALLEL_THRESHOLD = 1 << 20 # Cells. Smaller programs are lexed serially, as starting processes costs more than it saves.
+CHUNKS_PER_PROCESS = 4
+
+# Character classes, for the lexer.
+SIMPLE = 0
+ARROW = 1
+SPACE = 2
+SKIP = 3
+CONDITION = 4
+NUMBER = 5
+STRING = 6
+CHARACTER = 7
+INVALID = 8
+
+NOOP: Instruction = (InstructionType.NOOP, None)
+EOL: Instruction = (InstructionType.EOL, None)
+DIGITS = frozenset("0123456789")
+INVALID_CLASS = (INVALID, None)
+
+def _make_char_classes() -> "dict[str, Tuple[int, object]]":
+    """Maps each character with a meaning to its class, and a value for that class:
+    the instruction for SIMPLE, the direction for ARROW, and the sign for NUMBER.
+    """
+    classes = {" ": (SPACE, None), "#": (SKIP, None), "?": (CONDITION, None), "n": (NUMBER, 1), "N": (NUMBER, -1),
+               "\"": (STRING, None), "'": (CHARACTER, None)}
+    for symbol, dir in SYM_TO_DIR.items():
+        classes[symbol] = (ARROW, dir)
+    for x in SimpleInstructionType:
+        classes[x.value] = (SIMPLE, (InstructionType.SIMPLE, x))
+    return classes
+
+CHAR_CLASSES = _make_char_classes()
 
 class Line:
     """A Line represents a line of code (may be any of the 4 cardinal directions).
@@ -24,32 +62,83 @@ class Line:
         self.remove_noop()
         self.uncompound()
     
+    @classmethod
+    def from_instructions(cls, instructions: List[Instruction], dir: Direction, index: int, parser: "Parser", length: int) -> "Line":
+        """Makes a line which has already been lexed (e.g. by another process).
+        """
+        line = cls.__new__(cls)
+        line.dir = dir
+        line.index = index
+        line.parser = parser
+        line.dir_symbol = DIR_TO_SYMBOL[dir]
+        line.set_length(length)
+        line.instructions = instructions
+        return line
+
     def __hash__(self):
         return hash((self.index, self.dir))
 
     def parse(self, line:str):
         """Parses this line, by itself, into an InstructionGroup.
 
+        Both string parities are lexed in the same pass: one from the start of the line, and one (with strings as
+        instructions and vice versa) from directly after the first quote. Lexing only depends on the position, so
+        once both reach the same position the rest is only lexed once.
+
         Args:
             line (str): The line as a string.
         """
-        self.instructions: list[Instruction] = []
-        i = 0
         line = "".join(line)
-        while i < len(line):
-            di, instruction = self.get_next_instruction(line, i)
-            i += di
-            self.instructions.append(instruction)
-        self.instructions.append((InstructionType.EOL, None))
-        # Parse with strings as instructions and vice versa
-        # Start parsing directly after the first quote to do this.
-        if "\"" in line:
-            i = line.index("\"") + 1
-            while i < len(line):
+        n = len(line)
+        self.set_length(n)
+
+        first: List[Instruction] = []
+        second: List[Instruction] = []
+        quote = self.first_quote(line)
+        i = 0
+        j = quote + 1 if quote >= 0 else n
+        while i < n or j < n:
+            if i == j:
+                shared = len(first)
+                while i < n:
+                    di, instruction = self.get_next_instruction(line, i)
+                    i += di
+                    first.append(instruction)
+                second.extend(first[shared:])
+                break
+            if i < j:
                 di, instruction = self.get_next_instruction(line, i)
                 i += di
-                self.instructions.append(instruction)
-            self.instructions.append((InstructionType.EOL, None))
+                first.append(instruction)
+            else:
+                di, instruction = self.get_next_instruction(line, j)
+                j += di
+                second.append(instruction)
+        first.append(EOL)
+        if quote >= 0:
+            first.extend(second)
+            first.append(EOL)
+        self.instructions: list[Instruction] = first
+
+    def first_quote(self, line: str) -> int:
+        """Gets the index of the first quote in the line, where the second string parity starts, or -1 if there isn't one.
+        """
+        return line.find("\"")
+
+    def set_length(self, length: int):
+        """Sets the length of the line, and works out where each character of it is.
+        """
+        reverse = self.dir in (Direction.LEFT, Direction.UP)
+        self.length = length
+        self.vertical = self.dir in (Direction.UP, Direction.DOWN)
+        self.start = length - 1 if reverse else 0
+        self.step = -1 if reverse else 1
+
+    def position(self, i: int) -> Tuple[int, int]:
+        """Gets the (x, y) coordinates of a character of the line being parsed.
+        """
+        k = self.start + self.step * i
+        return (self.index, k) if self.vertical else (k, self.index)
     
     def uncompound(self):
         i = 0
@@ -70,52 +159,58 @@ class Line:
         self.instructions = list(filter(lambda x:x[0]!=InstructionType.NOOP,self.instructions))
 
     def add_all_edges(self, graph: ASG):
-        i = 0
-        curr_node = None
-        next_type = None
-        code = []
         if self.index == 0 and self.dir == Direction.RIGHT:
-            curr_node = graph.start
-            next_type = EdgeType.ALWAYS
+            self.add_edges_from(graph, 0, graph.start, self.position(0), graph.get_arrow_node)
+        for i, inst in enumerate(self.instructions):
+            if inst[0] == InstructionType.ENTRY:
+                self.add_edges_from(graph, i + 1, graph.get_arrow_node(self.dir, *inst[1]), inst[1], graph.get_arrow_node)
+
+    def add_edges_from(self, graph: ASG, i: int, node: ASGNode, begin: Tuple[int, int], get_arrow_node: Callable[[Direction, int, int], ASGNode]):
+        """Adds the edges from a node, starting at an instruction, up to the next entry point, exit point or end of line.
+
+        Args:
+            graph (ASG): The graph to add to.
+            i (int): The index of the first instruction after the node.
+            node (ASGNode): The node the edges start at.
+            begin (Tuple[int, int]): The coordinates of the node in the code.
+            get_arrow_node (Callable[[Direction, int, int], ASGNode]): Gets the arrow node at (direction, x, y).
+        """
+        code = []
+        type = EdgeType.ALWAYS
         while i < len(self.instructions):
             inst = self.instructions[i]
-            if curr_node is None and inst[0] != InstructionType.ENTRY:
-                i += 1
-                continue
-            if curr_node is None:
-                curr_node = graph.get_arrow_node(self.dir, *inst[1])
-                next_type = EdgeType.ALWAYS
-            elif inst[0] == InstructionType.EXIT:
-                    dst = graph.get_arrow_node(inst[1][1],*inst[1][0])
-                    graph.add_edge(ASGEdge(curr_node, dst, code, next_type))
-                    code = []
-                    curr_node = None
-                    next_type = None
+            if inst[0] == InstructionType.EXIT:
+                graph.add_edge(ASGEdge(node, get_arrow_node(inst[1][1], *inst[1][0]), code, type, [(begin, inst[1][0])]))
+                return
             elif inst[0] == InstructionType.COND and inst[1][0] == InstructionType.EXIT:
+                end = inst[1][1][0]
                 graph.add_decision_node(mid := ASGDecisionNode())
-                graph.add_edge(ASGEdge(curr_node, mid, code, next_type))
-                dst = graph.get_arrow_node(inst[1][1][1],*inst[1][1][0])
+                graph.add_edge(ASGEdge(node, mid, code, type, [(begin, end)]))
+                dst = get_arrow_node(inst[1][1][1], *end)
                 graph.add_edge(ASGEdge(mid, dst, [], EdgeType.TRUE))
                 code = []
-                curr_node = mid
-                next_type = EdgeType.FALSE
+                node = mid
+                begin = end
+                type = EdgeType.FALSE
             elif inst[0] == InstructionType.ENTRY:
-                dst = graph.get_arrow_node(self.dir,*inst[1])
-                graph.add_edge(ASGEdge(curr_node, dst, code, next_type))
-                code = []
-                curr_node = dst
-                next_type = EdgeType.ALWAYS
+                graph.add_edge(ASGEdge(node, get_arrow_node(self.dir, *inst[1]), code, type, [(begin, inst[1])]))
+                return
             elif inst[0] == InstructionType.EOL:
-                if curr_node is not None:
-                    graph.add_edge(ASGEdge(curr_node, graph.terminal, code, next_type))
-                    curr_node = None
-                    next_type = None
-                    code = []
+                break
             else:
                 code.append(inst)
             i += 1
-        if curr_node is not None:
-            graph.add_edge(ASGEdge(curr_node, graph.terminal, code, next_type))
+        graph.add_edge(ASGEdge(node, graph.terminal, code, type, [(begin, self.position(self.length))]))
+
+    def get_entries(self) -> "dict[Tuple[int, int], List[int]]":
+        """Gets the indices of the entry points in this line, by their coordinates.
+        An arrow can be an entry point in both string parities.
+        """
+        entries = {}
+        for i, inst in enumerate(self.instructions):
+            if inst[0] == InstructionType.ENTRY:
+                entries.setdefault(inst[1], []).append(i)
+        return entries
     
     def is_useless(self):
         if self.dir == Direction.RIGHT and self.index == 0:
@@ -123,89 +218,200 @@ class Line:
         return not any(map(lambda x: x[0] == InstructionType.ENTRY, self.instructions))
 
     def get_next_instruction(self, line: str, i: int) -> Tuple[int, Instruction]:
-            if not (0 <= i < len(line)):
-                return 0,(InstructionType.NOOP, None)
-            c = line[i]
-            if self.dir == Direction.LEFT:
-                X = len(line) - (i + 1)
-                Y = self.index
-            elif self.dir == Direction.UP:
-                X = self.index
-                Y = len(line) - (i + 1)
-            elif self.dir == Direction.RIGHT:
-                X = i
-                Y = self.index
-            else:
-                X = self.index
-                Y = i
-            for x in SimpleInstructionType:
-                if c == x.value:
-                    return 1,(InstructionType.SIMPLE, x)
-            if c == self.dir_symbol:
-                return 1,(InstructionType.ENTRY,(X,Y))
-            if c == "#":
-                return 2, (InstructionType.NOOP, None) # Skip the next character too.
-            elif c in "^v<>":
-                return 1,(InstructionType.EXIT, ((X,Y), SYM_TO_DIR[c]))
-            elif c == "?":
-                di, inst = self.get_next_instruction(line, i+1)
-                return di + 1, (InstructionType.COND, inst)
-            elif c == " ":
-                return 1,(InstructionType.NOOP, None)
-            elif c in "nN":
-                di = 1
-                c2 = "0"
-                num = 0
-                while c2 in "0123456789":
-                    num *= 10
-                    num += int(c2)
-                    if  i + di < len(line):
-                        c2 = line[i + di]
-                    else:
-                        c2 = " "
-                    di += 1
-                return di-1, (InstructionType.INTEGER, num if c == "n" else -num)
-            elif c == "\"":
-                di = 1
-                s = ""
-                while di + i < len(line) and line[di + i] != "\"":
-                    c = line[di + i]
-                    if c != "\\":
-                        s += c
-                    elif di + i + 1 < len(line):
-                            c2 = line[di + i]
-                            s += {"n":"\n","t":"\t","r":"\r"}.get(c2, c2) # Substitute by escape, fall back on character.
-                            di += 1
-                    di += 1
-                if di + i < len(line):
-                    return di + 1, (InstructionType.STRING, s)
-                else:
-                    return di + 1, (InstructionType.NOOP, None)
-            elif c == "'":
-                if i + 1 < len(line):
-                    return 2, (InstructionType.STRING, line[i + 1])
-                return 1, (InstructionType.STRING, "") # End of program if this happens anyway.
-            else:
-                return 1, (InstructionType.INVALID, c)
+        if not (0 <= i < len(line)):
+            return 0, NOOP
+        c = line[i]
+        kind, value = CHAR_CLASSES.get(c, INVALID_CLASS)
+        if kind == SIMPLE:
+            return 1, value
+        if kind == ARROW:
+            if value == self.dir:
+                return 1, (InstructionType.ENTRY, self.position(i))
+            return 1, (InstructionType.EXIT, (self.position(i), value))
+        if kind == SPACE:
+            return 1, NOOP
+        if kind == SKIP:
+            return 2, NOOP # Skip the next character too.
+        if kind == CONDITION:
+            di, inst = self.get_next_instruction(line, i+1)
+            return di + 1, (InstructionType.COND, inst)
+        if kind == NUMBER:
+            end = i + 1
+            while end < len(line) and line[end] in DIGITS:
+                end += 1
+            return end - i, (InstructionType.INTEGER, value * self.read_number(line[i + 1:end]))
+        if kind == STRING:
+            return self.read_string(line, i)
+        if kind == CHARACTER:
+            if i + 1 < len(line):
+                return 2, (InstructionType.STRING, line[i + 1])
+            return 1, (InstructionType.STRING, "") # End of program if this happens anyway.
+        return 1, (InstructionType.INVALID, c)
+
+    @staticmethod
+    def read_number(digits: str) -> int:
+        try:
+            return int(digits) if digits else 0
+        except ValueError: # Longer than int() will convert.
+            num = 0
+            for c in digits:
+                num = num * 10 + ord(c) - ord("0")
+            return num
+
+    @staticmethod
+    def read_string(line: str, i: int) -> Tuple[int, Instruction]:
+        """Reads a string starting with the quote at i. Unterminated strings run to the end of the line and do nothing.
+        """
+        end = line.find("\"", i + 1)
+        if end < 0:
+            end = len(line)
+        s = line[i + 1:end]
+        if "\\" in s:
+            # An escape keeps the backslash and drops the escaped character, which may be a quote.
+            chars = []
+            end = i + 1
+            while end < len(line) and line[end] != "\"":
+                if line[end] != "\\":
+                    chars.append(line[end])
+                elif end + 1 < len(line):
+                    chars.append("\\")
+                    end += 1
+                end += 1
+            s = "".join(chars)
+        if end < len(line):
+            return end - i + 1, (InstructionType.STRING, s)
+        return len(line) - i + 1, NOOP
     
     def __repr__(self):
         return repr(self.instructions) + "\n"
+
+
+class CommentedLine(Line):
+    """A line with comments (see preprocessing) in it. Comments are lexed as if they were spaces, but each one is skipped
+    in one go, and the line isn't copied with them blanked out.
+    """
+    def __init__(self, line: str, dir: Direction, index: int, parser: "Parser", comments: List[Tuple[int, int]]):
+        """
+        Args:
+            comments (List[Tuple[int, int]]): The (start, end) of each comment, as indices along the line, in order.
+        """
+        self.comment_starts = [start for start, _ in comments]
+        self.comment_ends = [end for _, end in comments]
+        super().__init__(line, dir, index, parser)
+
+    def comment_end(self, i: int) -> Optional[int]:
+        """Gets the end of the comment i is in, or None if it isn't in one.
+        """
+        k = bisect.bisect_right(self.comment_starts, i) - 1
+        if k >= 0 and i < self.comment_ends[k]:
+            return self.comment_ends[k]
+        return None
+
+    def next_comment(self, i: int) -> Optional[int]:
+        """Gets the start of the first comment after i, or None if there isn't one.
+        """
+        k = bisect.bisect_right(self.comment_starts, i)
+        return self.comment_starts[k] if k < len(self.comment_starts) else None
+
+    def first_quote(self, line: str) -> int:
+        quote = line.find("\"")
+        while quote >= 0:
+            end = self.comment_end(quote)
+            if end is None:
+                return quote
+            quote = line.find("\"", end)
+        return -1
+
+    def get_next_instruction(self, line: str, i: int) -> Tuple[int, Instruction]:
+        if not (0 <= i < len(line)):
+            return 0, NOOP
+        end = self.comment_end(i)
+        if end is not None:
+            return min(end, len(line)) - i, NOOP
+        c = line[i]
+        if c == "n" or c == "N": # Digits stop at a comment.
+            limit = self.next_comment(i) or len(line)
+            end = i + 1
+            while end < limit and line[end] in DIGITS:
+                end += 1
+            return end - i, (InstructionType.INTEGER, CHAR_CLASSES[c][1] * self.read_number(line[i + 1:end]))
+        if c == "'" and i + 1 < len(line) and self.comment_end(i + 1) is not None:
+            return 2, (InstructionType.STRING, " ")
+        return super().get_next_instruction(line, i)
+
+    def read_string(self, line: str, i: int) -> Tuple[int, Instruction]:
+        di, inst = Line.read_string(line, i)
+        limit = self.next_comment(i)
+        if limit is None or i + di <= limit:
+            return di, inst
+        # The string runs into a comment, so read it from a copy of the rest of the line with the comments blanked out.
+        return Line.read_string(self.blank(line, i), 0)
+
+    def blank(self, line: str, i: int) -> str:
+        """Copies the line from i, with the comments replaced by spaces.
+        """
+        parts = []
+        for start, end in zip(self.comment_starts, self.comment_ends):
+            if end <= i:
+                continue
+            start = max(start, i)
+            parts.append(line[i:start])
+            parts.append(" " * (min(end, len(line)) - start))
+            i = end
+        parts.append(line[i:])
+        return "".join(parts)
+
+
+def make_line(line: str, dir: Direction, index: int, parser: Optional["Parser"], comments: Optional["CommentIndex"]) -> Line:
+    """Lexes a line, skipping any comments in it.
+
+    Args:
+        line (str): The line as a string.
+        dir (Direction): Its direction.
+        index (int): The row (for left and right) or column (for up and down) it is.
+        parser (Parser, optional): The parser it belongs to.
+        comments (CommentIndex, optional): The comments of the code it is from (see preprocessing), or None if it has none.
+
+    Returns:
+        Line: The lexed line.
+    """
+    spans = comments.line_spans(dir, index, len(line)) if comments is not None else None
+    if spans:
+        return CommentedLine(line, dir, index, parser, spans)
+    return Line(line, dir, index, parser)
     
 
 
 class Parser:
     """Parses code into an ASG.
     """
-    def __init__(self, code: Code):
+    def __init__(self, code: Code, processes: Optional[int] = 1, parallel_threshold: int = PARALLEL_THRESHOLD, lazy: bool = False):
+        """
+        Args:
+            code (Code): The code to parse.
+            processes (int, optional): How many processes to lex lines with. None for one per CPU. Defaults to 1.
+            parallel_threshold (int, optional): Only use multiple processes if the code has at least this many cells. Defaults to PARALLEL_THRESHOLD.
+            lazy (bool, optional): Only lex lines when get_graph reaches them, so the graph only has reachable code. Defaults to False.
+        """
+        self.code = code
         self.width = code.width
         self.height = code.height
+        self.lazy = lazy
         self.lines: "dict[Direction, dict[int, Line]]" = {i:{} for i in Direction}
+        self.lines_lexed = 0
+        self.lines_dropped = 0 # Lexed, but thrown away by is_useless.
+        if lazy:
+            return
+        if processes != 1 and self.width * self.height >= parallel_threshold:
+            self.lex_parallel(code, processes)
+            return
+        comments = code.comments
         for i, row in enumerate(code.iter_rows()):
-            self.lines[Direction.RIGHT][i] = Line(row, Direction.RIGHT, i, self)
-            self.lines[Direction.LEFT][i] = Line(row[::-1], Direction.LEFT, i, self)
+            self.lines[Direction.RIGHT][i] = make_line(row, Direction.RIGHT, i, self, comments)
+            self.lines[Direction.LEFT][i] = make_line(row[::-1], Direction.LEFT, i, self, comments)
         for i, col in enumerate(code.iter_cols()):
-            self.lines[Direction.DOWN][i] = Line(col, Direction.DOWN, i, self)
-            self.lines[Direction.UP][i] = Line(col[::-1], Direction.UP, i, self)
+            self.lines[Direction.DOWN][i] = make_line(col, Direction.DOWN, i, self, comments)
+            self.lines[Direction.UP][i] = make_line(col[::-1], Direction.UP, i, self, comments)
         
         # Remove useless
         to_remove: List[Direction, int] = []
@@ -215,6 +421,25 @@ class Parser:
                     to_remove.append((d,k))
         for d,k in to_remove:
             del self.lines[d][k]
+        self.lines_lexed = 2 * (self.width + self.height)
+        self.lines_dropped = len(to_remove)
+
+    def lex_parallel(self, code: Code, processes: Optional[int]):
+        """Lexes every line on a process pool. Useless lines are dropped by the workers, so they are never sent back.
+        Memory mapped code is mapped again by each worker, rather than copied to it.
+        Results are merged in order, so the lines are the same as lexing serially.
+        """
+        processes = processes or multiprocessing.cpu_count()
+        tasks = []
+        for kind, count in (("rows", self.height), ("cols", self.width)):
+            size = max(1, -(-count // (processes * CHUNKS_PER_PROCESS)))
+            tasks.extend((kind, start, min(start + size, count)) for start in range(0, count, size))
+        with multiprocessing.Pool(processes, initializer=_init_lex_worker, initargs=(code,)) as pool:
+            for results in pool.imap(_lex_chunk, tasks):
+                for d, i, instructions, length in results:
+                    self.lines[d][i] = Line.from_instructions(instructions, d, i, self, length)
+        self.lines_lexed = 2 * (self.width + self.height)
+        self.lines_dropped = self.lines_lexed - sum(len(lines) for lines in self.lines.values())
 
     @staticmethod
     def get_xy_from_indices(dir: Direction, rowcolindx: int, lineindx: int) -> Tuple[int, int]:
@@ -222,20 +447,104 @@ class Parser:
             return (lineindx, rowcolindx)
         return (rowcolindx, lineindx)
 
+    def lex_line(self, dir: Direction, index: int) -> Line:
+        """Lexes a single line of the code.
+        """
+        if dir in (Direction.LEFT, Direction.RIGHT):
+            text = self.code.get_row(index) if index < self.code.height else ""
+        else:
+            text = self.code.get_col(index) if index < self.code.width else ""
+        if dir in (Direction.LEFT, Direction.UP):
+            text = text[::-1]
+        self.lines_lexed += 1
+        return make_line(text, dir, index, self, self.code.comments)
+
+    def get_line(self, dir: Direction, index: int) -> Line:
+        """Gets a line, lexing it if it hasn't been yet.
+        """
+        if index not in self.lines[dir]:
+            self.lines[dir][index] = self.lex_line(dir, index)
+        return self.lines[dir][index]
+
     def get_graph(self):
+        if self.lazy:
+            return self.get_reachable_graph()
         graph: ASG = ASG()
         for d in Direction:
-            for i, v in self.lines[d].items():
-                for inst in v.instructions:
-                    if inst[0] == InstructionType.ENTRY:
-                        graph.add_arrow_node(ASGArrowNode(d, *inst[1]))
-                    if inst[0] == InstructionType.COND and inst[1][0] == InstructionType.ENTRY:
-                        graph.add_arrow_node(ASGArrowNode(d,*inst[1][1]))
+            for line in self.lines[d].values():
+                self.add_arrow_nodes(graph, line)
 
         for d in Direction:
             for line in self.lines[d].values():
                 line.add_all_edges(graph)
         return graph
 
+    def get_reachable_graph(self) -> ASG:
+        """Builds the graph from the start, following edges. Lines are only lexed when an exit point leads into them,
+        so the time taken depends on how much code is reachable rather than the size of the grid.
+
+        Returns:
+            ASG: The graph, with only the nodes reachable from the start.
+        """
+        graph = ASG()
+        entries: "dict[Tuple[Direction, int], dict[Tuple[int, int], List[int]]]" = {}
+        todo: List[Tuple[ASGArrowNode, Line, List[int]]] = []
+
+        def get_arrow_node(dir: Direction, x: int, y: int) -> ASGNode:
+            node = graph.arrow_nodes.get((dir, x, y))
+            if node is None:
+                index = y if dir in (Direction.LEFT, Direction.RIGHT) else x
+                line = self.get_line(dir, index)
+                if (dir, index) not in entries:
+                    entries[(dir, index)] = line.get_entries()
+                if (x, y) not in entries[(dir, index)]:
+                    raise KeyError((dir, x, y)) # Same as ASG.get_arrow_node
+                node = ASGArrowNode(dir, x, y)
+                graph.add_arrow_node(node)
+                todo.append((node, line, entries[(dir, index)][(x, y)]))
+            return node
+
+        first = self.get_line(Direction.RIGHT, 0)
+        first.add_edges_from(graph, 0, graph.start, first.position(0), get_arrow_node)
+        while todo:
+            node, line, indices = todo.pop()
+            for i in indices:
+                line.add_edges_from(graph, i + 1, node, (node.x, node.y), get_arrow_node)
+        return graph
+
+    @staticmethod
+    def add_arrow_nodes(graph: ASG, line: Line):
+        """Adds a node to the graph for every entry point of a line.
+        """
+        for inst in line.instructions:
+            if inst[0] == InstructionType.ENTRY:
+                graph.add_arrow_node(ASGArrowNode(line.dir, *inst[1]))
+            if inst[0] == InstructionType.COND and inst[1][0] == InstructionType.ENTRY:
+                graph.add_arrow_node(ASGArrowNode(line.dir, *inst[1][1]))
+
     def __repr__(self):
-        return repr(self.lines)
\ No newline at end of file
+        return repr(self.lines)
+
+
+# Parallel lexing. Each worker gets a copy of the code once, then lexes ranges of rows or columns.
+_worker_code: Optional[Code] = None
+
+def _init_lex_worker(code: Code):
+    global _worker_code
+    _worker_code = code
+
+def _lex_chunk(task: Tuple[str, int, int]) -> List[Tuple[Direction, int, List[Instruction], int]]:
+    kind, start, stop = task
+    out = []
+    for i in range(start, stop):
+        if kind == "rows":
+            text = _worker_code.get_row(i)
+            lines = ((text, Direction.RIGHT), (text[::-1], Direction.LEFT))
+        else:
+            text = _worker_code.get_col(i)
+            lines = ((text, Direction.DOWN), (text[::-1], Direction.UP))
+        for text, d in lines:
+            line = make_line(text, d, i, None, _worker_code.comments)
+            if not line.is_useless():
+                out.append((d, i, line.instructions, line.length))
+    return out
\ No newline at end of file
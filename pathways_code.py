@@ -1,9 +1,17 @@
 import itertools
+import mmap
+import os
 import typing
+from array import array
+
+if typing.TYPE_CHECKING:
+    from preprocessing import CommentIndex
 
 class Code:
     """The first data format the source code is moved into. Used in preprocessing
     """
+    comments: "typing.Optional[CommentIndex]" = None # Where the comment boxes are. Set by preprocessing.
+
     def __init__(self, code: str):
         """Initialises code. splits the code into lines
 
@@ -11,13 +19,26 @@ class Code:
             code (str): The raw pathways source code.
         """
         self.code = code.split("\n")
+        for i in range(len(self.code)): # Remove \r in case they were there.
+            if self.code[i].endswith("\r"):
+                self.code[i] = self.code[i][:-1]
+
         # Get width and height. Useful later.
         self.height = len(self.code)
         self.width = max(map(len, self.code))
 
-        for i in range(self.height): # Remove \r in case they were there.
-            if self.code[i].endswith("\r"):
-                self.code[i] = self.code[i][:-1]
+    @classmethod
+    def from_file(cls, path: str) -> "Code":
+        """Loads code from a file without reading it all into memory.
+        The file is memory mapped, and rows and columns are views of it rather than copies.
+
+        Args:
+            path (str): The file to load (UTF-8).
+
+        Returns:
+            Code: The code.
+        """
+        return MappedCode(path)
 
     def get(self, x: int, y: int) -> str:
         """Gets a character in the code.
@@ -51,6 +72,34 @@ class Code:
             return
         raise IndexError(x,y) # Should never be called, so there is an error in the code, so abort.
 
+    def row_str(self, y: int) -> str:
+        return self.code[y]
+
+    def col_str(self, x: int) -> str:
+        return self.get_col(x)
+
+    def get_row(self, y: int) -> str:
+        """Gets a row, the same as iter_rows would give it.
+
+        Args:
+            y (int): The y coordinate of the row.
+
+        Returns:
+            str: The row.
+        """
+        return self.code[y]
+
+    def get_col(self, x: int) -> str:
+        """Gets a column, the same as iter_cols would give it (padded to the height of the code).
+
+        Args:
+            x (int): The x coordinate of the column.
+
+        Returns:
+            str: The column.
+        """
+        return "".join(self.get(x, y) for y in range(self.height))
+
     # Helper iteration functions
     def iter_rows(self) -> typing.Iterable[str]:
         """Returns an iterable of rows.
@@ -69,4 +118,218 @@ class Code:
         return itertools.zip_longest(*self.code,fillvalue=" ")
     
     def __str__(self):
-        return "\n".join(self.code)
\ No newline at end of file
+        return "\n".join(self.code)
+
+
+class LineView:
+    """A read-only view of a row or column of some code, which may be reversed.
+    Indexing, iterating and reversing (with [::-1]) don't copy the line.
+    """
+    __slots__ = ("code", "index", "vertical", "reverse")
+
+    def __init__(self, code: Code, index: int, vertical: bool, reverse: bool = False):
+        self.code = code
+        self.index = index
+        self.vertical = vertical
+        self.reverse = reverse
+
+    def __len__(self) -> int:
+        return self.code.height if self.vertical else self.code.row_length(self.index)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            if i == slice(None, None, -1):
+                return LineView(self.code, self.index, self.vertical, not self.reverse)
+            return str(self)[i]
+        length = len(self)
+        if i < 0:
+            i += length
+        if not 0 <= i < length:
+            raise IndexError(i)
+        if self.reverse:
+            i = length - 1 - i
+        return self.code.get(self.index, i) if self.vertical else self.code.get(i, self.index)
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(str(self))
+
+    def __str__(self) -> str:
+        if self.vertical:
+            line = self.code.col_str(self.index)
+        else:
+            line = self.code.row_str(self.index)
+        return line[::-1] if self.reverse else line
+
+    def __repr__(self):
+        return f"LineView({str(self)!r})"
+
+
+class _Rows(typing.Sequence):
+    """MappedCode.code -- The rows of a MappedCode, as views.
+    """
+    def __init__(self, code: "MappedCode"):
+        self.mapped = code
+
+    def __len__(self) -> int:
+        return self.mapped.height
+
+    def __getitem__(self, y: int) -> LineView:
+        if not 0 <= y < len(self):
+            raise IndexError(y)
+        return LineView(self.mapped, y, False)
+
+
+COLUMN_BLOCK = 256 # Columns MappedCode.iter_cols builds at a time, so it reads each row once per block.
+
+
+class MappedCode(Code):
+    """Code which is memory mapped from a file (see Code.from_file).
+
+    Row offsets are found the first time they are needed. ASCII rows are read straight from the mapping.
+    Columns are copied out of the rows, a block of them at a time.
+    Rows with other characters are decoded and kept, as their byte and character indices differ.
+    Changes (with set) are copy-on-write, so never change the file.
+    Use it as a context manager, or call close, to unmap the file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size > 0:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_COPY)
+        else:
+            self.data = bytearray() # Empty files can't be mapped.
+        self.starts = array("Q")
+        self.ends = array("Q")
+        self.wide_rows: "typing.Dict[int, str]" = {}
+        self.scanned = 0 # Offset of the first byte not yet indexed.
+        self.indexed = False
+        self.max_width = 0
+        self.edits: "typing.List[typing.Tuple[int, int, str]]" = []
+        self.code = _Rows(self)
+
+    def __getstate__(self):
+        return {"path": self.path, "edits": self.edits, "comments": self.comments} # Each process maps the file itself.
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+        for x, y, v in state["edits"]:
+            self.set(x, y, v)
+        self.comments = state["comments"]
+
+    def close(self):
+        """Unmaps the file.
+        """
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self) -> "MappedCode":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def index_to(self, y: int):
+        """Finds the offsets of rows up to and including row y (or the last row).
+        """
+        data = self.data
+        while not self.indexed and len(self.starts) <= y:
+            start = self.scanned
+            end = data.find(b"\n", start)
+            if end < 0:
+                end = len(data)
+                self.indexed = True
+            self.scanned = end + 1
+            if end > start and data[end - 1] == ord("\r"): # Remove \r in case they were there.
+                end -= 1
+            row = len(self.starts)
+            self.starts.append(start)
+            self.ends.append(end)
+            if not data[start:end].isascii():
+                self.wide_rows[row] = data[start:end].decode("utf-8")
+            self.max_width = max(self.max_width, self.row_length(row))
+
+    def index_all(self):
+        while not self.indexed:
+            self.index_to(len(self.starts))
+
+    @property
+    def height(self) -> int:
+        self.index_all()
+        return len(self.starts)
+
+    @property
+    def width(self) -> int:
+        self.index_all()
+        return self.max_width
+
+    def row_length(self, y: int) -> int:
+        if y in self.wide_rows:
+            return len(self.wide_rows[y])
+        return self.ends[y] - self.starts[y]
+
+    def row_str(self, y: int) -> str:
+        if y in self.wide_rows:
+            return self.wide_rows[y]
+        return self.data[self.starts[y]:self.ends[y]].decode("ascii")
+
+    def col_str(self, x: int) -> str:
+        return self.col_strs(x, 1)[0]
+
+    def col_strs(self, x: int, count: int) -> "typing.List[str]":
+        """Builds the columns from x to x + count (padded to the height), going through each row once.
+        """
+        self.index_all()
+        data = self.data
+        parts = []
+        for y, (start, end) in enumerate(zip(self.starts, self.ends)):
+            if y in self.wide_rows:
+                part = self.wide_rows[y][x:x + count]
+            else:
+                part = data[min(start + x, end):min(start + x + count, end)].decode("ascii")
+            parts.append(part.ljust(count))
+        block = "".join(parts)
+        return [block[i::count] for i in range(count)]
+
+    def get(self, x: int, y: int) -> str:
+        self.index_to(y)
+        if not 0 <= y < len(self.starts) or x < 0:
+            return " " # Whitespace if not in range.
+        if y in self.wide_rows:
+            row = self.wide_rows[y]
+            return row[x] if x < len(row) else " "
+        if x < self.ends[y] - self.starts[y]:
+            return chr(self.data[self.starts[y] + x])
+        return " "
+
+    def set(self, x: int, y: int, v: str) -> None:
+        if len(v) != 1: # Rows are views of the file, so can't change length.
+            raise ValueError(f"Can only set one character at a time, not {v!r}")
+        self.index_to(y)
+        if 0 <= y < len(self.starts) and 0 <= x < self.row_length(y):
+            self.edits.append((x, y, v))
+            if y not in self.wide_rows and v.isascii():
+                self.data[self.starts[y] + x] = ord(v)
+            else:
+                row = self.row_str(y)
+                self.wide_rows[y] = row[:x] + v + row[x+1:]
+            return
+        if v == " ":
+            return
+        raise IndexError(x,y)
+
+    def get_row(self, y: int) -> LineView:
+        return self.code[y]
+
+    def get_col(self, x: int) -> LineView:
+        return LineView(self, x, True)
+
+    def iter_rows(self) -> typing.Iterable[LineView]:
+        return iter(self.code)
+
+    def iter_cols(self) -> typing.Iterable[str]:
+        for x in range(0, self.width, COLUMN_BLOCK):
+            yield from self.col_strs(x, min(COLUMN_BLOCK, self.width - x))
+
+    def __str__(self):
+        return "\n".join(map(str, self.code))
@@ -1,12 +1,210 @@
 """Preprocessing -- Things to do before compilation begins.
-At the moment, there are no planned preprocessing steps. Will there ever be? Who knows.
+
+Comment boxes are found, and indexed so the parser can skip them. A box starts with a `[` at its top left corner, and
+ends at the first `]` after it (in reading order) which is at or to the right of the `[`, and isn't already inside a box.
+Everything in a box, including the brackets, is treated as spaces, so comments can't contain `]`. `[` inside a box
+doesn't start another one. For example, this is a loop with a box beside it:
+
+    5>d!1-d?v  [ Counts down
+     ^      <    from 5.   ]
+
+Boxes are only looked at through `Code.comments`. The code itself is left as it is, so nothing is copied.
 """
+import bisect
+from typing import Dict, Iterator, List, Optional, Tuple
 from pathways_code import Code
-from util import Box
+from util import Box, Direction
+
+COMMENT_START = "["
+COMMENT_END = "]"
+
+
+class Spans:
+    """Sorted, non-overlapping spans of a row or column. Each is half open, from a start index up to an end index.
+    A lookup is a binary search of the starts, so it takes O(log n) for n spans.
+    """
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, spans: List[Tuple[int, int]]):
+        """
+        Args:
+            spans (List[Tuple[int, int]]): (start, end) of each span, in any order. Overlapping spans are merged.
+        """
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        for start, end in sorted(spans):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def add(self, start: int, end: int):
+        """Adds a span, merging it with any it overlaps or touches.
+        """
+        i = bisect.bisect_left(self.ends, start)
+        j = bisect.bisect_right(self.starts, end)
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def end_of(self, i: int) -> Optional[int]:
+        """Gets the end of the span containing i, or None if i isn't in one.
+        """
+        k = bisect.bisect_right(self.starts, i) - 1
+        if k >= 0 and i < self.ends[k]:
+            return self.ends[k]
+        return None
+
+    def __contains__(self, i: int) -> bool:
+        return self.end_of(i) is not None
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return zip(self.starts, self.ends)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __repr__(self):
+        return f"Spans({list(self)})"
+
+
+class CommentIndex:
+    """The comment boxes of some code, indexed by row and by column.
+    """
+    def __init__(self, boxes: List[Box]):
+        self.boxes = boxes
+        rows: Dict[int, List[Tuple[int, int]]] = {}
+        cols: Dict[int, List[Tuple[int, int]]] = {}
+        for box in boxes:
+            for y in range(box.y, box.y2 + 1):
+                rows.setdefault(y, []).append((box.x, box.x2 + 1))
+            for x in range(box.x, box.x2 + 1):
+                cols.setdefault(x, []).append((box.y, box.y2 + 1))
+        self.rows = {y: Spans(spans) for y, spans in rows.items()}
+        self.cols = {x: Spans(spans) for x, spans in cols.items()}
+
+    def line_spans(self, dir: Direction, index: int, length: int) -> List[Tuple[int, int]]:
+        """Gets the comments in a line, by their indices along the line (so reversed for lines going left or up).
+
+        Args:
+            dir (Direction): The direction of the line.
+            index (int): The row (for left and right) or column (for up and down).
+            length (int): The length of the line. Comments past the end are left out.
+
+        Returns:
+            List[Tuple[int, int]]: The (start, end) of each comment, in order.
+        """
+        spans = (self.cols if dir in (Direction.UP, Direction.DOWN) else self.rows).get(index)
+        if spans is None:
+            return []
+        clipped = [(start, min(end, length)) for start, end in spans if start < length]
+        if dir in (Direction.LEFT, Direction.UP):
+            return [(length - end, length - start) for start, end in reversed(clipped)]
+        return clipped
+
+    def __contains__(self, xy: Tuple[int, int]) -> bool:
+        spans = self.rows.get(xy[1])
+        return spans is not None and xy[0] in spans
+
+    def __repr__(self):
+        return f"CommentIndex({self.boxes})"
+
+
+class MaxTree:
+    """A segment tree of ints, for finding the first one at or after an index which is at least some value.
+    Both that and changing a value take O(log n).
+    """
+    def __init__(self, values: List[int]):
+        self.length = len(values)
+        self.size = 1
+        while self.size < self.length:
+            self.size *= 2
+        self.tree = [-1] * (2 * self.size)
+        self.tree[self.size:self.size + self.length] = values
+        for i in range(self.size - 1, 0, -1):
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def set(self, i: int, value: int):
+        i += self.size
+        self.tree[i] = value
+        while i > 1:
+            i //= 2
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def first_at_least(self, i: int, value: int) -> Optional[int]:
+        """Gets the first index from i on whose value is at least value, or None if there isn't one.
+        """
+        if i >= self.length:
+            return None
+        i += self.size
+        while self.tree[i] < value:
+            while i & 1: # Up past the subtrees which end here...
+                i //= 2
+            if i == 0:
+                return None
+            i += 1 # ...then on to the next one to the right.
+        while i < self.size:
+            i = 2 * i if self.tree[2 * i] >= value else 2 * i + 1
+        return i - self.size
+
+
+def find_comments(code: Code) -> List[Box]:
+    """Finds the comment boxes in some code.
+
+    Each `[` is looked up in the rows of the boxes found so far, then its `]` is found with a MaxTree of the rightmost
+    unused `]` in each row, so it takes O(log n) time however many rows can't close it.
+    A `]` inside a box is always already used (any other would have ended the box sooner), so it is never checked.
+
+    Args:
+        code (Code): The code to look in.
+
+    Returns:
+        List[Box]: The boxes, in the order their `[`s are in.
+    """
+    starts: List[Tuple[int, int]] = []
+    ends: Dict[int, List[int]] = {} # The xs of the unused `]`s in each row.
+    for y in range(code.height):
+        row = code.row_str(y)
+        if COMMENT_START not in row and COMMENT_END not in row:
+            continue
+        starts.extend((x, y) for x in find_all(row, COMMENT_START))
+        xs = list(find_all(row, COMMENT_END))
+        if xs:
+            ends[y] = xs
+    end_rows = sorted(ends)
+    rightmost = MaxTree([ends[y][-1] for y in end_rows])
+
+    boxes: List[Box] = []
+    inside: Dict[int, Spans] = {} # The boxes found so far, by row.
+    for x, y in starts:
+        spans = inside.get(y)
+        if spans is not None and x in spans:
+            continue
+        k = rightmost.first_at_least(bisect.bisect_left(end_rows, y), x)
+        if k is None:
+            continue
+        end_y = end_rows[k]
+        xs = ends[end_y]
+        end_x = xs.pop(bisect.bisect_left(xs, x))
+        rightmost.set(k, xs[-1] if xs else -1)
+        boxes.append(Box(x, y, end_x, end_y))
+        for row in range(y, end_y + 1):
+            inside.setdefault(row, Spans([])).add(x, end_x + 1)
+    return boxes
+
+
+def find_all(row: str, c: str) -> Iterator[int]:
+    i = row.find(c)
+    while i >= 0:
+        yield i
+        i = row.find(c, i + 1)
+
 
 def preprocess(code: Code) -> Code:
-    """Do all preprocessing. A bit useless with one preprocessing task,
-      but a useful layer of abstraction.
+    """Do all preprocessing. At the moment, that is indexing the comment boxes, as `code.comments`.
 
     Args:
         code (Code): The code to preprocess
@@ -14,4 +212,6 @@ def preprocess(code: Code) -> Code:
     Returns:
         Code: The same code. Guaranteed to be a reference to the input 'code' parameter.
     """
+    boxes = find_comments(code)
+    code.comments = CommentIndex(boxes) if boxes else None
     return code
@@ -0,0 +1,138 @@
+"""Profiler -- Counts what a program does while it runs, and maps the counts back onto the code.
+
+Profiling is done by a subclass of Interpreter, so running without profiling costs nothing extra.
+"""
+import math
+from typing import Dict, List, Optional, Tuple, Union
+from asg import ASG, ASGDecisionNode, ASGEdge
+from instructions import stringify_instrs
+from interpreter import Interpreter
+from output import Output, Sink
+from pathways_code import Code
+
+SHADES = " .:-=+*#%@" # Plain heatmap, coolest to hottest.
+COLOURS = [19, 25, 31, 37, 100, 136, 172, 166, 160] # 256 colour terminal backgrounds, for the same levels (except empty).
+
+
+class Profile:
+    """Counts from running a program.
+    """
+    def __init__(self):
+        self.edge_counts: Dict[ASGEdge, int] = {}
+        self.instruction_counts: Dict[ASGEdge, int] = {}
+        # [times true, times false]
+        self.branches: Dict[ASGDecisionNode, List[int]] = {}
+        self.max_stack = 0
+
+    def cell_counts(self) -> Dict[Tuple[int, int], int]:
+        """Gets how many times each cell of the code was passed through.
+
+        Returns:
+            Dict[Tuple[int, int], int]: The count of each cell which was passed through at least once.
+        """
+        counts: Dict[Tuple[int, int], int] = {}
+        for edge, n in self.edge_counts.items():
+            for cell in edge.cells():
+                counts[cell] = counts.get(cell, 0) + n
+        return counts
+
+    @staticmethod
+    def level(n: int, hottest: int) -> int:
+        """Gets the shade of a count, on a log scale so loops don't drown everything else out.
+        """
+        if n == 0:
+            return 0
+        if hottest <= 1:
+            return len(SHADES) - 1
+        return 1 + round((len(SHADES) - 2) * math.log(n) / math.log(hottest))
+
+    def heatmap(self, code: Code, colour: bool = False) -> str:
+        """Draws how often each cell was passed through.
+
+        Args:
+            code (Code): The code which was run.
+            colour (bool, optional): Shade the background of the code with terminal colours.
+                Otherwise the heatmap is drawn with characters, next to the code. Defaults to False.
+
+        Returns:
+            str: The heatmap.
+        """
+        counts = self.cell_counts()
+        hottest = max(counts.values(), default=0)
+        rows = []
+        for y in range(code.height):
+            text = ""
+            shades = ""
+            for x in range(code.width):
+                char = code.get(x, y)
+                level = self.level(counts.get((x, y), 0), hottest)
+                if colour:
+                    text += char if level == 0 else f"\x1b[48;5;{COLOURS[level - 1]}m{char}\x1b[0m"
+                else:
+                    text += char
+                    shades += SHADES[level]
+            rows.append(text if colour else f"{text} | {shades}")
+        return "\n".join(rows)
+
+    @staticmethod
+    def describe(edge: ASGEdge) -> str:
+        if not edge.path:
+            return f"{edge.src!r} -> {edge.dst!r}"
+        return f"{edge.path[0][0]} -> {edge.path[-1][1]}"
+
+    def report(self, top: int = 10) -> str:
+        """Summarises the profile.
+
+        Args:
+            top (int, optional): How many of the hottest edges and decisions to list. Defaults to 10.
+
+        Returns:
+            str: The report.
+        """
+        lines = [f"Max stack depth: {self.max_stack}",
+                 f"Instructions run: {sum(self.instruction_counts.values())}",
+                 "Hottest edges (taken, instructions):"]
+        for edge, n in sorted(self.edge_counts.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {n:>10} {self.instruction_counts[edge]:>10}  {self.describe(edge)}: {stringify_instrs(edge.code)}")
+        lines.append("Hottest decisions (true, false):")
+        for node, (true, false) in sorted(self.branches.items(), key=lambda item: -sum(item[1]))[:top]:
+            where = self.describe(node.in_edges[0]).split(" -> ")[-1] if node.in_edges else repr(node)
+            lines.append(f"  {true:>10} {false:>10}  at {where}")
+        return "\n".join(lines)
+
+
+class ProfilingInterpreter(Interpreter):
+    """An interpreter which fills in a Profile as it runs.
+    """
+    def __init__(self, graph: ASG, output: Optional[Union[Output, Sink]] = None):
+        super().__init__(graph, output)
+        self.profile = Profile()
+
+    def start_interpreting(self):
+        self.count_stack() # The stack may have been given values before the run.
+        super().start_interpreting()
+
+    def run_steps(self, max_steps: Optional[int]) -> bool:
+        self.count_stack()
+        return super().run_steps(max_steps)
+
+    def next_edge(self) -> ASGEdge:
+        node = self.node
+        edge = super().next_edge()
+        if isinstance(node, ASGDecisionNode):
+            branches = self.profile.branches.setdefault(node, [0, 0])
+            branches[0 if edge is node.true else 1] += 1
+        return edge
+
+    def run_edge(self, edge: ASGEdge):
+        self.profile.edge_counts[edge] = self.profile.edge_counts.get(edge, 0) + 1
+        self.profile.instruction_counts[edge] = self.profile.instruction_counts.get(edge, 0) + len(edge.code)
+        super().run_edge(edge)
+
+    def push(self, value):
+        self.stack.append(value)
+        self.count_stack()
+
+    def count_stack(self):
+        if len(self.stack) > self.profile.max_stack:
+            self.profile.max_stack = len(self.stack)
@@ -0,0 +1,418 @@
+"""Reference -- Runs a program by walking its grid one cell at a time, without compiling it.
+
+This is a second implementation of the language, written straight from the grid rather than from the graph, so the
+compiler (Parser, graph building and the Optimiser) can be checked against it with `compare`.
+It starts straight away, but decodes every cell each time it is passed, so it is much slower than the Interpreter on
+anything which loops. `run_fast_start` gets the best of both for short scripts: it walks the grid first, and only
+compiles the program if it is still running after a while.
+"""
+from typing import List, Optional, Union
+from asg import ASG, ASGArrowNode
+from batch import compile_source
+from cache import ProgramCache
+from instructions import BINARY_OPERATIONS, CONSTANT_VALUES, Instruction, InstructionType, SimpleInstructionType
+from interpreter import Interpreter
+from output import Output, Sink
+from pathways_code import Code
+from preprocessing import preprocess
+from util import Direction, SYM_TO_DIR
+
+# Instructions run_fast_start walks before compiling. Walking an instruction takes about as long as compiling half a
+# cell, so by the time it gives up it has spent about as long as compiling would have.
+FAST_START_STEPS_PER_CELL = 2
+MIN_FAST_START_STEPS = 200
+DEFAULT_MAX_STEPS = 1_000_000 # Instructions the reference may run in compare, before giving up.
+TRACE_DEPTH = 4 # Values from the top of the stack to compare at each arrow.
+MAX_VALUE_SIZE = 1 << 12 # Characters of a string, or bits of an int. compare stops at bigger values, which can grow
+                         # (e.g. doubling a string each time round a loop) until they use up all the memory.
+
+DIR_TO_STEP = {Direction.UP: (0, -1), Direction.DOWN: (0, 1), Direction.LEFT: (-1, 0), Direction.RIGHT: (1, 0)}
+DIGITS = frozenset("0123456789")
+NOOP: Instruction = (InstructionType.NOOP, None)
+
+# Outcomes of compare.
+AGREE = "agree"
+DIFFER = "differ"
+UNFINISHED = "unfinished" # The reference ran out of steps (or made too big a value), so only the output so far was compared.
+UNCOMPILABLE = "uncompilable" # The program jumps to an arrow which is inside a string (or skipped) in its line.
+
+
+class GridInterpreter:
+    """Runs a program straight from its grid.
+
+    The position is the last cell read, and the direction is the one being moved in. Lines end at the end of their row,
+    or the bottom or top of the grid, and running off the end of a line ends the program. Comments are read as spaces.
+    """
+    def __init__(self, code: Code, output: Optional[Union[Output, Sink]] = None):
+        """
+        Args:
+            code (Code): The (preprocessed) code to run.
+            output (Union[Output, Sink], optional): Where to print to. Defaults to a buffered sys.stdout.
+        """
+        self.rows = [code.get_row(y) for y in range(code.height)]
+        self.height = code.height
+        self.comments = code.comments
+        self.x = -1 # Just before the first cell.
+        self.y = 0
+        self.turn(Direction.RIGHT)
+        self.stack = []
+        self.finished = False
+        self.at_arrow = False # Whether the last instruction was an arrow, so the position is an entry point of its line.
+        self.output = output if isinstance(output, Output) else Output(output)
+        self.steps = 0 # Instructions run so far, including arrows and spaces.
+
+    def start_interpreting(self):
+        """Runs the program until it finishes.
+        """
+        self.run()
+
+    def run(self, max_steps: Optional[int] = None) -> bool:
+        """Runs the program for a while. Call it again to carry on from where it stopped.
+
+        Args:
+            max_steps (int, optional): The most instructions to run. Defaults to running until the program finishes.
+
+        Returns:
+            bool: Whether the program has finished.
+        """
+        try:
+            if max_steps is None:
+                while not self.finished:
+                    self.interpret_next_instruction()
+            else:
+                for _ in range(max_steps):
+                    if self.finished:
+                        break
+                    self.interpret_next_instruction()
+        finally:
+            self.output.flush()
+        return self.finished
+
+    def turn(self, dir: Direction):
+        self.dir = dir
+        self.dx, self.dy = DIR_TO_STEP[dir]
+
+    def peek(self) -> Optional[str]:
+        """Gets the next character in the current direction, or None if the line ends first.
+        """
+        return self.get(self.x + self.dx, self.y + self.dy)
+
+    def advance(self) -> Optional[str]:
+        """Moves one cell on, and gets the character there, or None if the line has ended.
+        """
+        self.x += self.dx
+        self.y += self.dy
+        return self.get(self.x, self.y)
+
+    def get(self, x: int, y: int) -> Optional[str]:
+        if self.dx == 0: # Vertical
+            if not 0 <= y < self.height:
+                return None
+            row = self.rows[y]
+            if x >= len(row):
+                return " " # Columns are padded with spaces to the height of the code.
+        else:
+            row = self.rows[y]
+            if not 0 <= x < len(row):
+                return None
+        if self.comments is not None and (x, y) in self.comments:
+            return " "
+        return row[x]
+
+    def interpret_next_instruction(self):
+        """Reads the instruction after the current position, and runs it.
+        """
+        self.at_arrow = False
+        c = self.advance()
+        if c is None:
+            self.finished = True
+            self.output.flush()
+            return
+        self.steps += 1
+        dir = SYM_TO_DIR.get(c)
+        if dir is not None:
+            if dir != self.dir:
+                self.turn(dir)
+            self.at_arrow = True
+        elif c == "?":
+            self.run_condition()
+        else:
+            self.run_instruction(self.read_instruction(c))
+
+    def run_condition(self):
+        """Runs a `?`. It pops a value, and only runs (or turns at) the next instruction if the value was true.
+        `??x` is the same as `&?x`, and a `?` before a space, `#`, or an arrow in the same direction only pops.
+        """
+        c = self.advance()
+        while c == "?":
+            self.run_simple_instruction(SimpleInstructionType.AND)
+            c = self.advance()
+        if c is None: # The program ends after the pop.
+            self.pop()
+            return
+        dir = SYM_TO_DIR.get(c)
+        if dir is not None:
+            if self.pop():
+                self.turn(dir)
+            self.at_arrow = dir == self.dir
+            return
+        inst = self.read_instruction(c)
+        if self.pop():
+            self.run_instruction(inst)
+
+    def read_instruction(self, c: str) -> Instruction:
+        """Reads the instruction starting with c, which isn't an arrow or `?`, moving to its last cell.
+
+        Args:
+            c (str): The character at the current position.
+
+        Returns:
+            Instruction: The instruction. A NOOP for spaces, `#` and unterminated strings.
+        """
+        if c == " ":
+            return NOOP
+        if c == "#": # Skip the next character too.
+            self.advance()
+            return NOOP
+        if c == "n" or c == "N":
+            value = 0
+            while self.peek() in DIGITS:
+                value = value * 10 + int(self.advance())
+            return (InstructionType.INTEGER, value if c == "n" else -value)
+        if c == "\"":
+            chars: List[str] = []
+            while True:
+                c = self.advance()
+                if c is None: # Unterminated, so the rest of the line does nothing.
+                    return NOOP
+                if c == "\"":
+                    return (InstructionType.STRING, "".join(chars))
+                if c == "\\": # An escape keeps the backslash and drops the escaped character.
+                    if self.advance() is None:
+                        return NOOP
+                chars.append(c)
+        if c == "'":
+            c = self.advance()
+            return (InstructionType.STRING, c if c is not None else "")
+        try:
+            return (InstructionType.SIMPLE, SimpleInstructionType(c))
+        except ValueError:
+            return (InstructionType.INVALID, c)
+
+    def run_instruction(self, inst: Instruction):
+        kind, value = inst
+        if kind == InstructionType.SIMPLE:
+            self.run_simple_instruction(value)
+        elif kind in (InstructionType.INTEGER, InstructionType.STRING):
+            self.push(value)
+        elif kind != InstructionType.NOOP:
+            raise ValueError(f"Unknown instruction type '{inst}'")
+
+    def run_simple_instruction(self, inst: SimpleInstructionType):
+        operation = BINARY_OPERATIONS.get(inst)
+        if operation is not None:
+            a = self.pop()
+            b = self.pop()
+            self.push(operation(a, b))
+        elif inst in CONSTANT_VALUES:
+            self.push(CONSTANT_VALUES[inst])
+        elif inst == SimpleInstructionType.PRINT:
+            self.output.write(self.pop())
+        elif inst == SimpleInstructionType.DUPLICATE:
+            a = self.pop()
+            self.push(a)
+            self.push(a)
+        elif inst == SimpleInstructionType.NEGATE:
+            a = self.pop()
+            if type(a) == bool:
+                self.push(not a)
+            elif type(a) == int:
+                self.push(-a)
+            elif type(a) == str:
+                self.push(a[::-1])
+            else:
+                self.push(a)
+        else:
+            raise ValueError(f"Unknown simple instruction '{inst}'")
+
+    def push(self, value):
+        self.stack.append(value)
+
+    def pop(self):
+        return self.stack.pop() if self.stack else 0
+
+
+def run_fast_start(source: str, output: Optional[Union[Output, Sink]] = None, stack: Optional[list] = None,
+                   budget: Optional[int] = None, cache: Optional[ProgramCache] = None) -> Union[GridInterpreter, Interpreter]:
+    """Runs a program without waiting for it to compile. Short scripts finish before compiling would have.
+    If the program is still running after `budget` instructions, it is compiled, and the Interpreter carries on from
+    the next arrow the walk reaches which is still in the optimised graph.
+
+    Args:
+        source (str): The program's source code.
+        output (Union[Output, Sink], optional): Where to print to. Defaults to a buffered sys.stdout.
+        stack (list, optional): The stack to start with, top last. Defaults to empty.
+        budget (int, optional): Instructions to walk before compiling. Defaults to FAST_START_STEPS_PER_CELL per cell
+            of the code, and at least MIN_FAST_START_STEPS.
+        cache (ProgramCache, optional): A cache on disk to compile with. Defaults to none.
+
+    Returns:
+        Union[GridInterpreter, Interpreter]: Whichever finished the program, with the final stack.
+    """
+    code = preprocess(Code(source))
+    if budget is None:
+        budget = max(MIN_FAST_START_STEPS, FAST_START_STEPS_PER_CELL * code.width * code.height)
+    walker = GridInterpreter(code, output)
+    walker.stack = list(stack or [])
+    if walker.run(budget):
+        return walker
+    graph = compile_source(source, cache)
+    try:
+        while not walker.finished:
+            if walker.at_arrow:
+                node = graph.arrow_nodes.get((walker.dir, walker.x, walker.y))
+                if node is not None:
+                    return continue_compiled(walker, graph, node)
+            walker.interpret_next_instruction()
+    finally:
+        walker.output.flush()
+    return walker
+
+
+def continue_compiled(walker: GridInterpreter, graph: ASG, node) -> Interpreter:
+    interpreter = Interpreter(graph, walker.output)
+    interpreter.node = node
+    interpreter.stack = walker.stack
+    interpreter.start_interpreting()
+    return interpreter
+
+
+class Comparison:
+    """What happened when a program was run by both the compiler and the reference.
+    """
+    def __init__(self, source: str, stack: Optional[list], status: str, detail: str = ""):
+        self.source = source
+        self.stack = list(stack or []) # The stack it was started with.
+        self.status = status
+        self.detail = detail
+
+    def __repr__(self):
+        return f"Comparison({self.status}{', ' + self.detail if self.detail else ''})"
+
+
+def compare(source: str, stack: Optional[list] = None, max_steps: int = DEFAULT_MAX_STEPS) -> Comparison:
+    """Runs a program with the Interpreter on its compiled graph, and with the GridInterpreter, and checks they agree.
+
+    Every arrow node left in the optimised graph is a point where both should be in the same state, so the length and
+    top of the stack are compared each time one is passed, which also checks programs which never finish. At the end,
+    the output, the whole stack and any error are compared. After an error the stacks aren't compared, as the optimiser
+    may have fused the instructions around it.
+
+    Args:
+        source (str): The program's source code.
+        stack (list, optional): The stack to start with, top last. Defaults to empty.
+        max_steps (int, optional): Instructions the reference may run. Defaults to DEFAULT_MAX_STEPS.
+
+    Returns:
+        Comparison: AGREE or DIFFER (with what differed), UNFINISHED (if they agreed as far as the reference got) or
+            UNCOMPILABLE.
+    """
+    try:
+        graph = compile_source(source)
+    except KeyError as e:
+        return Comparison(source, stack, UNCOMPILABLE, f"no entry point at {e}")
+
+    output: List[str] = []
+    walker = GridInterpreter(preprocess(Code(source)), output)
+    walker.stack = list(stack or [])
+    expected_trace: List[tuple] = []
+    expected_error = trace_reference(walker, graph, max_steps, expected_trace)
+
+    compiled_output: List[str] = []
+    interpreter = Interpreter(graph, compiled_output)
+    interpreter.stack = list(stack or [])
+    trace: List[tuple] = []
+    # Every edge ends at an arrow or a `?`. If the reference didn't finish, there's no need to go past where it got to.
+    max_trace = len(expected_trace) if not walker.finished and expected_error is None else None
+    error = trace_compiled(interpreter, 2 * walker.steps + 2, trace, max_trace)
+
+    for i, (state, expected_state) in enumerate(zip(trace, expected_trace)):
+        if state != expected_state:
+            return Comparison(source, stack, DIFFER, f"arrow {i}: {state} != {expected_state}")
+    if not walker.finished and expected_error is None:
+        # Either may have got further, so one output should start with the other.
+        a, b = "".join(output), "".join(compiled_output)
+        if not (a.startswith(b) or b.startswith(a)):
+            return Comparison(source, stack, DIFFER, f"output {b!r} != {a!r}, before the reference ran out of steps")
+        return Comparison(source, stack, UNFINISHED)
+
+    differences = []
+    if error != expected_error:
+        differences.append(f"error {error} != {expected_error}")
+    elif error is None and not interpreter.finished:
+        differences.append("compiled program didn't finish")
+    if "".join(compiled_output) != "".join(output):
+        differences.append(f"output {''.join(compiled_output)!r} != {''.join(output)!r}")
+    if error is None and expected_error is None and typed(interpreter.stack) != typed(walker.stack):
+        differences.append(f"stack {interpreter.stack!r} != {walker.stack!r}")
+    if differences:
+        return Comparison(source, stack, DIFFER, "; ".join(differences))
+    return Comparison(source, stack, AGREE)
+
+
+def trace_reference(walker: GridInterpreter, graph: ASG, max_steps: int, trace: List[tuple]) -> Optional[str]:
+    """Runs the reference, recording its state at each arrow which is a node of the graph.
+
+    Returns:
+        Optional[str]: The name of the error it raised, if any.
+    """
+    try:
+        while not walker.finished and walker.steps < max_steps and not too_big(walker.stack):
+            walker.interpret_next_instruction()
+            if walker.at_arrow and (walker.dir, walker.x, walker.y) in graph.arrow_nodes:
+                trace.append(snapshot(walker.dir, walker.x, walker.y, walker.stack))
+    except Exception as e:
+        return type(e).__name__
+    finally:
+        walker.output.flush()
+    return None
+
+
+def trace_compiled(interpreter: Interpreter, max_steps: int, trace: List[tuple], max_trace: Optional[int] = None) -> Optional[str]:
+    """Runs the interpreter, recording its state at each arrow node, until it has recorded more than max_trace.
+
+    Returns:
+        Optional[str]: The name of the error it raised, if any.
+    """
+    try:
+        for _ in range(max_steps):
+            if interpreter.finished or too_big(interpreter.stack):
+                break
+            node = interpreter.node
+            if isinstance(node, ASGArrowNode):
+                if max_trace is not None and len(trace) > max_trace:
+                    break
+                trace.append(snapshot(node.dir, node.x, node.y, interpreter.stack))
+            interpreter.interpret_next_node()
+    except Exception as e:
+        return type(e).__name__
+    finally:
+        interpreter.output.flush()
+    return None
+
+
+def snapshot(dir: Direction, x: int, y: int, stack: list) -> tuple:
+    return (dir, x, y, len(stack), typed(stack[-TRACE_DEPTH:]))
+
+
+def too_big(stack: list) -> bool:
+    """Whether the top of the stack is bigger than MAX_VALUE_SIZE. Values only grow on the top of the stack."""
+    value = stack[-1] if stack else None
+    if type(value) == str:
+        return len(value) > MAX_VALUE_SIZE
+    return type(value) == int and value.bit_length() > MAX_VALUE_SIZE
+
+
+def typed(stack: list) -> list:
+    """Pairs each value with its type, as True == 1."""
+    return [(type(value), value) for value in stack]
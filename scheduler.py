@@ -0,0 +1,74 @@
+"""Scheduler -- Runs many programs at once in one asyncio event loop.
+
+Each program runs for a slice of steps, then yields to the event loop so the others get a turn. The event loop runs
+ready tasks in order, so programs take turns round robin. Slices are resized after each one to take about `quantum`
+seconds of CPU, so a program with slow steps gets the same share of time as one with fast steps.
+
+This only works if every step takes a bounded time: nothing can interrupt `interpreter.run(size)` once it has started, so
+fairness and the CPU budget are only as good as the longest step. Every interpreter here keeps to that (compiled traces
+in jit.TracingInterpreter go round a loop a bounded number of times per step), and subclasses must too.
+"""
+import asyncio
+import time
+from typing import Iterable, List, Optional, Union
+from interpreter import Interpreter
+from status import OK, STEP_LIMIT, TIMEOUT
+
+QUANTUM = 0.001 # Seconds of CPU per slice.
+FIRST_SLICE = 64 # Steps in a program's first slice, before its speed is known.
+MAX_SLICE = 1 << 20
+
+
+class Scheduler:
+    """Interleaves interpreters in an event loop, with a CPU budget for each.
+    """
+    def __init__(self, quantum: float = QUANTUM, cpu_budget: Optional[float] = None, max_steps: Optional[int] = None):
+        """
+        Args:
+            quantum (float, optional): Seconds of CPU each program gets per turn. Defaults to QUANTUM.
+            cpu_budget (float, optional): Seconds of CPU each program may use in total. Defaults to no limit.
+            max_steps (int, optional): Steps each program may take in total. Defaults to no limit.
+        """
+        self.quantum = quantum
+        self.cpu_budget = cpu_budget
+        self.max_steps = max_steps
+
+    async def run(self, interpreter: Interpreter) -> str:
+        """Runs a program until it finishes or runs out of budget, letting other tasks run in between slices.
+
+        Exceptions raised by the program are raised from here. Its stack and output are left on the interpreter.
+
+        Args:
+            interpreter (Interpreter): The program to run. It may already have been run for a while. Each of its steps
+                must take a bounded time (see above).
+
+        Returns:
+            str: OK, STEP_LIMIT if it ran out of steps or TIMEOUT if it ran out of CPU time.
+        """
+        size = FIRST_SLICE
+        used = 0.0
+        while True:
+            if self.max_steps is not None:
+                if interpreter.steps >= self.max_steps:
+                    return STEP_LIMIT
+                size = min(size, self.max_steps - interpreter.steps)
+            start = time.thread_time()
+            finished = interpreter.run(size)
+            taken = time.thread_time() - start
+            used += taken
+            if finished:
+                return OK
+            if self.cpu_budget is not None and used >= self.cpu_budget:
+                return TIMEOUT
+            # Aim for a slice of quantum seconds, growing slowly in case thread_time() is coarse (e.g. on Windows).
+            target = int(size * self.quantum / taken) if taken > 0 else MAX_SLICE
+            size = max(1, min(MAX_SLICE, size * 2, target))
+            await asyncio.sleep(0)
+
+    async def run_all(self, interpreters: Iterable[Interpreter]) -> List[Union[str, Exception]]:
+        """Runs programs concurrently, until they have all stopped.
+
+        Returns:
+            List[Union[str, Exception]]: The status of each program, in order, or the exception it raised.
+        """
+        return await asyncio.gather(*(self.run(interpreter) for interpreter in interpreters), return_exceptions=True)
@@ -0,0 +1,197 @@
+"""Stack analysis -- Works out how deep the stack is, without running the program.
+
+Popping an empty stack gives 0, so every pop has to check the stack first.
+This finds a lower bound on the stack depth at every node and instruction, so the transpiler, JIT traces and bytecode
+VM can skip the check where the stack is known to be non-empty. It also works out the net effect each edge has on the
+stack, to find loops which grow the stack on every iteration.
+"""
+import math
+from typing import Dict, List, Tuple
+from asg import ASG, ASGDecisionNode, ASGEdge, ASGNode
+from instructions import BINARY_OPERATIONS, CONSTANT_VALUES, Instruction, InstructionType, SimpleInstructionType
+
+UNREACHED = math.inf
+
+
+def instruction_effect(inst: Instruction) -> Tuple[int, int]:
+    """Gets the number of values an (unconditional) instruction pops and pushes.
+
+    Args:
+        inst (Instruction): The instruction. Must not be a COND.
+
+    Returns:
+        Tuple[int, int]: (pops, pushes)
+    """
+    if inst[0] == InstructionType.SIMPLE:
+        if inst[1] in BINARY_OPERATIONS:
+            return 2, 1
+        if inst[1] in CONSTANT_VALUES:
+            return 0, 1
+        if inst[1] == SimpleInstructionType.NEGATE:
+            return 1, 1
+        if inst[1] == SimpleInstructionType.PRINT:
+            return 1, 0
+        if inst[1] == SimpleInstructionType.DUPLICATE:
+            return 1, 2
+    elif inst[0] in (InstructionType.INTEGER, InstructionType.STRING):
+        return 0, 1
+    elif inst[0] == InstructionType.POP:
+        return 1, 0
+    elif inst[0] == InstructionType.CONST_OP:
+        return 1, 1
+    return 0, 0 # Raises when run, so never continues.
+
+
+def min_depth_after(inst: Instruction, depth: int) -> int:
+    """Gets the lowest the stack can be after an instruction.
+
+    Args:
+        inst (Instruction): The instruction
+        depth (int): The lowest the stack can be before it.
+
+    Returns:
+        int: The lowest the stack can be after it.
+    """
+    if inst[0] == InstructionType.COND:
+        depth = max(depth - 1, 0)
+        return min(depth, min_depth_after(inst[1], depth))
+    pops, pushes = instruction_effect(inst)
+    return max(depth - pops, 0) + pushes # Popping an empty stack leaves it empty.
+
+
+class StackEffect:
+    """The effect an edge has on the stack, assuming there are at least `needed` values on it to start with.
+    """
+    def __init__(self, needed: int, min_net: int, max_net: int):
+        """
+        Args:
+            needed (int): How many values below the top of the stack are popped at most.
+            min_net (int): The lowest the change in stack depth can be.
+            max_net (int): The highest the change in stack depth can be. Only different to min_net with `?`.
+        """
+        self.needed = needed
+        self.min_net = min_net
+        self.max_net = max_net
+
+    @classmethod
+    def of(cls, code: List[Instruction], pops_first: bool = False) -> "StackEffect":
+        """Works out the effect of some code.
+
+        Args:
+            code (List[Instruction]): The code
+            pops_first (bool, optional): Whether a value is popped before the code (by a decision node). Defaults to False.
+
+        Returns:
+            StackEffect: The effect.
+        """
+        effect = cls(0, 0, 0)
+        if pops_first:
+            effect.apply(1, 0)
+        for inst in code:
+            effect.apply_instruction(inst)
+        return effect
+
+    def apply(self, pops: int, pushes: int):
+        self.needed = max(self.needed, pops - self.min_net)
+        self.min_net += pushes - pops
+        self.max_net += pushes - pops
+
+    def apply_instruction(self, inst: Instruction):
+        if inst[0] == InstructionType.COND:
+            self.apply(1, 0)
+            inner = StackEffect(self.needed, self.min_net, self.max_net)
+            inner.apply_instruction(inst[1])
+            self.needed = inner.needed
+            self.min_net = min(self.min_net, inner.min_net)
+            self.max_net = max(self.max_net, inner.max_net)
+        else:
+            self.apply(*instruction_effect(inst))
+
+    def __repr__(self):
+        return f"<needs {self.needed}, net {self.min_net}..{self.max_net}>"
+
+
+class StackAnalysis:
+    """Finds the minimum stack depth at every node of a graph, and the effect of every edge.
+    """
+    def __init__(self, graph: ASG):
+        self.graph = graph
+        # The lowest the stack can be when arriving at each node.
+        self.node_depth: Dict[ASGNode, int] = {}
+        self.effects: Dict[ASGEdge, StackEffect] = {}
+        self.analyse()
+
+    def analyse(self):
+        self.node_depth = {node: UNREACHED for node in self.graph.nodes}
+        self.node_depth[self.graph.start] = 0
+        self.effects = {edge: StackEffect.of(edge.code, isinstance(edge.src, ASGDecisionNode)) for edge in self.graph.edges}
+        # Depths only decrease, and can't go below 0, so this finishes.
+        todo = [self.graph.start]
+        while todo:
+            node = todo.pop()
+            for edge in node.out_edges:
+                depth = self.edge_depths(edge)[-1]
+                if depth < self.node_depth[edge.dst]:
+                    self.node_depth[edge.dst] = depth
+                    todo.append(edge.dst)
+
+    def entry_depth(self, edge: ASGEdge) -> int:
+        """Gets the lowest the stack can be at the start of an edge's code (after a decision node has popped).
+        """
+        depth = self.node_depth[edge.src]
+        if isinstance(edge.src, ASGDecisionNode):
+            depth = max(depth - 1, 0)
+        return depth
+
+    def edge_depths(self, edge: ASGEdge) -> List[int]:
+        """Gets the lowest the stack can be before each instruction of an edge, and after the last one.
+
+        Args:
+            edge (ASGEdge): The edge
+
+        Returns:
+            List[int]: One longer than the edge's code.
+        """
+        depths = [self.entry_depth(edge)]
+        for inst in edge.code:
+            depths.append(min_depth_after(inst, depths[-1]))
+        return depths
+
+    def edge_effect(self, edge: ASGEdge) -> StackEffect:
+        """Gets the net effect of an edge on the stack, including the pop of a decision node it leaves.
+        """
+        return self.effects[edge]
+
+    def is_safe(self, edge: ASGEdge) -> bool:
+        """Checks if no pop in an edge (or the decision node it leaves) can find an empty stack.
+        """
+        return self.node_depth[edge.src] >= self.effects[edge].needed
+
+    def growing_loops(self) -> List[List[ASGNode]]:
+        """Finds the loops which are guaranteed to grow the stack every time they go round.
+
+        Returns:
+            List[List[ASGNode]]: The strongly connected components containing such a loop.
+        """
+        loops = []
+        for component in self.graph.strongly_connected_components():
+            members = set(component)
+            edges = [edge for node in component for edge in node.out_edges if edge.dst in members]
+            if edges and self.has_positive_cycle(component, edges):
+                loops.append(component)
+        return loops
+
+    def has_positive_cycle(self, nodes: List[ASGNode], edges: List[ASGEdge]) -> bool:
+        """Bellman-Ford, looking for a cycle with a positive total min_net.
+        """
+        growth = {node: 0 for node in nodes}
+        for _ in range(len(nodes)):
+            changed = False
+            for edge in edges:
+                new = growth[edge.src] + self.effects[edge].min_net
+                if new > growth[edge.dst]:
+                    growth[edge.dst] = new
+                    changed = True
+            if not changed:
+                return False
+        return True
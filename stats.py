@@ -0,0 +1,195 @@
+"""Stats -- Measures where the time (and memory) goes when a program is compiled and run.
+
+Each stage of the pipeline (preprocess, parse, get_graph, optimise, interpret) is timed, by the wall clock and in CPU
+time. Counts are kept of the lines lexed and dropped as useless, the nodes and edges before and after each optimiser
+pass, and the steps and instructions run. This costs a few clock reads per stage, so it can be left on: pass a
+PipelineStats to `ProgramCache.compile` and `Interpreter.run`.
+Peak memory is measured with tracemalloc, which slows everything down a lot, so it is only done if asked for. It needs
+Python 3.9 or later, for tracemalloc.reset_peak.
+"""
+import contextlib
+import time
+import tracemalloc
+from typing import Dict, Iterator, List, Optional, Union
+from asg import ASG
+from interpreter import Interpreter
+from optimise_graph import Optimiser
+from output import Output, Sink
+from parsing import Parser
+from pathways_code import Code
+from preprocessing import preprocess
+
+
+class StageStats:
+    """Measurements of one stage.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = 0.0 # Seconds
+        self.cpu = 0.0 # Seconds of CPU time used by this process.
+        self.peak_memory: Optional[int] = None # Most bytes allocated at once during the stage, if memory was traced.
+        self.counts: Dict[str, int] = {}
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "wall": self.wall, "cpu": self.cpu, "peak_memory": self.peak_memory, "counts": self.counts}
+
+    def __repr__(self):
+        return f"StageStats({self.name!r}, wall={self.wall:.6f}, cpu={self.cpu:.6f}, peak_memory={self.peak_memory}, counts={self.counts})"
+
+
+class PassStats:
+    """The size of the graph before and after an optimiser pass.
+    """
+    def __init__(self, name: str, nodes_before: int, edges_before: int, nodes_after: int, edges_after: int, wall: float):
+        self.name = name
+        self.nodes_before = nodes_before
+        self.edges_before = edges_before
+        self.nodes_after = nodes_after
+        self.edges_after = edges_after
+        self.wall = wall
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "nodes_before": self.nodes_before, "edges_before": self.edges_before,
+                "nodes_after": self.nodes_after, "edges_after": self.edges_after, "wall": self.wall}
+
+    def __repr__(self):
+        return f"PassStats({self.name!r}, nodes {self.nodes_before}->{self.nodes_after}, edges {self.edges_before}->{self.edges_after})"
+
+
+class PipelineStats:
+    """A report of every stage a program went through.
+    """
+    def __init__(self, trace_memory: bool = False):
+        """
+        Args:
+            trace_memory (bool, optional): Measure the peak memory of each stage with tracemalloc. Defaults to False.
+
+        Raises:
+            RuntimeError: trace_memory was asked for, but this version of python can't reset the peak (before 3.9).
+        """
+        if trace_memory and not hasattr(tracemalloc, "reset_peak"):
+            raise RuntimeError("Measuring peak memory needs Python 3.9 or later")
+        self.trace_memory = trace_memory
+        self.stages: List[StageStats] = []
+        self.passes: List[PassStats] = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[StageStats]:
+        """Measures the code in a with block as a stage.
+
+        Args:
+            name (str): The stage's name.
+
+        Yields:
+            StageStats: The stage's measurements, to add counts to. The times are filled in at the end of the block.
+        """
+        stats = StageStats(name)
+        self.stages.append(stats)
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield stats
+        finally:
+            stats.wall = time.perf_counter() - wall
+            stats.cpu = time.process_time() - cpu
+            if self.trace_memory:
+                stats.peak_memory = tracemalloc.get_traced_memory()[1] - before
+            if started_tracing:
+                tracemalloc.stop()
+
+    def __getitem__(self, name: str) -> StageStats:
+        for stats in self.stages:
+            if stats.name == name:
+                return stats
+        raise KeyError(name)
+
+    def __contains__(self, name: str) -> bool:
+        return any(stats.name == name for stats in self.stages)
+
+    @property
+    def wall(self) -> float:
+        return sum(stats.wall for stats in self.stages)
+
+    @property
+    def cpu(self) -> float:
+        return sum(stats.cpu for stats in self.stages)
+
+    def to_dict(self) -> dict:
+        return {"stages": [stats.to_dict() for stats in self.stages], "passes": [stats.to_dict() for stats in self.passes]}
+
+    def report(self) -> str:
+        """Formats the stats as a table.
+        """
+        lines = [f"{'stage':<12}{'wall':>11}{'cpu':>11}{'memory':>12}  counts"]
+        for stats in self.stages + [None]:
+            if stats is None:
+                name, wall, cpu, memory, counts = "total", self.wall, self.cpu, None, ""
+            else:
+                name, wall, cpu, memory = stats.name, stats.wall, stats.cpu, stats.peak_memory
+                counts = ", ".join(f"{key} {value}" for key, value in stats.counts.items())
+            memory = f"{memory / 1024:.1f}KiB" if memory is not None else "-"
+            lines.append(f"{name:<12}{wall * 1000:>9.2f}ms{cpu * 1000:>9.2f}ms{memory:>12}  {counts}")
+        if self.passes:
+            lines.append("optimiser passes (nodes, edges):")
+            for stats in self.passes:
+                lines.append(f"  {stats.name:<20} {stats.nodes_before:>8} -> {stats.nodes_after:<8} {stats.edges_before:>8} -> {stats.edges_after:<8} {stats.wall * 1000:>9.2f}ms")
+        return "\n".join(lines)
+
+
+def compile_with_stats(source: str, stats: PipelineStats, lazy: bool = False) -> ASG:
+    """Compiles a program, measuring each stage.
+
+    Args:
+        source (str): The program's source code.
+        stats (PipelineStats): Where to record the measurements.
+        lazy (bool, optional): Only lex the lines reached from the start (see Parser). Defaults to False.
+
+    Returns:
+        ASG: The optimised graph.
+    """
+    with stats.stage("preprocess") as stage:
+        code = preprocess(Code(source))
+        stage.counts["cells"] = code.width * code.height
+    with stats.stage("parse") as stage:
+        parser = Parser(code, lazy=lazy)
+        stage.counts["lines_lexed"] = parser.lines_lexed
+        stage.counts["lines_dropped"] = parser.lines_dropped
+    with stats.stage("get_graph") as stage:
+        graph = parser.get_graph()
+        if lazy:
+            stage.counts["lines_lexed"] = parser.lines_lexed
+        stage.counts["nodes"] = graph.node_count
+        stage.counts["edges"] = graph.edge_count
+    with stats.stage("optimise") as stage:
+        optimiser = Optimiser(graph)
+        optimiser.passes = []
+        try:
+            optimiser.optimise()
+        finally:
+            stats.passes.extend(PassStats(*record) for record in optimiser.passes)
+        stage.counts["nodes"] = graph.node_count
+        stage.counts["edges"] = graph.edge_count
+    return graph
+
+
+def run_with_stats(graph: ASG, stats: PipelineStats, output: Optional[Union[Output, Sink]] = None,
+                   max_steps: Optional[int] = None) -> Interpreter:
+    """Runs a program, measuring it as the interpret stage.
+
+    Args:
+        graph (ASG): The graph to run.
+        stats (PipelineStats): Where to record the measurements.
+        output (Union[Output, Sink], optional): Where to print to. Defaults to a buffered sys.stdout.
+        max_steps (int, optional): Stop after this many steps. Defaults to running until the program finishes.
+
+    Returns:
+        Interpreter: The interpreter, with the final stack.
+    """
+    interpreter = Interpreter(graph, output)
+    interpreter.run(max_steps, stats)
+    return interpreter
@@ -0,0 +1,7 @@
+"""Status -- How a run of a program ended, shared by the batch runner and the scheduler.
+"""
+
+OK = "ok"
+TIMEOUT = "timeout"
+STEP_LIMIT = "step_limit"
+ERROR = "error"
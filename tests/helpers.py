@@ -0,0 +1,24 @@
+"""Programs and helpers shared by the tests."""
+from asg import ASG
+from optimise_graph import Optimiser
+from parsing import Parser
+from pathways_code import Code
+from preprocessing import preprocess
+
+programs = {
+    "string": '2">!"v\n  ^  <\n',
+    "countdown": "5>d!1-d?v\n ^      <\n",
+    "arithmetic": "n12n30+!93-!73/!73%!25*!",
+    "logic": "TF&!TF|!12=!12l!12g!T~!5~!\"abc\"~!",
+    "empty_stack": "+!d!!~!",
+    "cond": "1?2F?3T?!!!",
+    "const_op": "+n5+!d3-!1=!\"a\"d+\"b\"+!",
+}
+
+def compile_program(source: str) -> ASG:
+    """Compiles source all the way to an optimised graph."""
+    return Optimiser(Parser(preprocess(Code(source))).get_graph()).optimise()
+
+def loop_program(head, body):
+    """A loop from `>` back round to itself, through a `?` at the end of body."""
+    return f"{head}>{body}?v\n" + " " * len(head) + "^" + " " * (len(body) + 1) + "<\n"
@@ -0,0 +1,64 @@
+import pytest
+from asg import ASG, ASGArrowNode, ASGDecisionNode, ASGEdge, EdgeType
+from util import Direction
+
+def _chain(length):
+    graph = ASG()
+    nodes = [ASGArrowNode(Direction.RIGHT, x, 0) for x in range(length)]
+    for node in nodes:
+        graph.add_arrow_node(node)
+    prev = graph.start
+    for node in nodes:
+        graph.add_edge(ASGEdge(prev, node, []))
+        prev = node
+    graph.add_edge(ASGEdge(prev, graph.terminal, []))
+    return graph, nodes
+
+def test_ids_are_unique():
+    graph, _ = _chain(5)
+    ids = [node.id for node in graph.nodes] + [edge.id for edge in graph.edges]
+    assert len(set(ids)) == len(ids)
+
+def test_removal_compacts():
+    graph, nodes = _chain(6)
+    graph.remove_node(nodes[1])
+    graph.remove_node(nodes[4])
+    graph.remove_edge(graph.edges[0])
+    assert graph.nodes == [graph.start, graph.terminal, nodes[0], nodes[2], nodes[3], nodes[5]]
+    assert [node.index for node in graph.nodes] == list(range(6))
+    assert [edge.index for edge in graph.edges] == list(range(len(graph.edges)))
+    assert nodes[1].index == -1
+    assert (Direction.RIGHT, 1, 0) not in graph.arrow_nodes
+    assert graph.get_arrow_node(Direction.RIGHT, 2, 0) is nodes[2]
+
+def test_remove_missing_node():
+    graph, nodes = _chain(2)
+    graph.remove_node(nodes[0])
+    with pytest.raises(ValueError):
+        graph.remove_node(nodes[0])
+    with pytest.raises(ValueError):
+        graph.remove_node(ASGDecisionNode())
+
+def test_nodes_setter():
+    graph, nodes = _chain(3)
+    graph.nodes = [graph.start, nodes[2]]
+    assert graph.nodes == [graph.start, nodes[2]]
+    assert nodes[2].index == 1
+    assert nodes[0].index == -1
+
+def test_strongly_connected_components():
+    graph = ASG()
+    a, b = ASGArrowNode(Direction.RIGHT, 0, 0), ASGArrowNode(Direction.RIGHT, 1, 0)
+    decision = ASGDecisionNode()
+    graph.add_arrow_node(a)
+    graph.add_arrow_node(b)
+    graph.add_decision_node(decision)
+    graph.add_edge(ASGEdge(graph.start, a, []))
+    graph.add_edge(ASGEdge(a, b, []))
+    graph.add_edge(ASGEdge(b, decision, []))
+    graph.add_edge(ASGEdge(decision, a, [], EdgeType.TRUE))
+    graph.add_edge(ASGEdge(decision, graph.terminal, [], EdgeType.FALSE))
+    components = graph.strongly_connected_components()
+    assert sorted(map(len, components)) == [1, 1, 3]
+    assert components[0] == [graph.terminal]
+    assert components[-1] == [graph.start]
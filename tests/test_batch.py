@@ -0,0 +1,55 @@
+import pytest
+import batch
+from batch import ERROR, OK, STEP_LIMIT, TIMEOUT, Job, Runner, run_batch
+from helpers import compile_program, programs
+from interpreter import Interpreter
+
+LOOP = ">v\n^<\n"
+
+@pytest.mark.parametrize("source", programs.values(), ids=programs.keys())
+def test_matches_interpreter(source, capsys):
+    interpreter = Interpreter(compile_program(source))
+    interpreter.start_interpreting()
+    expected = capsys.readouterr().out
+    [result] = run_batch([Job(source)], processes=1)
+    assert result.status == OK
+    assert result.output == expected
+    assert result.stack == interpreter.stack
+
+def test_input_stack():
+    results = list(run_batch([Job("d*!", [n], str(n)) for n in range(4)], processes=1))
+    assert [result.output for result in results] == ["0\n", "1\n", "4\n", "9\n"]
+    assert [result.name for result in results] == ["0", "1", "2", "3"]
+
+def test_limits():
+    [steps, error] = run_batch([Job(LOOP), Job("10/!")], processes=1, timeout=None, max_steps=100)
+    assert (steps.status, steps.steps) == (STEP_LIMIT, 100)
+    assert error.status == ERROR and error.error.startswith("ZeroDivisionError")
+    [timeout] = run_batch([Job(LOOP)], processes=1, timeout=0.01)
+    assert timeout.status == TIMEOUT
+
+def test_compiles_once(monkeypatch):
+    compiled = []
+    compile_source = batch.compile_source
+    monkeypatch.setattr(batch, "compile_source", lambda source, cache=None: compiled.append(source) or compile_source(source, cache))
+    runner = Runner()
+    for n in range(5):
+        assert runner.run(Job(programs["countdown"], [n])).ok
+    assert compiled == [programs["countdown"]]
+
+def test_pool():
+    jobs = [Job(source, name=name) for name, source in programs.items()] * 3 + [Job(LOOP, name="loop")]
+    results = list(run_batch(jobs, processes=2, max_steps=1000))
+    expected = [Runner(max_steps=1000).run(job) for job in jobs]
+    assert [result.to_dict()["name"] for result in results] == [job.name for job in jobs]
+    assert [(r.status, r.output, r.stack) for r in results] == [(r.status, r.output, r.stack) for r in expected]
+
+def test_cli(tmp_path, capsys):
+    path = tmp_path / "square.pw"
+    path.write_text("d*!")
+    assert batch.main([str(path), "--input", "[3]", "--input", "[4]", "--processes", "1"]) == 0
+    out = capsys.readouterr().out
+    assert "[0]: ok" in out and "[1]: ok" in out
+    path.write_text(LOOP)
+    assert batch.main([str(path), "--max-steps", "10", "--json"]) == 1
+    assert '"status": "step_limit"' in capsys.readouterr().out
@@ -0,0 +1,34 @@
+import pytest
+from asg import ASGDecisionNode
+from benchmarks.generate import GENERATORS, generate
+from interpreter import Interpreter
+from optimise_graph import Optimiser
+from parsing import Parser
+from pathways_code import Code
+
+@pytest.mark.parametrize("kind", list(GENERATORS))
+def test_generated_programs_halt(kind, capsys):
+    source = generate(kind, 20)
+    interpreter = Interpreter(Optimiser(Parser(Code(source)).get_graph()).optimise())
+    interpreter.start_interpreting()
+    assert interpreter.finished
+    assert capsys.readouterr().out == ""
+
+def test_generated_programs_are_deterministic():
+    for kind in GENERATORS:
+        assert generate(kind, 20, seed=1) == generate(kind, 20, seed=1)
+
+def test_grid_programs_are_square():
+    for kind in ("dense", "sparse", "strings"):
+        rows = generate(kind, 20).split("\n")
+        assert len(rows) == 20
+        assert all(len(row) == 20 for row in rows)
+
+def test_loop_runs_size_times():
+    graph = Optimiser(Parser(Code(generate("loop", 7))).get_graph()).optimise()
+    interpreter = Interpreter(graph)
+    decisions = 0
+    while not interpreter.finished:
+        decisions += isinstance(interpreter.node, ASGDecisionNode)
+        interpreter.interpret_next_node()
+    assert decisions == 7
@@ -0,0 +1,38 @@
+import pytest
+from bytecode import BytecodeCompiler, Opcode, VM
+from helpers import compile_program, programs
+from interpreter import Interpreter
+
+@pytest.mark.parametrize("source", programs.values(), ids=programs.keys())
+def test_vm_matches_interpreter(source, capsys):
+    interpreter = Interpreter(compile_program(source))
+    interpreter.start_interpreting()
+    expected = capsys.readouterr().out
+    vm = VM(BytecodeCompiler(compile_program(source)).compile())
+    vm.start_interpreting()
+    assert vm.finished
+    assert capsys.readouterr().out == expected
+    assert vm.stack == interpreter.stack
+
+def test_constant_pool():
+    source = "".join(f"n{i}" for i in range(300)) + "n1T\"1\""
+    program = BytecodeCompiler(compile_program(source)).compile()
+    assert program.consts == list(range(300)) + ["1"]
+    assert Opcode.CONST_WIDE in program.code
+    vm = VM(program)
+    vm.start_interpreting()
+    assert vm.stack == list(range(300)) + [1, True, "1"]
+
+@pytest.mark.parametrize("source,expected", [
+    ("+d+!", [Opcode.ADD, Opcode.UNCHECKED_DUPLICATE, Opcode.UNCHECKED_OP, Opcode.ADD, Opcode.UNCHECKED_PRINT]),
+    ("-?1", [Opcode.SUB, Opcode.UNCHECKED_COND, 1, Opcode.N1]),
+    ("+?!", [Opcode.ADD, Opcode.UNCHECKED_COND, 1, Opcode.PRINT]), # The ? pops the only value, so ! is checked.
+])
+def test_unchecked_pops(source, expected):
+    graph = compile_program(source)
+    assert list(BytecodeCompiler(graph).compile().code) == expected
+    vm = VM(BytecodeCompiler(graph).compile(), [])
+    vm.start_interpreting()
+    interpreter = Interpreter(graph, [])
+    interpreter.start_interpreting()
+    assert (vm.stack, vm.output.sink) == (interpreter.stack, interpreter.output.sink)
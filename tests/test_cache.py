@@ -0,0 +1,72 @@
+import marshal
+import os
+import pytest
+import cache
+from cache import CacheFormatError, ProgramCache, deserialise_graph, serialise_graph
+from helpers import compile_program, programs
+from interpreter import Interpreter
+
+def _run(graph):
+    interpreter = Interpreter(graph)
+    interpreter.start_interpreting()
+    return interpreter.stack
+
+@pytest.mark.parametrize("source", programs.values(), ids=programs.keys())
+def test_roundtrip(source):
+    graph = compile_program(source)
+    loaded = deserialise_graph(serialise_graph(graph))
+    assert [repr(edge) for edge in loaded.edges] == [repr(edge) for edge in graph.edges]
+    assert [edge.path for edge in loaded.edges] == [edge.path for edge in graph.edges]
+    assert _run(loaded) == _run(graph)
+
+def test_bad_data():
+    with pytest.raises(CacheFormatError):
+        deserialise_graph(b"not a graph")
+    data = serialise_graph(compile_program(programs["countdown"]))
+    with pytest.raises(CacheFormatError):
+        deserialise_graph(data[:4] + b"\xff\xff" + data[6:])
+
+def _corrupt(nodes, edges):
+    return cache.HEADER.pack(cache.MAGIC, cache.FORMAT_VERSION) + marshal.dumps((nodes, edges))
+
+@pytest.mark.parametrize("data", [
+    _corrupt(((0,), (9,)), ()), # Unknown node kind.
+    _corrupt(((0,), (2, 99, 0, 0)), ()), # Unknown direction.
+    _corrupt(((0,), (1,)), ((0, 5, 0, (), ()),)), # Edge to a node which isn't there.
+    _corrupt(((0,), (1,)), ((0, -1, 0, (), ()),)),
+    _corrupt(((0,), (1,)), ((0, 1, 0, ((99, 1),), ()),)), # Unknown instruction type.
+    _corrupt(((0,), (1,)), ((0, 1, 0),)), # Wrong shape.
+    _corrupt(((0,), (1,)), ((0, 1, 0, (5,), ()),)),
+    _corrupt(((0,), (1,)), 7),
+])
+def test_corrupt_contents(data, tmp_path):
+    with pytest.raises(CacheFormatError):
+        deserialise_graph(data)
+    program_cache = ProgramCache(str(tmp_path))
+    program_cache.put(programs["countdown"], compile_program(programs["countdown"]))
+    with open(program_cache.path(programs["countdown"]), "wb") as f:
+        f.write(data)
+    assert program_cache.get(programs["countdown"]) is None # A miss, so it is compiled again.
+    assert _run(program_cache.compile(programs["countdown"])) == [0]
+
+def test_warm_cache_skips_parsing(tmp_path, monkeypatch):
+    program_cache = ProgramCache(str(tmp_path))
+    assert program_cache.get(programs["countdown"]) is None
+    program_cache.compile(programs["countdown"])
+    def fail(*args, **kwargs):
+        raise AssertionError("Parsed with a warm cache")
+    monkeypatch.setattr(cache, "Parser", fail)
+    assert len(program_cache.compile(programs["countdown"]).edges) == len(compile_program(programs["countdown"]).edges)
+    monkeypatch.setattr(cache, "COMPILER_VERSION", "other")
+    with pytest.raises(AssertionError):
+        program_cache.compile(programs["countdown"])
+
+def test_eviction(tmp_path):
+    program_cache = ProgramCache(str(tmp_path))
+    program_cache.compile(programs["countdown"])
+    program_cache.compile(programs["logic"])
+    os.utime(program_cache.path(programs["countdown"]), (0, 0)) # Least recently used.
+    program_cache.max_size = os.path.getsize(program_cache.path(programs["logic"]))
+    program_cache.evict()
+    assert program_cache.get(programs["countdown"]) is None
+    assert program_cache.get(programs["logic"]) is not None
@@ -0,0 +1,88 @@
+import marshal
+import pytest
+import checkpoint
+from checkpoint import CheckpointError, Checkpointer, restore, snapshot
+from helpers import compile_program, programs
+from interpreter import Interpreter
+
+def _finish(interpreter, output):
+    interpreter.run()
+    return interpreter.stack, "".join(output)
+
+@pytest.mark.parametrize("source", programs.values(), ids=programs.keys())
+@pytest.mark.parametrize("steps", [0, 1, 3, 7])
+def test_resume_matches_uninterrupted(source, steps):
+    expected_output = []
+    expected = _finish(Interpreter(compile_program(source), expected_output), expected_output)
+    output = []
+    first = Interpreter(compile_program(source), output)
+    first.run(steps)
+    first.output.write("buffered") # Not flushed yet, so it must be in the checkpoint.
+    data = snapshot(first)
+    resumed_output = list(output)
+    resumed = Interpreter(compile_program(source), resumed_output)
+    restore(resumed, data)
+    assert resumed.steps == first.steps
+    stack, printed = _finish(resumed, resumed_output)
+    assert stack == expected[0]
+    assert printed.replace("buffered\n", "") == expected[1]
+
+def test_values_keep_types():
+    interpreter = Interpreter(compile_program("T1\"a\""), [])
+    interpreter.run()
+    restored = Interpreter(compile_program("T1\"a\""), [])
+    restore(restored, snapshot(interpreter))
+    assert [type(value) for value in restored.stack] == [bool, int, str]
+    assert restored.finished
+
+def test_rejects_other_graphs():
+    interpreter = Interpreter(compile_program(programs["countdown"]), [])
+    interpreter.run(2)
+    data = snapshot(interpreter)
+    with pytest.raises(CheckpointError):
+        restore(Interpreter(compile_program(programs["countdown"].replace("5", "6")), []), data)
+    with pytest.raises(CheckpointError):
+        restore(Interpreter(compile_program(programs["countdown"]), []), data[:-3])
+    with pytest.raises(CheckpointError):
+        restore(Interpreter(compile_program(programs["countdown"]), []), b"PWAY" + data[4:])
+
+@pytest.mark.parametrize("state", [
+    ("x", (), "", 0, False),
+    (0, 5, "", 0, False),
+    (0, ([],), "", 0, False),
+    (0, (), b"", 0, False),
+    (0, (), "", "1", False),
+    (0, (), "", 0, None),
+    (0, ()),
+])
+def test_rejects_bad_fields(state):
+    interpreter = Interpreter(compile_program(programs["countdown"]), [])
+    data = snapshot(interpreter)
+    data = data[:checkpoint.HEADER.size] + marshal.dumps(state)
+    with pytest.raises(CheckpointError):
+        restore(Interpreter(compile_program(programs["countdown"]), []), data)
+
+def test_fingerprint_ignores_sharing():
+    # marshal writes values held elsewhere as references, so two compilations of a program can marshal differently.
+    assert checkpoint.fingerprint(compile_program(programs["countdown"])) == checkpoint.fingerprint(compile_program(programs["countdown"]))
+
+def test_checkpointer_resumes_after_crash(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, "SLICE", 2)
+    path = str(tmp_path / "countdown.pwck")
+    class Crash(Exception):
+        pass
+    class Crashing(Interpreter):
+        def run(self, max_steps=None):
+            if self.steps >= 2:
+                raise Crash()
+            return super().run(max_steps)
+    output = []
+    with pytest.raises(Crash):
+        Checkpointer(path, interval=0).run(Crashing(compile_program(programs["countdown"]), output))
+    crashed = "".join(output)
+    assert "5\n4\n3\n2\n1\n".startswith(crashed) and crashed not in ("", "5\n4\n3\n2\n1\n")
+    interpreter = Interpreter(compile_program(programs["countdown"]), output)
+    assert Checkpointer(path, interval=0).run(interpreter)
+    assert "".join(output) == "5\n4\n3\n2\n1\n"
+    assert not (tmp_path / "countdown.pwck").exists()
+    assert not Checkpointer(path).run(Interpreter(compile_program(programs["countdown"]), []))
@@ -0,0 +1,125 @@
+import io
+import xml.etree.ElementTree as ET
+import pytest
+from asg import ASG, ASGArrowNode, ASGDecisionNode, ASGEdge
+from export import MAX_LABEL, Exporter, dot_quote, main
+from helpers import compile_program, programs
+from instructions import InstructionType, stringify_instrs
+from profiler import ProfilingInterpreter
+from util import Direction
+
+NS = "{http://graphml.graphdrawing.org/xmlns}"
+
+def _dot(graph, **kwargs):
+    f = io.StringIO()
+    Exporter(graph, **kwargs).write(f)
+    return f.getvalue()
+
+def _graphml(graph, **kwargs):
+    f = io.StringIO()
+    Exporter(graph, **kwargs).write(f, "graphml")
+    root = ET.fromstring(f.getvalue())
+    nodes = {node.get("id"): node.find(f"{NS}data[@key='label']").text for node in root.iter(f"{NS}node")}
+    edges = [(edge.get("source"), edge.get("target"), edge.find(f"{NS}data[@key='label']").text or "") for edge in root.iter(f"{NS}edge")]
+    return nodes, edges
+
+def _chain(length):
+    """start -> length arrow nodes in a row -> terminal, each edge pushing 1."""
+    graph = ASG()
+    prev = graph.start
+    for x in range(length):
+        node = ASGArrowNode(Direction.RIGHT, x, 0)
+        graph.add_arrow_node(node)
+        graph.add_edge(ASGEdge(prev, node, [(InstructionType.INTEGER, 1)], path=[((x - 1, 0), (x, 0))]))
+        prev = node
+    graph.add_edge(ASGEdge(prev, graph.terminal, []))
+    return graph
+
+def test_dot():
+    dot = _dot(compile_program(programs["countdown"]))
+    assert dot.startswith("digraph ASG {") and dot.endswith("}\n")
+    assert '[label="d!1-d"]' in dot
+    assert "color=green" in dot and "color=red" in dot
+
+def test_graphml():
+    graph = compile_program(programs["countdown"])
+    nodes, edges = _graphml(graph)
+    assert len(nodes) == len(graph.nodes)
+    assert sorted(label for _, _, label in edges) == ["", "", "5", "d!1-d"]
+    assert all(src in nodes and dst in nodes for src, dst, _ in edges)
+
+def test_escaping():
+    graph = compile_program('"a\\"<&>"!')
+    label = stringify_instrs(graph.edges[0].code)
+    assert f"[label={dot_quote(label)}]" in _dot(graph)
+    assert dot_quote('a"b\\') == '"a\\"b\\\\"'
+    assert _graphml(graph)[1][0][2] == label
+
+def test_long_labels():
+    label = _graphml(compile_program("1" * 100))[1][0][2]
+    assert len(label) == MAX_LABEL and label.endswith("...")
+
+def test_near():
+    nodes, edges = _graphml(_chain(10), near=(5, 0))
+    assert sorted(nodes.values()) == ["> 5,0", "> 6,0"] # The edge leaving 5,0
+    assert len(edges) == 1
+    nodes, edges = _graphml(_chain(10), near=(5, 0), radius=1)
+    assert len(nodes) == 4 and len(edges) == 3
+
+@pytest.mark.parametrize("depth,count", [(0, 1), (1, 2), (3, 4)])
+def test_depth(depth, count):
+    nodes, edges = _graphml(_chain(10), depth=depth)
+    assert len(nodes) == count and len(edges) == count - 1
+    nodes, _ = _graphml(_chain(10), near=(5, 0), depth=depth)
+    assert len(nodes) == 2 + 2 * depth
+
+def test_profile():
+    graph = compile_program(programs["countdown"])
+    interpreter = ProfilingInterpreter(graph, [])
+    interpreter.start_interpreting()
+    nodes, edges = _graphml(graph, profile=interpreter.profile, min_count=2)
+    assert len(nodes) == 2
+    assert sorted(label for _, _, label in edges) == ["", "d!1-d"]
+    assert "(5)" in _dot(graph, profile=interpreter.profile)
+
+def test_collapse_chains():
+    nodes, edges = _graphml(_chain(10), collapse_chains=True)
+    assert sorted(nodes.values()) == ["chain: 10 nodes, 9 instructions", "end", "start"]
+    assert len(edges) == 2
+    nodes, _ = _graphml(_chain(2), collapse_chains=True)
+    assert len(nodes) == 4 # Too short to collapse.
+
+def test_collapse_loops():
+    nodes, edges = _graphml(compile_program(programs["countdown"]), collapse_loops=True)
+    assert sorted(nodes.values()) == ["end", "loop: 2 nodes, 2 edges, 4 instructions", "start"]
+    assert sorted((label, src, dst) for src, dst, label in edges) == [("", "loop0", "n1"), ("5", "n0", "loop0")]
+
+def test_main(tmp_path):
+    program = tmp_path / "countdown.pw"
+    program.write_text(programs["countdown"])
+    out = tmp_path / "countdown.graphml"
+    assert main([str(program), "-o", str(out), "--collapse-loops", "--cache-dir", str(tmp_path)]) == 0
+    assert "loop: 2 nodes" in out.read_text()
+
+def test_main_profile(tmp_path, capsys):
+    program = tmp_path / "countdown.pw"
+    program.write_text(programs["countdown"])
+    assert main([str(program), "--profile"]) == 0
+    assert capsys.readouterr().out.startswith("digraph")
+
+def test_chain_ids_follow_graph_order():
+    """start -> 4 nodes -> decision -> 5 nodes -> terminal, with the second chain's nodes made first."""
+    second = [ASGArrowNode(Direction.DOWN, x, 1) for x in range(5)]
+    first = [ASGArrowNode(Direction.RIGHT, x, 0) for x in range(4)]
+    graph = ASG()
+    decision = ASGDecisionNode()
+    for node in first + [decision] + second:
+        graph.add_node(node)
+    for chain, src, dst in ((first, graph.start, decision), (second, decision, graph.terminal)):
+        for a, b in zip([src] + chain, chain + [dst]):
+            graph.add_edge(ASGEdge(a, b, [(InstructionType.INTEGER, 1)]))
+    graph.add_edge(ASGEdge(decision, graph.terminal, []))
+    decision.true, decision.false = decision.out_edges
+    for depth in (None, 20): # Depth filters the nodes with a set.
+        nodes, _ = _graphml(graph, depth=depth, collapse_chains=True)
+        assert (nodes["chain0"], nodes["chain1"]) == ("chain: 4 nodes, 3 instructions", "chain: 5 nodes, 4 instructions")
@@ -0,0 +1,74 @@
+import random
+import pytest
+import parsing
+from helpers import compile_program, programs
+from incremental import IncrementalParser
+from interpreter import Interpreter
+from optimise_graph import Optimiser
+from parsing import Parser
+from pathways_code import Code
+from preprocessing import preprocess
+from util import Direction
+
+def _compile_unpropagated(source):
+    # Constant propagation depends on the whole graph, so the incremental parser doesn't do it.
+    return Optimiser(Parser(preprocess(Code(source))).get_graph()).optimise(propagate=False)
+
+def _run(graph, capsys, max_nodes=1000):
+    interpreter = Interpreter(graph)
+    error = None
+    try:
+        for _ in range(max_nodes):
+            if interpreter.finished:
+                break
+            interpreter.interpret_next_node()
+    except Exception as e: # e.g. a bracket which isn't part of a comment, or adding a string to a number.
+        error = repr(e)
+    interpreter.output.flush()
+    return interpreter.stack, interpreter.finished, capsys.readouterr().out, error
+
+def test_only_affected_lines_lexed(monkeypatch):
+    incremental = IncrementalParser(Code("5>d!1-d?v\n ^      <\n        \n"))
+    lexed = []
+    original = parsing.Line.__init__
+    def record(self, line, dir, index, parser):
+        lexed.append((dir, index))
+        original(self, line, dir, index, parser)
+    monkeypatch.setattr(parsing.Line, "__init__", record)
+    incremental.set(3, 2, "1")
+    assert sorted(lexed, key=str) == sorted([(Direction.RIGHT, 2), (Direction.LEFT, 2), (Direction.DOWN, 3), (Direction.UP, 3)], key=str)
+
+def test_edit_changes_behaviour(capsys):
+    incremental = IncrementalParser(Code(programs["countdown"]))
+    assert _run(incremental.get_graph(), capsys)[2] == "5\n4\n3\n2\n1\n"
+    graph = incremental.set(0, 0, "3")
+    assert _run(graph, capsys)[2] == "3\n2\n1\n"
+    graph = incremental.set(8, 0, ">") # Break the loop
+    assert _run(graph, capsys)[2] == "3\n"
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("chars", ["  ><^v?1+d!-\"T", "  ><^v?1+d!-\"T[]"], ids=["code", "comments"])
+def test_matches_full_reparse(seed, chars, capsys):
+    rng = random.Random(seed)
+    checked = 0
+    while checked < 100:
+        width, height = rng.randint(2, 7), rng.randint(1, 5)
+        source = "\n".join("".join(rng.choice(chars) for _ in range(width)) for _ in range(height))
+        try:
+            incremental = IncrementalParser(Code(source))
+        except KeyError: # Exit into an arrow that is lexed as part of a string.
+            continue
+        for _ in range(10):
+            x, y, c = rng.randrange(width), rng.randrange(height), rng.choice(chars)
+            rows = source.split("\n")
+            rows[y] = rows[y][:x] + c + rows[y][x + 1:]
+            try:
+                full = compile_program("\n".join(rows))
+            except KeyError:
+                break
+            source = "\n".join(rows)
+            graph = incremental.set(x, y, c)
+            assert _run(graph, capsys) == _run(full, capsys)
+            unpropagated = _compile_unpropagated("\n".join(rows))
+            assert (len(graph.nodes), len(graph.edges)) == (len(unpropagated.nodes), len(unpropagated.edges))
+            checked += 1
@@ -0,0 +1,67 @@
+import pytest
+from asg import ASGDecisionNode
+from benchmarks.generate import branching, dense, loop
+from helpers import compile_program, programs
+from interpreter import Interpreter
+from jit import TraceCompiler, TracingInterpreter
+
+sources = {**programs, "loop": loop(100), "branching": branching(6, iterations=20), "dense": dense(20)}
+
+def _run(interpreter):
+    interpreter.start_interpreting()
+    return interpreter.stack
+
+@pytest.mark.parametrize("threshold", [1, 2, 5])
+@pytest.mark.parametrize("source", sources.values(), ids=sources.keys())
+def test_same_as_interpreter(source, threshold, capsys):
+    graph = compile_program(source)
+    expected = _run(Interpreter(graph))
+    expected_out = capsys.readouterr().out
+    assert _run(TracingInterpreter(graph, hot_threshold=threshold)) == expected
+    assert capsys.readouterr().out == expected_out
+
+def test_hot_loop_is_traced(capsys):
+    graph = compile_program(programs["countdown"])
+    interpreter = TracingInterpreter(graph, hot_threshold=2)
+    interpreter.start_interpreting()
+    assert len(interpreter.traces) == 1
+    assert capsys.readouterr().out == "5\n4\n3\n2\n1\n"
+
+def test_cold_code_is_not_traced(capsys):
+    interpreter = TracingInterpreter(compile_program(programs["countdown"]))
+    interpreter.start_interpreting()
+    assert interpreter.traces == {}
+
+def test_guards_return_other_edge():
+    graph = compile_program(programs["countdown"])
+    decision = next(node for node in graph.nodes if isinstance(node, ASGDecisionNode))
+    compiler = TraceCompiler(graph, [decision.true, decision.true.dst.out_edges[0]])
+    compiler.transpile_trace()
+    assert compiler.exits == [decision.false]
+    trace = compiler.compile()
+    stack = [0]
+    assert trace(stack, stack.append, stack.pop, print, 10) == (0, decision.false)
+    assert stack == []
+    stack = [2, 2]
+    printed = []
+    assert trace(stack, stack.append, stack.pop, printed.append, 10) == (4, decision.false) # Round twice, then out.
+    assert printed == [2, 1]
+
+def test_endless_loop_returns():
+    graph = compile_program(">1+dv\n^   <")
+    interpreter = TracingInterpreter(graph, [], hot_threshold=2, trace_iterations=100)
+    assert not interpreter.run(1000)
+    assert len(interpreter.traces) == 1
+    assert 1000 <= interpreter.steps <= 2000 # Traces stop near the end of the steps, not at every node.
+    expected = Interpreter(graph, [])
+    expected.run(interpreter.steps)
+    assert (expected.stack, expected.steps, expected.instructions) == (interpreter.stack, interpreter.steps, interpreter.instructions)
+
+def test_counts_match(capsys):
+    graph = compile_program(sources["branching"])
+    expected = Interpreter(graph, [])
+    expected.run()
+    interpreter = TracingInterpreter(graph, [], hot_threshold=2, trace_iterations=3)
+    interpreter.run()
+    assert interpreter.traces
+    assert (interpreter.steps, interpreter.instructions) == (expected.steps, expected.instructions)
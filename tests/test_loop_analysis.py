@@ -0,0 +1,47 @@
+import itertools
+import pytest
+from helpers import compile_program, loop_program
+from interpreter import Interpreter
+from loop_analysis import AcceleratingInterpreter, LoopAnalysis, first_solution
+
+@pytest.mark.parametrize("relation", ["==", "!=", "<", ">", "<=", ">="])
+def test_first_solution(relation):
+    compare = {"==": int.__eq__, "!=": int.__ne__, "<": int.__lt__, ">": int.__gt__, "<=": int.__le__, ">=": int.__ge__}[relation]
+    for a, b in itertools.product(range(-12, 13), range(-4, 5)):
+        expected = next((u for u in range(40) if compare(a + b * u, 0)), None)
+        assert first_solution(a, b, relation) == expected, (a, b)
+
+@pytest.mark.parametrize("source", [
+    loop_program("n10", "1-d"),
+    loop_program("0", "1+dn10l"),
+    loop_program("N7", "3+dn30g~"),
+    loop_program("n5n100", "2-d"),
+    loop_program("n20d", "~1+~dn3=~"),
+    loop_program("", "1+d5=~"),
+    loop_program("n9", "1-d3*"),
+    loop_program("T", "1+dn5l"), # Starts with a bool, so is left to the interpreter.
+])
+def test_same_as_interpreter(source):
+    graph = compile_program(source)
+    assert LoopAnalysis(graph).loops
+    interpreter = Interpreter(graph, [])
+    interpreter.run()
+    accelerated = AcceleratingInterpreter(graph, [])
+    accelerated.run()
+    assert [(type(v), v) for v in accelerated.stack] == [(type(v), v) for v in interpreter.stack]
+
+def test_skips_iterations():
+    interpreter = AcceleratingInterpreter(compile_program(loop_program("n1000000000000", "1-d")), [])
+    assert interpreter.run(100)
+    assert interpreter.stack == [0]
+    assert interpreter.skipped == 999999999999
+
+@pytest.mark.parametrize("body", ["1-d!d", "1-d\"a\"=", "2/d", "2*d"])
+def test_not_counting_loops(body):
+    assert not LoopAnalysis(compile_program(loop_program("n5", body))).loops
+
+def test_infinite_loop_left_to_interpreter():
+    interpreter = AcceleratingInterpreter(compile_program(loop_program("n1", "1+d")), [])
+    assert not interpreter.run(1000)
+    assert interpreter.skipped == 0
+    assert interpreter.stack[-1] > 1
@@ -0,0 +1,117 @@
+import pytest
+from asg import ASG, ASGArrowNode, ASGDecisionNode, ASGEdge, EdgeType
+from helpers import compile_program, programs
+from instructions import InstructionType, SimpleInstructionType
+from interpreter import Interpreter
+from optimise_graph import MAX_FOLDED_INT_BITS, UNKNOWN, Optimiser
+from parsing import Parser
+from pathways_code import Code
+from util import Direction
+
+folding_programs = {
+    "fold_add": "n12n30+!",
+    "fold_chain": "12+3*4-5/6%!",
+    "fold_negate": "T~!5~!\"ab\"~!",
+    "fold_dup": "5d*!",
+    "fold_compare": "12=!12l!12g!\"a\"\"a\"=!",
+    "fold_pop": "1?>2!",
+    "fold_cond": "T?1F?2!!",
+    "div_zero_kept": "10/!",
+    "big_string": "\"ab\"n999999*2+",
+    "big_format": "\"%0200000d\"1%!",
+    "big_int": "2" + "d*" * 12 + "1+!",
+}
+
+def _compile_unfolded(source: str):
+    optimiser = Optimiser(Parser(Code(source)).get_graph())
+    optimiser.remove_unreachable()
+    optimiser.remove_boring_nodes()
+    return optimiser.graph
+
+@pytest.mark.parametrize("source", [*programs.values(), *folding_programs.values()], ids=[*programs.keys(), *folding_programs.keys()])
+def test_folding_preserves_behaviour(source, capsys):
+    def run(graph):
+        interpreter = Interpreter(graph)
+        try:
+            interpreter.start_interpreting()
+        except Exception as e:
+            return type(e), capsys.readouterr().out
+        return interpreter.stack, capsys.readouterr().out
+    assert run(compile_program(source)) == run(_compile_unfolded(source))
+
+def _code(source: str):
+    graph = compile_program(source)
+    return graph.start.out_edges[0].code
+
+def test_fold_constants():
+    S = InstructionType.SIMPLE
+    assert _code("n12n30+!") == [(InstructionType.INTEGER, 42), (S, SimpleInstructionType.PRINT)]
+    assert _code("5d*T~") == [(InstructionType.INTEGER, 25), (S, SimpleInstructionType.FALSE)]
+    assert _code("1?>") == []
+    assert _code("T?!") == [(S, SimpleInstructionType.PRINT)]
+    assert _code("+n5+") == [(S, SimpleInstructionType.ADD), (InstructionType.CONST_OP, (SimpleInstructionType.ADD, 5))]
+    assert _code("10/") == [(S, SimpleInstructionType.N1), (InstructionType.CONST_OP, (SimpleInstructionType.DIV, 0))]
+
+def test_big_ints_not_folded():
+    # Each d* doubles the number's length, so folding all of them would never finish.
+    code = _code("2" + "d*" * 40)
+    assert max(value.bit_length() for kind, value in code if kind == InstructionType.INTEGER) <= MAX_FOLDED_INT_BITS
+    assert (InstructionType.SIMPLE, SimpleInstructionType.MUL) in code
+    assert (InstructionType.INTEGER, 2 ** MAX_FOLDED_INT_BITS) not in _code("n%d1+" % (2 ** MAX_FOLDED_INT_BITS - 1))
+
+def test_formatting_not_folded():
+    # Formatting can pad a string to any width, so it's left for run time.
+    assert _code("\"%0999999999d\"1%") == [(InstructionType.STRING, "%0999999999d"), (InstructionType.CONST_OP, (SimpleInstructionType.MOD, 1))]
+    optimiser = Optimiser(ASG())
+    assert optimiser.run_known([(InstructionType.STRING, "%0999999999d"), (InstructionType.CONST_OP, (SimpleInstructionType.MOD, 1))], ((), True))[0][0] is UNKNOWN
+
+def _decisions(graph):
+    return [node for node in graph.nodes if isinstance(node, ASGDecisionNode)]
+
+def _known_decision_graph():
+    S = InstructionType.SIMPLE
+    graph = ASG()
+    a, b = ASGArrowNode(Direction.RIGHT, 0, 0), ASGArrowNode(Direction.RIGHT, 1, 0)
+    decision = ASGDecisionNode()
+    for node in (a, b):
+        graph.add_arrow_node(node)
+    graph.add_decision_node(decision)
+    graph.add_edge(ASGEdge(graph.start, a, [(S, SimpleInstructionType.TRUE)]))
+    graph.add_edge(ASGEdge(a, b, [(InstructionType.COND, (S, SimpleInstructionType.N1)), (S, SimpleInstructionType.N2)]))
+    graph.add_edge(ASGEdge(b, decision, [(S, SimpleInstructionType.DUPLICATE)]))
+    graph.add_edge(ASGEdge(decision, graph.terminal, [(S, SimpleInstructionType.N3)], EdgeType.TRUE))
+    graph.add_edge(ASGEdge(decision, graph.terminal, [(S, SimpleInstructionType.N4)], EdgeType.FALSE))
+    return graph, a
+
+def test_propagate_constants():
+    graph, a = _known_decision_graph()
+    assert Optimiser(graph).propagate_constants()
+    assert _decisions(graph) == []
+    assert a.out_edges[0].code[0] == (InstructionType.POP, None) # The condition is known to be true.
+    interpreter = Interpreter(Optimiser(graph).optimise(), [])
+    interpreter.start_interpreting()
+    assert interpreter.stack == [1, 2, 3]
+    assert len(graph.edges) == 1
+
+@pytest.mark.parametrize("source", ["F0?v*=?", "g1?<?T", "-!F0?v\nT<- ++", "0~?v!\n*22-2"])
+def test_propagation_removes_decisions(source, capsys):
+    def run(graph):
+        interpreter = Interpreter(graph)
+        interpreter.start_interpreting()
+        return interpreter.stack, capsys.readouterr().out
+    unpropagated = Optimiser(Parser(Code(source)).get_graph()).optimise(propagate=False)
+    assert _decisions(unpropagated)
+    assert _decisions(compile_program(source)) == []
+    assert run(compile_program(source)) == run(unpropagated)
+
+def test_unknown_decisions_kept():
+    assert len(_decisions(compile_program(programs["countdown"]))) == 1
+
+def test_propagation_with_input():
+    # The stack may start with values in it, so pops at the start aren't known to give 0.
+    graph = compile_program(" v\n>?1!\n 2\n !")
+    output = []
+    interpreter = Interpreter(graph, output)
+    interpreter.stack = [True]
+    interpreter.start_interpreting()
+    assert output == ["2\n"]
@@ -0,0 +1,58 @@
+import io
+import pytest
+from bytecode import BytecodeCompiler, VM
+from helpers import compile_program, programs
+from interpreter import Interpreter
+from jit import TracingInterpreter
+from output import Output
+from transpiler import Transpiler
+
+class Terminal(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.flushes = 0
+
+    def isatty(self):
+        return True
+
+    def flush(self):
+        self.flushes += 1
+
+def test_sinks():
+    collected, called, file = [], [], io.StringIO()
+    for sink in (collected, called.append, file):
+        output = Output(sink, buffer_size=4)
+        for value in (1, True, "ab"):
+            output.write(value)
+        output.flush()
+    assert collected == called == ["1\nTrue\n", "ab\n"]
+    assert file.getvalue() == "1\nTrue\nab\n"
+
+def test_unbuffered_for_terminals():
+    terminal = Terminal()
+    output = Output(terminal)
+    assert output.buffer_size == 0
+    output.write(5)
+    assert (terminal.getvalue(), terminal.flushes) == ("5\n", 1)
+    assert Output(io.StringIO()).buffer_size > 0
+
+@pytest.mark.parametrize("source", programs.values(), ids=programs.keys())
+def test_runners_write_to_sink(source, capsys):
+    interpreter = Interpreter(compile_program(source))
+    interpreter.start_interpreting()
+    expected = capsys.readouterr().out
+    sinks = [[] for _ in range(4)]
+    Interpreter(compile_program(source), sinks[0]).start_interpreting()
+    VM(BytecodeCompiler(compile_program(source)).compile(), sinks[1]).start_interpreting()
+    TracingInterpreter(compile_program(source), sinks[2], hot_threshold=1).start_interpreting()
+    output = Output(sinks[3])
+    Transpiler(compile_program(source)).compile()(write=output.write)
+    output.flush()
+    assert ["".join(sink) for sink in sinks] == [expected] * 4
+    assert capsys.readouterr().out == ""
+
+def test_flushed_on_error():
+    collected = []
+    with pytest.raises(ZeroDivisionError):
+        Interpreter(compile_program("5!0/"), collected).start_interpreting()
+    assert collected == ["5\n"]
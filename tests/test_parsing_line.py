@@ -1,6 +1,8 @@
 import pytest
 from instructions import InstructionType, SimpleInstructionType
-from parsing import Line
+from parsing import Line, Parser
+from optimise_graph import Optimiser
+from pathways_code import Code
 from util import Direction
 from test_instructions import for_all_simple_instructions, for_all_simple_instructions2
 
@@ -25,4 +27,27 @@ def test_parsing_cond_and_simple_instructions(simpletype, simplechar):
     assert _parse_line("????"+simplechar) == [(InstructionType.SIMPLE, SimpleInstructionType.AND),(InstructionType.SIMPLE, SimpleInstructionType.AND),(InstructionType.SIMPLE, SimpleInstructionType.AND),(InstructionType.COND,(InstructionType.SIMPLE, simpletype)), (InstructionType.EOL, None)]
 
 def test_string():
-    assert _parse_line("\"+-/\"") == [(InstructionType.STRING, "+-/"), (InstructionType.EOL, None),(InstructionType.SIMPLE, SimpleInstructionType.ADD),(InstructionType.SIMPLE, SimpleInstructionType.SUB),(InstructionType.SIMPLE, SimpleInstructionType.DIV), (InstructionType.EOL, None)]
\ No newline at end of file
+    assert _parse_line("\"+-/\"") == [(InstructionType.STRING, "+-/"), (InstructionType.EOL, None),(InstructionType.SIMPLE, SimpleInstructionType.ADD),(InstructionType.SIMPLE, SimpleInstructionType.SUB),(InstructionType.SIMPLE, SimpleInstructionType.DIV), (InstructionType.EOL, None)]
+
+def test_parallel_lexing_matches_serial():
+    code = Code("5>d!1-d?v\n ^      <\n\"a>b\" v \n  ' ^#<\n")
+    serial = Parser(code)
+    parallel = Parser(code, processes=2, parallel_threshold=0)
+    for d in Direction:
+        assert list(parallel.lines[d]) == list(serial.lines[d])
+        assert [line.instructions for line in parallel.lines[d].values()] == [line.instructions for line in serial.lines[d].values()]
+
+def test_lazy_graph_matches_reachable_graph():
+    code = Code("5>d!1-d?v\n ^      <\n\"a>b\" v \n  ' ^#<\n")
+    eager = Parser(code).get_graph()
+    Optimiser(eager).remove_unreachable()
+    lazy = Parser(code, lazy=True).get_graph()
+    assert set(lazy.arrow_nodes) == set(eager.arrow_nodes)
+    assert len(lazy.nodes) == len(eager.nodes)
+    assert sorted(map(repr, lazy.edges)) == sorted(map(repr, eager.edges))
+
+def test_lazy_parser_only_lexes_reachable_lines():
+    code = Code("5>d!1-d?v\n ^      <\n\n  >>v  v\n  ^ < <\n")
+    parser = Parser(code, lazy=True)
+    parser.get_graph()
+    assert {(d, i) for d in Direction for i in parser.lines[d]} == {(Direction.RIGHT, 0), (Direction.DOWN, 8), (Direction.LEFT, 1), (Direction.UP, 1)}
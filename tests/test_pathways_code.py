@@ -0,0 +1,73 @@
+import pickle
+import pytest
+from parsing import Parser
+import pathways_code
+from pathways_code import Code, LineView
+
+sources = {
+    "simple": "5>d!1-d?v\n ^      <\n",
+    "ragged": "ab\n\nabcdef\r\nx",
+    "unicode": "\"£€\"!v\n  ^  <",
+    "empty": "",
+}
+
+@pytest.fixture(params=sources.values(), ids=sources.keys())
+def codes(request, tmp_path):
+    path = tmp_path / "program.pw"
+    path.write_bytes(request.param.encode("utf-8"))
+    with Code.from_file(str(path)) as mapped:
+        yield Code(request.param), mapped
+
+def test_mapped_matches_code(codes):
+    code, mapped = codes
+    assert (mapped.height, mapped.width) == (code.height, code.width)
+    assert str(mapped) == str(code)
+    assert [str(row) for row in mapped.iter_rows()] == list(code.iter_rows())
+    assert ["".join(col) for col in mapped.iter_cols()] == ["".join(col) for col in code.iter_cols()]
+    for y in range(-1, code.height + 1):
+        for x in range(-1, code.width + 1):
+            assert mapped.get(x, y) == code.get(x, y)
+
+def test_column_blocks(codes, monkeypatch):
+    code, mapped = codes
+    monkeypatch.setattr(pathways_code, "COLUMN_BLOCK", 2)
+    cols = ["".join(col) for col in code.iter_cols()]
+    assert list(mapped.iter_cols()) == cols
+    assert [str(mapped.get_col(x)) for x in range(code.width)] == cols
+    assert [str(mapped.get_col(x)[::-1]) for x in range(code.width)] == [col[::-1] for col in cols]
+
+def test_views(codes):
+    code, mapped = codes
+    for row, view in zip(code.iter_rows(), mapped.iter_rows()):
+        assert isinstance(view, LineView)
+        assert len(view) == len(row)
+        assert "".join(view[::-1]) == row[::-1]
+        assert [view[i] for i in range(-len(row), len(row))] == list(row + row)
+        assert view[1:3] == row[1:3]
+
+def test_mapped_parses_the_same(codes):
+    code, mapped = codes
+    assert repr(Parser(mapped)) == repr(Parser(code))
+
+def test_set(codes):
+    code, mapped = codes
+    if code.height < 2:
+        return
+    for c in (mapped, code):
+        c.set(0, 0, "€")
+        c.set(1, 0, "1")
+    assert str(mapped) == str(code)
+    with pickle.loads(pickle.dumps(mapped)) as copy:
+        assert str(copy) == str(code)
+    with open(mapped.path, encoding="utf-8") as f:
+        assert f.read() != str(code) # The file is never changed.
+
+@pytest.mark.parametrize("value", ["", "ab", "£€"])
+def test_set_one_character(tmp_path, value):
+    path = tmp_path / "program.pw"
+    path.write_text("abc")
+    with Code.from_file(str(path)) as mapped:
+        with pytest.raises(ValueError, match="one character"):
+            mapped.set(1, 0, value)
+        assert str(mapped) == "abc" and mapped.edits == []
+    assert mapped.file.closed and mapped.data.closed
@@ -0,0 +1,109 @@
+import pickle
+import pytest
+from helpers import compile_program
+from instructions import InstructionType
+from interpreter import Interpreter
+from parsing import Parser
+from pathways_code import Code
+from preprocessing import CommentIndex, MaxTree, Spans, find_comments, preprocess
+from reference import AGREE, compare
+from util import Box, Direction
+
+documented = "5>d!1-d?v  [ Counts down\n ^      <    from 5.   ]\n"
+
+def _boxes(source):
+    return [(box.x, box.y, box.x2, box.y2) for box in find_comments(Code(source))]
+
+def _blank(source):
+    """The same code with every box replaced by spaces."""
+    rows = source.split("\n")
+    for x, y, x2, y2 in _boxes(source):
+        for row in range(y, y2 + 1):
+            line = rows[row].ljust(x2 + 1)
+            rows[row] = line[:x] + " " * (x2 + 1 - x) + line[x2 + 1:]
+    return "\n".join(rows)
+
+@pytest.mark.parametrize("source,expected", [
+    ("1[abc]2", [(1, 0, 5, 0)]),
+    (documented, [(11, 0, 23, 1)]),
+    ("[ [ ]\n  ]", [(0, 0, 4, 0)]), # The second [ is inside the first box, so the last ] is left over.
+    ("  ]\n[ ]", [(0, 1, 2, 1)]), # A ] above or to the left of a [ doesn't close it.
+    ("[a] [b]\n[c]", [(0, 0, 2, 0), (4, 0, 6, 0), (0, 1, 2, 1)]),
+    ("1[2", []),
+    ("  [ ]\n[ [ ]\n   ]", [(2, 0, 4, 0), (0, 1, 4, 1)]), # The second [ in row 1 is inside the box the first one starts.
+    ("a] [x\n" * 3, []), # No ] is far enough right.
+    ("", []),
+])
+def test_find_comments(source, expected):
+    assert _boxes(source) == expected
+
+def test_spans():
+    spans = Spans([(5, 7), (0, 2), (1, 3), (3, 4)])
+    assert list(spans) == [(0, 4), (5, 7)]
+    assert [spans.end_of(i) for i in range(8)] == [4, 4, 4, 4, None, 7, 7, None]
+    assert 6 in spans and 7 not in spans and len(spans) == 2
+
+def test_spans_add():
+    spans = Spans([(0, 2), (6, 8)])
+    spans.add(10, 12)
+    spans.add(2, 3) # Touching, so merged.
+    assert list(spans) == [(0, 3), (6, 8), (10, 12)]
+    spans.add(5, 11)
+    assert list(spans) == [(0, 3), (5, 12)]
+
+def test_max_tree():
+    tree = MaxTree([3, -1, 5, 2, 7])
+    assert [tree.first_at_least(i, 4) for i in range(6)] == [2, 2, 2, 4, 4, None]
+    tree.set(4, 1)
+    assert tree.first_at_least(3, 2) == 3 and tree.first_at_least(3, 4) is None
+    assert MaxTree([]).first_at_least(0, 0) is None
+
+def test_index():
+    index = CommentIndex([Box(2, 0, 4, 1), Box(7, 1, 8, 1)])
+    assert index.line_spans(Direction.RIGHT, 1, 10) == [(2, 5), (7, 9)]
+    assert index.line_spans(Direction.LEFT, 1, 10) == [(1, 3), (5, 8)]
+    assert index.line_spans(Direction.RIGHT, 1, 8) == [(2, 5), (7, 8)] # Clipped to the end of the row.
+    assert index.line_spans(Direction.DOWN, 3, 4) == [(0, 2)]
+    assert index.line_spans(Direction.UP, 3, 4) == [(2, 4)]
+    assert index.line_spans(Direction.RIGHT, 2, 10) == []
+    assert (3, 1) in index and (5, 1) not in index and (3, 2) not in index
+
+def test_no_comments():
+    assert preprocess(Code("5>d!1-d?v\n ^      <")).comments is None
+
+@pytest.mark.parametrize("source", [
+    documented,
+    "[ > ]1!",
+    "1v[\n  >2!]\n !", # Arrows, strings and digits are all hidden.
+    '"a[b"!1[ "" ]!',
+    "'[1]!",
+    "n12[3]!",
+    ">v[v]\n2!\n !",
+])
+def test_same_as_blank(source):
+    def run(source):
+        interpreter = Interpreter(compile_program(source), [])
+        interpreter.start_interpreting()
+        return interpreter.output.sink, interpreter.stack
+    assert run(source) == run(_blank(source))
+    assert compare(source).status == AGREE
+
+def test_comments_not_lexed():
+    parser = Parser(preprocess(Code(documented)))
+    instructions = [instruction for lines in parser.lines.values() for line in lines.values() for instruction in line.instructions]
+    assert instructions and not any(instruction[0] == InstructionType.INVALID for instruction in instructions)
+
+def test_parallel_lexing():
+    code = preprocess(Code(documented * 3))
+    serial = Parser(code)
+    parallel = Parser(code, processes=2, parallel_threshold=0)
+    for d in Direction:
+        assert [line.instructions for line in parallel.lines[d].values()] == [line.instructions for line in serial.lines[d].values()]
+
+def test_mapped_code(tmp_path):
+    path = tmp_path / "program.pw"
+    path.write_text(documented)
+    with Code.from_file(str(path)) as mapped:
+        code = preprocess(mapped)
+        with pickle.loads(pickle.dumps(code)) as copy:
+            assert copy.comments.boxes[0].x2 == 23 and (20, 1) in copy.comments
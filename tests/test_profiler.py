@@ -0,0 +1,50 @@
+from helpers import compile_program, programs
+from interpreter import Interpreter
+from pathways_code import Code
+from profiler import Profile, ProfilingInterpreter
+
+def _profile(source):
+    interpreter = ProfilingInterpreter(compile_program(source))
+    interpreter.start_interpreting()
+    return interpreter
+
+def test_profiling_does_not_change_result(capsys):
+    for source in programs.values():
+        interpreter = Interpreter(compile_program(source))
+        interpreter.start_interpreting()
+        expected = capsys.readouterr().out
+        assert _profile(source).stack == interpreter.stack
+        assert capsys.readouterr().out == expected
+
+def test_counts(capsys):
+    profile = _profile(programs["countdown"]).profile
+    assert sorted(profile.edge_counts.values()) == [1, 1, 4, 5]
+    assert sum(profile.instruction_counts.values()) == 1 + 5 * 4 # `1-` is folded into one instruction
+    assert list(profile.branches.values()) == [[4, 1]]
+    assert profile.max_stack == 2
+
+def test_preset_stack():
+    for run in (ProfilingInterpreter.start_interpreting, ProfilingInterpreter.run):
+        interpreter = ProfilingInterpreter(compile_program("!!!!"), [])
+        interpreter.stack = [1, 2, 3, 4]
+        run(interpreter)
+        assert interpreter.profile.max_stack == 4
+        assert "Max stack depth: 4" in interpreter.profile.report()
+
+def test_cell_counts(capsys):
+    counts = _profile(programs["countdown"]).profile.cell_counts()
+    assert counts[(0, 0)] == 1
+    assert all(counts[(x, 0)] == 5 for x in range(1, 9))
+    assert all(counts[(x, 1)] == 4 for x in range(1, 9))
+    assert (0, 1) not in counts
+
+def test_heatmap(capsys):
+    code = Code(programs["countdown"])
+    heatmap = _profile(programs["countdown"]).profile.heatmap(code).split("\n")
+    assert heatmap[0] == "5>d!1-d?v | .@@@@@@@@"
+    assert heatmap[1].endswith("|  %%%%%%%%")
+    assert "\x1b[" in _profile(programs["countdown"]).profile.heatmap(code, colour=True)
+
+def test_empty_profile():
+    assert Profile().heatmap(Code("ab")) == "ab |   "
+    assert "Max stack depth: 0" in Profile().report()
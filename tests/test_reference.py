@@ -0,0 +1,88 @@
+import random
+import pytest
+from benchmarks.generate import GENERATORS, generate, random_grid
+from helpers import compile_program, loop_program, programs
+from interpreter import Interpreter
+from pathways_code import Code
+from reference import AGREE, DIFFER, UNCOMPILABLE, UNFINISHED, GridInterpreter, compare, run_fast_start
+
+def _walk(source, stack=None):
+    output = []
+    walker = GridInterpreter(Code(source), output)
+    walker.stack = list(stack or [])
+    walker.start_interpreting()
+    return "".join(output), walker.stack
+
+@pytest.mark.parametrize("source", programs.values(), ids=programs.keys())
+def test_same_as_interpreter(source):
+    output = []
+    interpreter = Interpreter(compile_program(source), output)
+    interpreter.start_interpreting()
+    assert _walk(source) == ("".join(output), interpreter.stack)
+
+@pytest.mark.parametrize("source,expected", [
+    ("n12N34#5'a", [12, -34, "a"]),
+    ("nN", [0, 0]),
+    ('"a\\"b"', ["a\\b"]), # The escaped character is dropped.
+    ('1"abc', [1]), # Unterminated strings do nothing.
+    ("1'", [1, ""]),
+    ("T1??2", [2]), # ??2 is &?2
+    ("TF??2", []),
+    ("12? 3?#45?>6", [1, 6]), # A ? before a space, # or arrow in the same direction just pops.
+    ("1v\n\n 2", [1, 2]), # Columns run to the bottom of the code, even past the end of shorter rows.
+])
+def test_semantics(source, expected):
+    assert _walk(source)[1] == expected
+    assert compare(source).status == AGREE
+
+def test_input_stack():
+    source = " v\n>?1!\n 2\n !"
+    assert _walk(source, [True]) == ("2\n", [])
+    assert _walk(source, [False]) == ("0\n", [])
+
+def test_run_resumes():
+    walker = GridInterpreter(Code(programs["countdown"]), [])
+    assert not walker.run(10)
+    assert walker.steps == 10
+    assert walker.run()
+    assert "".join(walker.output.sink) == "5\n4\n3\n2\n1\n"
+
+@pytest.mark.parametrize("kind", list(GENERATORS))
+def test_generated_programs_agree(kind):
+    assert compare(generate(kind, 12)).status == AGREE
+
+def test_random_programs_agree():
+    statuses = set()
+    for seed in range(150):
+        rng = random.Random(seed)
+        comparison = compare(random_grid(rng.randint(4, 12), rng.randint(3, 8), seed), rng.choice([[], [1], ["a", 0]]), 2000)
+        assert comparison.status != DIFFER, (comparison.source, comparison.stack, comparison.detail)
+        statuses.add(comparison.status)
+    assert AGREE in statuses and UNFINISHED in statuses
+
+def test_compare_finds_differences(monkeypatch):
+    monkeypatch.setattr(GridInterpreter, "pop", lambda self: self.stack.pop() if self.stack else 1)
+    comparison = compare("!")
+    assert comparison.status == DIFFER and "output" in comparison.detail
+    # Programs which never finish are compared at the arrows they pass.
+    comparison = compare(">d+v\n^  <", max_steps=100)
+    assert comparison.status == DIFFER and comparison.detail.startswith("arrow")
+
+def test_growing_values_stop():
+    # Doubles a string forever, which would use up all the memory.
+    assert compare(loop_program("'a", "d+1")).status == UNFINISHED
+
+def test_uncompilable():
+    # The exit at the > leads to a character literal in its row, which isn't an entry point.
+    assert compare(" v\n'>").status == UNCOMPILABLE
+
+def test_fast_start():
+    output = []
+    assert isinstance(run_fast_start(programs["countdown"], output), GridInterpreter)
+    assert output == ["5\n4\n3\n2\n1\n"]
+    source = loop_program("n300", "d!1-d")
+    output = []
+    runner = run_fast_start(source, output, stack=["x"], budget=50)
+    assert isinstance(runner, Interpreter)
+    assert "".join(output) == "".join(f"{i}\n" for i in range(300, 0, -1))
+    assert runner.stack == ["x", 0]
@@ -0,0 +1,63 @@
+import asyncio
+from helpers import compile_program, programs
+from interpreter import Interpreter
+from jit import TracingInterpreter
+from scheduler import Scheduler
+from status import OK, STEP_LIMIT, TIMEOUT
+from type_analysis import SpecialisedInterpreter
+
+LOOP = ">v\n^<\n"
+
+def test_run_in_steps():
+    whole = Interpreter(compile_program(programs["countdown"]), [])
+    whole.run()
+    output = []
+    interpreter = Interpreter(compile_program(programs["countdown"]), output)
+    calls = 1
+    while not interpreter.run(1):
+        calls += 1
+    assert interpreter.steps == whole.steps == calls
+    assert (interpreter.stack, "".join(output)) == (whole.stack, "5\n4\n3\n2\n1\n")
+    assert interpreter.run(1)
+
+def test_exact_budget_finishes():
+    steps = Interpreter(compile_program(programs["countdown"]), [])
+    steps.run()
+    interpreter = Interpreter(compile_program(programs["countdown"]), [])
+    assert interpreter.run(steps.steps)
+    assert interpreter.steps == steps.steps
+
+def test_interleaved():
+    order = []
+    class Recording(Interpreter):
+        def run(self, max_steps=None):
+            order.append(self.name)
+            return super().run(max_steps)
+    interpreters = []
+    for name in "ab":
+        interpreter = Recording(compile_program(LOOP), [])
+        interpreter.name = name
+        interpreters.append(interpreter)
+    statuses = asyncio.run(Scheduler(max_steps=200).run_all(interpreters))
+    assert statuses == [STEP_LIMIT, STEP_LIMIT]
+    assert len(order) > 2
+    assert order == ["a", "b"] * (len(order) // 2)
+
+def test_budgets():
+    interpreters = [Interpreter(compile_program(LOOP), []) for _ in range(3)] + [Interpreter(compile_program("10/"), [])]
+    statuses = asyncio.run(Scheduler(max_steps=1000).run_all(interpreters))
+    assert statuses[:3] == [STEP_LIMIT] * 3
+    assert all(interpreter.steps == 1000 for interpreter in interpreters[:3])
+    assert isinstance(statuses[3], ZeroDivisionError)
+    statuses = asyncio.run(Scheduler(cpu_budget=0.01).run_all([Interpreter(compile_program(LOOP), []) for _ in range(10)]))
+    assert statuses == [TIMEOUT] * 10
+
+def test_subclasses():
+    hot = ">1+dv\n^   <" # Never finishes, and is soon compiled to a trace.
+    interpreters = [TracingInterpreter(compile_program(hot), [], hot_threshold=2), SpecialisedInterpreter(compile_program(hot), []),
+                    TracingInterpreter(compile_program(programs["countdown"]), [], hot_threshold=2)]
+    statuses = asyncio.run(Scheduler(max_steps=1000).run_all(interpreters))
+    assert statuses == [STEP_LIMIT, STEP_LIMIT, OK]
+    assert 1000 <= interpreters[0].steps <= 2000 and interpreters[1].steps == 1000
+    statuses = asyncio.run(Scheduler(cpu_budget=0.05).run_all(interpreters[:2]))
+    assert statuses == [TIMEOUT, TIMEOUT]
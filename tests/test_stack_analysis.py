@@ -0,0 +1,47 @@
+import pytest
+from asg import ASGDecisionNode
+from helpers import compile_program, programs
+from instructions import InstructionType, SimpleInstructionType
+from stack_analysis import StackAnalysis, StackEffect
+from transpiler import Transpiler
+
+S = InstructionType.SIMPLE
+
+@pytest.mark.parametrize("code,needed,min_net,max_net", [
+    ([], 0, 0, 0),
+    ([(S, SimpleInstructionType.ADD)], 2, -1, -1),
+    ([(S, SimpleInstructionType.N1), (S, SimpleInstructionType.ADD)], 1, 0, 0),
+    ([(S, SimpleInstructionType.DUPLICATE), (S, SimpleInstructionType.PRINT)], 1, 0, 0),
+    ([(InstructionType.COND, (S, SimpleInstructionType.N1))], 1, -1, 0),
+    ([(InstructionType.COND, (S, SimpleInstructionType.ADD))], 3, -2, -1),
+    ([(InstructionType.POP, None), (InstructionType.CONST_OP, (SimpleInstructionType.ADD, 5))], 2, -1, -1),
+])
+def test_stack_effect(code, needed, min_net, max_net):
+    effect = StackEffect.of(code)
+    assert (effect.needed, effect.min_net, effect.max_net) == (needed, min_net, max_net)
+
+def test_node_depths():
+    graph = compile_program(programs["countdown"])
+    analysis = StackAnalysis(graph)
+    decision = next(node for node in graph.nodes if isinstance(node, ASGDecisionNode))
+    # 5 is pushed, and every iteration keeps it and ends with d.
+    assert analysis.node_depth[decision] == 2
+    assert all(analysis.is_safe(edge) for edge in graph.edges)
+    assert analysis.growing_loops() == []
+
+def test_unsafe_edges():
+    graph = compile_program("+!")
+    analysis = StackAnalysis(graph)
+    assert not analysis.is_safe(graph.start.out_edges[0])
+    assert analysis.edge_depths(graph.start.out_edges[0]) == [0, 1, 0]
+
+def test_growing_loops():
+    graph = compile_program(">1v\n^ <")
+    loops = StackAnalysis(graph).growing_loops()
+    assert len(loops) == 1
+    assert StackAnalysis(compile_program(">1!v\n^  <")).growing_loops() == []
+    assert StackAnalysis(compile_program(">1?v\n^  <")).growing_loops() == []
+
+def test_transpiler_skips_checks():
+    source = Transpiler(compile_program(programs["countdown"])).transpile()
+    assert "if stack else 0" not in source
@@ -0,0 +1,82 @@
+import tracemalloc
+import pytest
+from cache import ProgramCache
+from helpers import compile_program, programs
+from interpreter import Interpreter
+from stats import PipelineStats, compile_with_stats, run_with_stats
+
+def test_stages():
+    stats = PipelineStats()
+    graph = compile_with_stats(programs["countdown"], stats)
+    interpreter = run_with_stats(graph, stats, [])
+    assert [stage.name for stage in stats.stages] == ["preprocess", "parse", "get_graph", "optimise", "interpret"]
+    assert all(stage.wall >= 0 and stage.cpu >= 0 and stage.peak_memory is None for stage in stats.stages)
+    assert stats.wall == pytest.approx(sum(stage.wall for stage in stats.stages))
+    assert stats["parse"].counts == {"lines_lexed": 2 * (10 + 2), "lines_dropped": 20} # Only the 4 lines with arrows on are kept.
+    assert stats["optimise"].counts == {"nodes": 4, "edges": 4}
+    assert stats["interpret"].counts == {"steps": 11, "instructions": 1 + 5 * 4}
+    assert interpreter.output.sink == ["5\n4\n3\n2\n1\n"]
+    assert "interpret" in stats and "cache" not in stats
+
+def test_passes():
+    stats = PipelineStats()
+    compile_with_stats(programs["countdown"], stats)
+    names = [record.name for record in stats.passes]
+    assert names[:3] == ["remove_unreachable", "remove_boring_nodes", "fold_constants"]
+    assert all(after.nodes_before == before.nodes_after for before, after in zip(stats.passes, stats.passes[1:]))
+    assert stats.passes[-1].nodes_after == stats["optimise"].counts["nodes"]
+
+def test_lazy():
+    stats = PipelineStats()
+    compile_with_stats("1!\n" + "2" * 50, stats, lazy=True)
+    assert stats["parse"].counts["lines_lexed"] == 0
+    assert 0 < stats["get_graph"].counts["lines_lexed"] <= 2 # Not the 52 columns.
+
+def test_same_result():
+    graph = compile_with_stats(programs["logic"], PipelineStats())
+    expected = Interpreter(compile_program(programs["logic"]), [])
+    expected.start_interpreting()
+    interpreter = run_with_stats(graph, PipelineStats(), [])
+    assert interpreter.stack == expected.stack
+    assert interpreter.output.sink == expected.output.sink
+
+def test_trace_memory():
+    stats = PipelineStats(trace_memory=True)
+    compile_with_stats(programs["string"], stats)
+    assert all(stage.peak_memory > 0 for stage in stats.stages)
+
+def test_error_still_recorded():
+    stats = PipelineStats()
+    with pytest.raises(ZeroDivisionError):
+        run_with_stats(compile_program("10/"), stats, [])
+    assert stats["interpret"].counts["instructions"] == 2 # 1, then 0/ (which raises)
+
+def test_report():
+    stats = PipelineStats()
+    run_with_stats(compile_with_stats(programs["countdown"], stats), stats, [])
+    report = stats.report()
+    assert report.splitlines()[0].split() == ["stage", "wall", "cpu", "memory", "counts"]
+    assert "lines_dropped 20" in report and "remove_boring_nodes" in report
+    assert stats.to_dict()["stages"][4]["counts"]["steps"] == 11
+
+def test_cache_and_run(tmp_path):
+    program_cache = ProgramCache(str(tmp_path))
+    stats = PipelineStats()
+    graph = program_cache.compile(programs["countdown"], stats)
+    assert [stage.name for stage in stats.stages] == ["cache", "preprocess", "parse", "get_graph", "optimise"]
+    assert stats["cache"].counts == {"hits": 0}
+    stats = PipelineStats()
+    program_cache.compile(programs["countdown"], stats)
+    interpreter = Interpreter(graph, [])
+    assert not interpreter.run(5, stats)
+    interpreter.run(stats=stats)
+    assert [stage.name for stage in stats.stages] == ["cache", "interpret", "interpret"]
+    assert stats["cache"].counts == {"hits": 1}
+    assert [stage.counts["steps"] for stage in stats.stages[1:]] == [5, 6]
+    assert sum(stage.counts["instructions"] for stage in stats.stages[1:]) == interpreter.instructions == 1 + 5 * 4
+
+def test_trace_memory_needs_reset_peak(monkeypatch):
+    monkeypatch.delattr(tracemalloc, "reset_peak")
+    with pytest.raises(RuntimeError):
+        PipelineStats(trace_memory=True)
+    PipelineStats()
@@ -0,0 +1,33 @@
+import pytest
+from helpers import compile_program, programs
+from interpreter import Interpreter
+from transpiler import Transpiler
+
+@pytest.mark.parametrize("source", programs.values(), ids=programs.keys())
+def test_transpiler_matches_interpreter(source, capsys):
+    interpreter = Interpreter(compile_program(source))
+    interpreter.start_interpreting()
+    expected = capsys.readouterr().out
+    stack = Transpiler(compile_program(source)).compile()()
+    assert capsys.readouterr().out == expected
+    assert stack == interpreter.stack
+
+def test_transpiler_standalone(tmp_path):
+    path = tmp_path / "program.py"
+    Transpiler(compile_program(programs["countdown"])).write(str(path))
+    source = path.read_text()
+    assert "import" not in source
+    namespace = {}
+    exec(source, namespace)
+    assert namespace["run"]() == [0]
+
+def test_runs_keep_their_own_output():
+    run = Transpiler(compile_program('1!2!')).compile()
+    outer = []
+    def write(value):
+        outer.append(value)
+        if len(outer) == 1:
+            run(write=inner.append) # A nested run mustn't take over the outer run's output.
+    inner = []
+    run(write=write)
+    assert outer == [1, 2] and inner == [1, 2]
@@ -0,0 +1,88 @@
+import pytest
+from bytecode import BytecodeCompiler, Opcode, VM
+from helpers import compile_program, loop_program, programs
+from instructions import InstructionType, SimpleInstructionType
+from interpreter import Interpreter
+from type_analysis import SpecialisedInterpreter, TypeAnalysis, binary_type, types_after
+
+S = InstructionType.SIMPLE
+
+sources = {
+    **programs,
+    "loop": loop_program("n10", "1-d"),
+    "arithmetic_loop": loop_program("n20", "dd*3%~0*+1-d"),
+    "division_loop": loop_program("n50", "d3/d5%+0*+1-d"),
+    "bool_loop": loop_program("T", "~d"),
+    "mixed_loop": loop_program("1", "T+d9l"),
+}
+
+@pytest.mark.parametrize("op,a,b,expected", [
+    (SimpleInstructionType.ADD, int, int, int),
+    (SimpleInstructionType.ADD, bool, bool, int),
+    (SimpleInstructionType.ADD, str, None, str),
+    (SimpleInstructionType.MUL, int, str, str),
+    (SimpleInstructionType.SUB, None, int, None),
+    (SimpleInstructionType.LESS, None, None, bool),
+    (SimpleInstructionType.AND, int, int, int),
+    (SimpleInstructionType.AND, int, bool, None),
+    (SimpleInstructionType.MOD, int, str, str),
+])
+def test_binary_type(op, a, b, expected):
+    assert binary_type(op, a, b) is expected
+
+def test_types_after():
+    assert types_after((S, SimpleInstructionType.N1), ()) == (int,)
+    assert types_after((S, SimpleInstructionType.EQUAL), (int, int)) == (bool,)
+    assert types_after((S, SimpleInstructionType.DUPLICATE), (str,)) == (str, str)
+    assert types_after((S, SimpleInstructionType.ADD), (int,)) == (None,) # The other value isn't known.
+    assert types_after((InstructionType.COND, (S, SimpleInstructionType.N1)), (int, bool)) == (int,)
+    assert types_after((InstructionType.COND, (S, SimpleInstructionType.TRUE)), (int, bool)) == (None,)
+
+def test_specialises_loop():
+    graph = compile_program(sources["arithmetic_loop"])
+    code = [inst for edge_code in TypeAnalysis(graph).specialise().values() for inst in edge_code]
+    assert (InstructionType.INT_OP, SimpleInstructionType.MUL) in code
+    assert (InstructionType.INT_OP, SimpleInstructionType.NEGATE) in code
+    assert (InstructionType.INT_CONST_OP, (SimpleInstructionType.SUB, 1)) in code
+
+def test_unknown_types_not_specialised():
+    # The stack may start with inputs, so values which were there at the start are never known.
+    graph = compile_program("d+d~")
+    assert all(inst[0] == S for code in TypeAnalysis(graph).specialise().values() for inst in code)
+    interpreter = SpecialisedInterpreter(graph, [])
+    interpreter.stack = ["ab"]
+    interpreter.start_interpreting()
+    assert interpreter.stack == ["abab", "baba"]
+
+def test_division_by_zero():
+    # Division by a value which might be 0 stays generic, so it raises with the same stack as the interpreter.
+    graph = compile_program(loop_program("3", "dd1-/0*+1-d"))
+    code = [inst for edge_code in TypeAnalysis(graph).specialise().values() for inst in edge_code]
+    assert (S, SimpleInstructionType.DIV) in code
+    interpreter = Interpreter(graph, [])
+    specialised = SpecialisedInterpreter(graph, [])
+    for runner in (interpreter, specialised):
+        with pytest.raises(ZeroDivisionError):
+            runner.start_interpreting()
+    assert specialised.stack == interpreter.stack
+
+@pytest.mark.parametrize("source", sources.values(), ids=sources.keys())
+def test_same_as_interpreter(source):
+    graph = compile_program(source)
+    expected = []
+    interpreter = Interpreter(graph, expected)
+    interpreter.start_interpreting()
+    output = []
+    specialised = SpecialisedInterpreter(graph, output)
+    specialised.start_interpreting()
+    assert output == expected
+    assert [(type(v), v) for v in specialised.stack] == [(type(v), v) for v in interpreter.stack]
+    vm = VM(BytecodeCompiler(graph, TypeAnalysis(graph)).compile(), [])
+    vm.start_interpreting()
+    assert [(type(v), v) for v in vm.stack] == [(type(v), v) for v in interpreter.stack]
+
+def test_vm_int_opcodes():
+    graph = compile_program(sources["arithmetic_loop"])
+    assert Opcode.INT_OP not in BytecodeCompiler(graph).compile().code
+    code = BytecodeCompiler(graph, TypeAnalysis(graph)).compile().code
+    assert Opcode.INT_OP in code and Opcode.INT_NEGATE in code and Opcode.INT_CONST_OP in code
@@ -0,0 +1,179 @@
+"""Transpiler -- Turns an (optimised) ASG into a standalone python module.
+
+Each node becomes a function which runs the code of the edge(s) leaving it and returns the function of the next node.
+The stack and the function to print with are passed to every node function, so nothing is shared between runs.
+A small trampoline calls the functions until the terminal node is reached.
+The generated source does not import anything from pathways, so it can be written out and run by itself.
+"""
+from typing import Callable, Dict, List, Optional
+from asg import ASG, ASGDecisionNode, ASGEdge, ASGNode, ASGTerminalNode
+from instructions import Instruction, InstructionType, SimpleInstructionType
+from stack_analysis import StackAnalysis
+
+POP = "(pop() if stack else 0)" # Popping an empty stack gives 0. Only used where the stack might be empty.
+
+HEADER = '''\
+# Generated by the pathways transpiler.
+
+
+def _negate(a):
+    if type(a) == bool:
+        return not a
+    elif type(a) == int:
+        return -a
+    elif type(a) == str:
+        return a[::-1]
+    return a
+
+'''
+
+FOOTER = '''
+
+def run(stack=None, write=print):
+    """Runs the program.
+
+    Args:
+        stack (list, optional): The initial stack. Defaults to an empty stack.
+        write (callable, optional): Called with each value printed. Defaults to print.
+
+    Returns:
+        list: The stack once the program has finished.
+    """
+    if stack is None:
+        stack = []
+    push = stack.append
+    pop = stack.pop
+    block = {start}
+    while block is not None:
+        block = block(stack, push, pop, write)
+    return stack
+
+
+if __name__ == "__main__":
+    run()
+'''
+
+# Simple instructions which pop a, b then push an expression of them.
+BINARY_OPS = {
+    SimpleInstructionType.AND: "a and b",
+    SimpleInstructionType.OR: "a or b",
+    SimpleInstructionType.ADD: "b + a",
+    SimpleInstructionType.SUB: "b - a",
+    SimpleInstructionType.MUL: "b * a",
+    SimpleInstructionType.DIV: "b // a",
+    SimpleInstructionType.MOD: "b % a",
+    SimpleInstructionType.EQUAL: "b == a",
+    SimpleInstructionType.LESS: "b < a",
+    SimpleInstructionType.GREATER: "b > a",
+}
+
+# Simple instructions which only push a constant.
+CONSTANTS = {
+    SimpleInstructionType.TRUE: True,
+    SimpleInstructionType.FALSE: False,
+    **{SimpleInstructionType(str(i)): i for i in range(10)},
+}
+
+
+class Transpiler:
+    """Transpiles an ASG into python source code.
+    """
+    def __init__(self, graph: ASG, analysis: Optional[StackAnalysis] = None):
+        """
+        Args:
+            graph (ASG): The graph to transpile.
+            analysis (StackAnalysis, optional): Stack depths of the graph, used to skip empty stack checks. Defaults to analysing the graph.
+        """
+        self.graph = graph
+        self.analysis = analysis
+        self.names: Dict[ASGNode, str] = {}
+
+    def transpile(self) -> str:
+        """Generates the source code of a python module which runs the program when run or imported and `run()` is called.
+
+        Returns:
+            str: The python source code.
+        """
+        if self.analysis is None:
+            self.analysis = StackAnalysis(self.graph)
+        self.names = {node: f"_node{i}" for i, node in enumerate(self.graph.nodes)}
+        out = [HEADER]
+        for node in self.graph.nodes:
+            out.extend(self.transpile_node(node))
+        out.append(FOOTER.format(start=self.names[self.graph.start]))
+        return "\n".join(out)
+
+    def compile(self) -> Callable[..., list]:
+        """Transpiles the graph, and execs it in-process.
+
+        Returns:
+            Callable[..., list]: The generated `run` function.
+        """
+        namespace = {"__name__": "pathways_program"}
+        exec(compile(self.transpile(), "<pathways>", "exec"), namespace)
+        return namespace["run"]
+
+    def write(self, path: str):
+        """Transpiles the graph into a python file.
+
+        Args:
+            path (str): The file to write to.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.transpile())
+
+    @staticmethod
+    def pop(stack_depth: int) -> str:
+        """Gets the expression to pop a value, when the stack has at least stack_depth values on it.
+        """
+        return "pop()" if stack_depth > 0 else POP
+
+    def transpile_node(self, node: ASGNode) -> List[str]:
+        lines = [f"def {self.names[node]}(stack, push, pop, write):"]
+        if isinstance(node, ASGTerminalNode):
+            lines.append("    return None")
+        elif isinstance(node, ASGDecisionNode):
+            lines.append(f"    if {self.pop(self.analysis.node_depth[node])}:")
+            lines.extend(self.transpile_edge(node.true, 2))
+            lines.append("    else:")
+            lines.extend(self.transpile_edge(node.false, 2))
+        else:
+            lines.extend(self.transpile_edge(node.out_edges[0], 1))
+        lines.append("")
+        return lines
+
+    def transpile_edge(self, edge: ASGEdge, depth: int) -> List[str]:
+        lines = []
+        for inst, stack_depth in zip(edge.code, self.analysis.edge_depths(edge)):
+            lines.extend(self.transpile_instruction(inst, depth, stack_depth))
+        lines.append("    " * depth + f"return {self.names[edge.dst]}")
+        return lines
+
+    def transpile_instruction(self, inst: Instruction, depth: int, stack_depth: int) -> List[str]:
+        indent = "    " * depth
+        if inst[0] == InstructionType.SIMPLE:
+            return [indent + line for line in self.transpile_simple_instruction(inst[1], stack_depth)]
+        elif inst[0] in (InstructionType.INTEGER, InstructionType.STRING):
+            return [indent + f"push({inst[1]!r})"]
+        elif inst[0] == InstructionType.COND:
+            return [indent + f"if {self.pop(stack_depth)}:"] + self.transpile_instruction(inst[1], depth + 1, stack_depth - 1)
+        elif inst[0] == InstructionType.POP:
+            return [indent + self.pop(stack_depth)]
+        elif inst[0] == InstructionType.CONST_OP:
+            return [indent + f"a = {inst[1][1]!r}", indent + f"b = {self.pop(stack_depth)}", indent + f"push({BINARY_OPS[inst[1][0]]})"]
+        # Only fail if the instruction is run, like the interpreter.
+        message = f"Unknown instruction type '{inst}'"
+        return [indent + f"raise ValueError({message!r})"]
+
+    def transpile_simple_instruction(self, inst: SimpleInstructionType, stack_depth: int) -> List[str]:
+        if inst in BINARY_OPS:
+            return [f"a = {self.pop(stack_depth)}", f"b = {self.pop(stack_depth - 1)}", f"push({BINARY_OPS[inst]})"]
+        elif inst in CONSTANTS:
+            return [f"push({CONSTANTS[inst]!r})"]
+        elif inst == SimpleInstructionType.NEGATE:
+            return [f"push(_negate({self.pop(stack_depth)}))"]
+        elif inst == SimpleInstructionType.PRINT:
+            return [f"write({self.pop(stack_depth)})"]
+        elif inst == SimpleInstructionType.DUPLICATE:
+            return [f"a = {self.pop(stack_depth)}", "push(a)", "push(a)"]
+        raise ValueError(f"Unknown simple instruction '{inst}'")
@@ -0,0 +1,221 @@
+"""Type analysis -- Works out the types of the values on the stack, without running the program.
+
+Most instructions do something different depending on the types of their operands, so they either check them (`~`)
+or go through python's generic operators. This finds the type (int, bool or str) of the values at the top of the stack
+at every node and instruction. Instructions whose operands are known to be ints, already on the stack, are specialised
+to INT_OP and INT_CONST_OP instructions, which skip the empty stack check and work on the stack in place.
+Everything else is left as it is, and runs the generic way.
+"""
+import operator
+from typing import Dict, List, Optional, Tuple, Union
+from asg import ASG, ASGDecisionNode, ASGEdge, ASGNode
+from instructions import BINARY_OPERATIONS, Instruction, InstructionType, SimpleInstructionType, constant_value, is_constant
+from interpreter import Interpreter
+from output import Output, Sink
+
+MAX_TYPED_VALUES = 32 # Only this many values at the top of the stack are tracked.
+
+# The type of each value at the top of the stack, or None if it isn't known. Values below them are never known, as the
+# stack can start with inputs in it.
+Types = Tuple[Optional[type], ...]
+
+INT_OP, INT_CONST_OP, NEGATE = InstructionType.INT_OP, InstructionType.INT_CONST_OP, SimpleInstructionType.NEGATE
+
+# The operations of INT_OP and INT_CONST_OP, called with (b, a), where a was on top of the stack.
+# They must not raise, as they leave b on the stack until they return.
+INT_OPERATIONS = {
+    SimpleInstructionType.AND: lambda b, a: a and b,
+    SimpleInstructionType.OR: lambda b, a: a or b,
+    SimpleInstructionType.ADD: operator.add,
+    SimpleInstructionType.SUB: operator.sub,
+    SimpleInstructionType.MUL: operator.mul,
+    SimpleInstructionType.EQUAL: operator.eq,
+    SimpleInstructionType.LESS: operator.lt,
+    SimpleInstructionType.GREATER: operator.gt,
+}
+# INT_CONST_OP can also divide, as it is only used where the divisor isn't 0.
+INT_CONST_OPERATIONS = {
+    **INT_OPERATIONS,
+    SimpleInstructionType.DIV: operator.floordiv,
+    SimpleInstructionType.MOD: operator.mod,
+}
+
+
+def binary_type(op: SimpleInstructionType, a: Optional[type], b: Optional[type]) -> Optional[type]:
+    """Gets the type of the result of a binary operation. If it raises, the type doesn't matter.
+
+    Args:
+        op (SimpleInstructionType): The operation.
+        a (Optional[type]): The type of the value popped first, or None if it isn't known.
+        b (Optional[type]): The type of the value popped second.
+
+    Returns:
+        Optional[type]: The type of the result, or None if it isn't known.
+    """
+    if op in (SimpleInstructionType.EQUAL, SimpleInstructionType.LESS, SimpleInstructionType.GREATER):
+        return bool
+    if op in (SimpleInstructionType.AND, SimpleInstructionType.OR):
+        return a if a is b else None # One of the operands.
+    if op in (SimpleInstructionType.ADD, SimpleInstructionType.MUL) and str in (a, b):
+        return str
+    if op == SimpleInstructionType.MOD and b is str:
+        return str # Formatting
+    if a in (int, bool) and b in (int, bool):
+        return int
+    return None
+
+
+def join(a: Types, b: Types) -> Types:
+    """Gets what is known about the stack when it could be either of two states.
+    """
+    length = min(len(a), len(b))
+    return tuple(x if x is y else None for x, y in zip(a[len(a) - length:], b[len(b) - length:]))
+
+
+def types_after(inst: Instruction, types: Types) -> Types:
+    """Gets the types at the top of the stack after an instruction.
+
+    Args:
+        inst (Instruction): The instruction.
+        types (Types): The types before it.
+
+    Returns:
+        Types: The types after it.
+    """
+    stack = list(types)
+    def pop() -> Optional[type]:
+        return stack.pop() if stack else None
+    if inst[0] == InstructionType.COND:
+        pop()
+        types = tuple(stack)
+        return join(types, types_after(inst[1], types))
+    if is_constant(inst):
+        stack.append(type(constant_value(inst)))
+    elif inst[0] == InstructionType.CONST_OP:
+        op, value = inst[1]
+        stack.append(binary_type(op, type(value), pop()))
+    elif inst[0] == InstructionType.SIMPLE and inst[1] in BINARY_OPERATIONS:
+        a = pop()
+        stack.append(binary_type(inst[1], a, pop()))
+    elif inst[0] == InstructionType.SIMPLE and inst[1] == SimpleInstructionType.NEGATE:
+        a = pop()
+        stack.append(a if a in (int, bool, str) else None)
+    elif inst[0] == InstructionType.SIMPLE and inst[1] == SimpleInstructionType.DUPLICATE:
+        a = pop()
+        stack.extend((a, a))
+    elif inst[0] == InstructionType.POP or (inst[0] == InstructionType.SIMPLE and inst[1] == SimpleInstructionType.PRINT):
+        pop()
+    else:
+        return () # Raises when run, so never continues.
+    return tuple(stack[-MAX_TYPED_VALUES:])
+
+
+def specialise_instruction(inst: Instruction, types: Types) -> Instruction:
+    """Gets the int-only version of an instruction, if its operands are known to be ints on the stack.
+
+    Args:
+        inst (Instruction): The instruction.
+        types (Types): The types before it.
+
+    Returns:
+        Instruction: The specialised instruction, or the instruction itself if it can't be specialised.
+    """
+    if inst[0] == InstructionType.SIMPLE:
+        if inst[1] in INT_OPERATIONS and types[-2:] == (int, int):
+            return (InstructionType.INT_OP, inst[1])
+        if inst[1] == SimpleInstructionType.NEGATE and types[-1:] == (int,):
+            return (InstructionType.INT_OP, inst[1])
+    elif inst[0] == InstructionType.CONST_OP:
+        op, value = inst[1]
+        if type(value) is int and types[-1:] == (int,) and op in INT_CONST_OPERATIONS and (value != 0 or op in INT_OPERATIONS):
+            return (InstructionType.INT_CONST_OP, inst[1])
+    return inst # Including COND, so the interpreter only has to look for specialised instructions at the top level.
+
+
+class TypeAnalysis:
+    """Finds the types at the top of the stack at every node of a graph.
+    """
+    def __init__(self, graph: ASG):
+        self.graph = graph
+        # What is known when arriving at each node. Unreachable nodes are missing.
+        self.node_types: Dict[ASGNode, Types] = {}
+        self.analyse()
+
+    def analyse(self):
+        self.node_types = {self.graph.start: ()}
+        # Types only ever become unknown, and there are at most MAX_TYPED_VALUES of them, so this finishes.
+        todo = [self.graph.start]
+        while todo:
+            node = todo.pop()
+            for edge in node.out_edges:
+                after = self.edge_types(edge)[-1]
+                old = self.node_types.get(edge.dst)
+                new = after if old is None else join(old, after)
+                if new != old:
+                    self.node_types[edge.dst] = new
+                    todo.append(edge.dst)
+
+    def entry_types(self, edge: ASGEdge) -> Types:
+        """Gets the types at the start of an edge's code (after a decision node has popped).
+        """
+        types = self.node_types[edge.src]
+        if isinstance(edge.src, ASGDecisionNode):
+            types = types[:-1]
+        return types
+
+    def edge_types(self, edge: ASGEdge) -> List[Types]:
+        """Gets the types before each instruction of an edge, and after the last one.
+
+        Args:
+            edge (ASGEdge): The edge, which must be reachable.
+
+        Returns:
+            List[Types]: One longer than the edge's code.
+        """
+        types = [self.entry_types(edge)]
+        for inst in edge.code:
+            types.append(types_after(inst, types[-1]))
+        return types
+
+    def specialised_code(self, edge: ASGEdge) -> List[Instruction]:
+        """Gets the code of an edge, with the int-only version of every instruction that can use one.
+        """
+        if edge.src not in self.node_types:
+            return edge.code # Unreachable
+        return [specialise_instruction(inst, types) for inst, types in zip(edge.code, self.edge_types(edge))]
+
+    def specialise(self) -> Dict[ASGEdge, List[Instruction]]:
+        """Gets the specialised code of every edge.
+        """
+        return {edge: self.specialised_code(edge) for edge in self.graph.edges}
+
+
+class SpecialisedInterpreter(Interpreter):
+    """An interpreter which runs the int-only versions of instructions wherever the types are known.
+    The graph itself is left unchanged.
+    """
+    def __init__(self, graph: ASG, output: Optional[Union[Output, Sink]] = None, analysis: Optional[TypeAnalysis] = None):
+        """
+        Args:
+            graph (ASG): The graph to run.
+            output (Union[Output, Sink], optional): Where to print to. Defaults to a buffered sys.stdout.
+            analysis (TypeAnalysis, optional): The types in the graph. Defaults to analysing it.
+        """
+        super().__init__(graph, output)
+        self.code = (analysis or TypeAnalysis(graph)).specialise()
+
+    def run_edge(self, edge: ASGEdge):
+        stack = self.stack
+        for inst in self.code[edge]:
+            kind = inst[0]
+            if kind is INT_OP:
+                if inst[1] is NEGATE:
+                    stack[-1] = -stack[-1]
+                else:
+                    a = stack.pop()
+                    stack[-1] = INT_OPERATIONS[inst[1]](stack[-1], a)
+            elif kind is INT_CONST_OP:
+                stack[-1] = INT_CONST_OPERATIONS[inst[1][0]](stack[-1], inst[1][1])
+            else:
+                self.run_instruction(inst)
+        self.node = edge.dst